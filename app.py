@@ -1,7 +1,9 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 import os
-import threading
+import json
 import time
+import queue
+import hashlib
 from werkzeug.utils import secure_filename
 import logging # Adicionado
 
@@ -17,14 +19,26 @@ logger = logging.getLogger(__name__) # Adicionado
 # Importações refatoradas
 from config import (
     UPLOAD_FOLDER, MAX_FILE_SIZE, DEFAULT_INSIGHTS_PROMPT,
-    OLLAMA_BASE_URL, WHISPER_MODEL_NAME, ALLOWED_EXTENSIONS, UPLOAD_FILE_MAX_AGE_MINUTES # Adicionado UPLOAD_FILE_MAX_AGE_MINUTES
+    OLLAMA_BASE_URL, WHISPER_MODEL_NAME, ALLOWED_EXTENSIONS, UPLOAD_FILE_MAX_AGE_MINUTES, # Adicionado UPLOAD_FILE_MAX_AGE_MINUTES
+    INSIGHTS_STREAM_UPDATE_SECONDS, INSIGHTS_STREAM_IDLE_SECONDS, STATUS_STREAM_KEEPALIVE_SECONDS,
+    TRANSCRIPT_PAGE_SIZE, TRANSCRIPT_MAX_PAGE_SIZE, TRANSCRIPTION_BACKEND, WHISPER_WARMUP_ON_START,
+    TASK_WATCH_SECONDS, UPLOAD_FOLDER_MAX_BYTES
 )
-from helpers.file_utils import allowed_file, start_cleanup_scheduler # Modificado
-from services import whisper_service, ollama_service, task_service
+from helpers.file_utils import allowed_file, start_cleanup_scheduler, request_cleanup, get_cleanup_stats # Modificado
+from helpers.upload_stream import StreamingUploadRequest, UploadRejected
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_content_range_header
+from services import whisper_service, ollama_service, task_service, insights_service
+from services.job_scheduler import JobScheduler, transcription_scheduler, insights_scheduler, QueueFullError
+from services.cache_service import result_cache
+from services.upload_session_service import upload_sessions, UploadSessionError
+from services.transcription_jobs import process_audio_task, complete_transcription_task, transcription_cache_key
 
 # Configuração do Flask com pasta estática personalizada
 app = Flask(__name__, static_folder='public', static_url_path='/static')
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'transcritor_audio_secret_key_2025') # Carrega do .env
+# Uploads gravados direto em UPLOAD_FOLDER enquanto chegam, com hash e tamanho calculados na leitura
+app.request_class = StreamingUploadRequest
 
 # Configurações do App a partir de config.py
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
@@ -34,78 +48,19 @@ app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
-def process_audio_task(file_path, task_id, original_filename):
-    """
-    Função principal da thread para transcrever áudio e preparar para insights.
-    """
-    try:
-        task_service.update_task_status(task_id, status="processing", progress="Iniciando transcrição...")
-
-        # Transcrição
-        task_service.update_task_status(task_id, status="processing", progress="Transcrevendo áudio...")
-        if not os.path.exists(file_path):
-            task_service.update_task_status(task_id, status="error", message="Arquivo não encontrado para processamento.")
-            logger.error(f"Task {task_id}: Arquivo {file_path} não encontrado para processamento.") # Adicionado
-            return
-
-        # Executar transcrição com diarização se solicitado
-        include_diarization = task_service.get_task_option(task_id, 'include_diarization', False)
-        transcription_result, error = whisper_service.transcribe_audio(
-            file_path,
-            include_timestamps=True,
-            include_diarization=include_diarization
-        )
-
-        if error:
-            task_service.update_task_status(task_id, status="error", message=error)
-            logger.error(f"Task {task_id}: Erro na transcrição Whisper: {error}")
-            return
-
-        if transcription_result is None:
-            task_service.update_task_status(task_id, status="error", message="Transcrição retornou resultado vazio.")
-            logger.error(f"Task {task_id}: Transcrição retornou resultado vazio para o arquivo {original_filename}.")
-            return
+# Modo worker: as transcrições rodam em worker.py e este processo não carrega modelos
+EXTERNAL_WORKERS = not isinstance(transcription_scheduler, JobScheduler)
 
-        # Extrair texto principal para compatibilidade
-        transcribed_text = transcription_result.get('text', '')
-
-        # Verificar conexão e modelos Ollama
-        available_models, ollama_conn, _ = ollama_service.get_available_ollama_models()
-
-        task_service.update_task_status(
-            task_id,
-            status="transcription_completed",
-            text=transcribed_text,
-            transcription_data=transcription_result,  # Dados completos da transcrição
-            message="Transcrição concluída! Pronto para gerar insights.",
-            current_prompt=DEFAULT_INSIGHTS_PROMPT,
-            available_ollama_models=available_models,
-            ollama_connected=ollama_conn
-        )
+# Status em que a transcrição completa já está disponível na tarefa
+TRANSCRIPT_READY_STATUSES = ("transcription_completed", "insights_queued", "generating_insights", "completed_with_insights", "error_insights")
 
-    except FileNotFoundError as fnf_error:
-        error_message = f"Erro: Arquivo não encontrado durante o processamento da tarefa: {fnf_error}"
-        logger.error(f"Task {task_id}: {error_message}")
-        task_service.update_task_status(task_id, status="error", message=error_message)
-    except ConnectionError as conn_error: # Exemplo para erros de conexão (ajustar conforme os serviços)
-        error_message = f"Erro de conexão durante o processamento da tarefa: {conn_error}"
-        logger.error(f"Task {task_id}: {error_message}")
-        task_service.update_task_status(task_id, status="error", message=error_message)
-    except Exception as e:
-        error_message = f"Erro inesperado durante o processamento da tarefa: {e}"
-        if "ffmpeg" in str(e).lower():
-            error_message += "\\nVerifique se o ffmpeg está instalado no sistema e acessível no PATH."
-        logger.exception(f"Task {task_id}: {error_message}") # Usar logger.exception para incluir o stack trace
-        task_service.update_task_status(task_id, status="error", message=error_message)
-
-    finally:
-        try:
-            if os.path.exists(file_path):
-                time.sleep(2)
-                os.remove(file_path)
-                logger.info(f"Task {task_id}: Arquivo {file_path} removido com sucesso.") # Modificado
-        except Exception as e:
-            logger.warning(f"Task {task_id}: Aviso - Não foi possível remover o arquivo {file_path}: {e}") # Modificado
+def transcription_readiness():
+    """
+    Prontidão para transcrever: do modelo deste processo ou, no modo worker, dos workers.
+    """
+    if EXTERNAL_WORKERS:
+        return transcription_scheduler.get_readiness()
+    return whisper_service.get_readiness()
 
 @app.route('/')
 def index():
@@ -113,9 +68,19 @@ def index():
 
 @app.route('/check_model')
 def check_model_route():
-    success, message = whisper_service.load_whisper_model()
+    # Não bloqueia: inicia (ou reinicia, após erro) o aquecimento e informa o estado atual
+    readiness = transcription_readiness()
+    if not EXTERNAL_WORKERS and readiness["state"] in ("idle", "error"):
+        whisper_service.start_warmup()
+        readiness = whisper_service.get_readiness()
     # A mensagem de sucesso do serviço já inclui o nome do modelo.
-    return jsonify({"success": success, "message": message})
+    return jsonify({
+        "success": readiness["ready"],
+        "state": readiness["state"],
+        "message": readiness["message"],
+        "default_model": WHISPER_MODEL_NAME,
+        "models": whisper_service.get_allowed_models()
+    })
 
 
 @app.route('/check_ollama')
@@ -130,6 +95,11 @@ def check_ollama_route():
 
 @app.route('/upload', methods=['POST'])
 def upload_file_route():
+    # Sem o cache de resultados o upload depende de vaga na fila: recusa antes de ler o corpo
+    if not result_cache.enabled and transcription_scheduler.is_full():
+        return queue_full_response(transcription_scheduler.retry_after())
+
+    # request.files lê o corpo em blocos direto para UPLOAD_FOLDER (StreamingUploadRequest)
     if 'file' not in request.files:
         return jsonify({"success": False, "message": "Nenhum arquivo enviado"}), 400
 
@@ -140,16 +110,82 @@ def upload_file_route():
     if not allowed_file(file.filename): # Usa helper
         return jsonify({"success": False, "message": "Tipo de arquivo não permitido."}), 400
 
-    model_loaded_success, model_message = whisper_service.load_whisper_model()
-    if not model_loaded_success:
-        return jsonify({"success": False, "message": model_message}), 500
-
-    task_id = task_service.create_task()
     original_filename = file.filename
 
     # Processa parâmetro de diarização
     enable_diarization = request.form.get('enable_diarization', 'false').lower() == 'true'
+
+    # Modelo Whisper escolhido (ex.: tiny para rascunhos, medium para a versão final)
+    whisper_model = request.form.get('model') or WHISPER_MODEL_NAME
+    model_error = validate_whisper_model(whisper_model)
+    if model_error:
+        return model_error
+
+    # Cache por conteúdo: o hash foi calculado enquanto o upload era gravado (StreamingUploadRequest)
+    upload = file.stream
+    return start_transcription(original_filename, upload.sha256, upload.size, enable_diarization, whisper_model, upload.move_to)
+
+
+def validate_whisper_model(whisper_model):
+    """
+    Returns:
+        Resposta 400 se o modelo não estiver em WHISPER_ALLOWED_MODELS, senão None
+    """
+    allowed_models = whisper_service.get_allowed_models()
+    if whisper_model not in allowed_models:
+        return jsonify({
+            "success": False,
+            "message": f"Modelo Whisper '{whisper_model}' não permitido. Opções: {', '.join(allowed_models)}."
+        }), 400
+    return None
+
+
+def start_transcription(original_filename, content_hash, size, enable_diarization, whisper_model, move_file):
+    """
+    Cria a tarefa de um arquivo já recebido (upload simples ou em partes) e o
+    envia à fila de transcrição, ou conclui a tarefa pelo cache de resultados.
+
+    Args:
+        original_filename (str): Nome original do arquivo
+        content_hash (str): SHA-256 do conteúdo
+        size (int): Tamanho em bytes
+        enable_diarization (bool): Se a diarização foi solicitada
+        whisper_model (str): Modelo Whisper escolhido
+        move_file (callable): Move o arquivo recebido para o caminho informado
+
+    Returns:
+        Resposta JSON do upload
+    """
+    if result_cache.enabled:
+        cached_result = result_cache.get(transcription_cache_key(content_hash, enable_diarization, whisper_model))
+        if cached_result is not None:
+            task_id = task_service.create_task()
+            task_service.set_task_option(task_id, 'include_diarization', enable_diarization)
+            task_service.set_task_option(task_id, 'whisper_model', whisper_model)
+            task_service.set_task_option(task_id, 'content_hash', content_hash)
+            complete_transcription_task(task_id, cached_result, message="Transcrição recuperada do cache! Pronto para gerar insights.")
+            logger.info(f"Task {task_id}: Resultado de {original_filename} recuperado do cache.")
+            return jsonify({
+                "success": True,
+                "task_id": task_id,
+                "cached": True,
+                "message": "Transcrição recuperada do cache."
+            })
+
+    # Uploads são aceitos enquanto o modelo aquece (ou sem workers ativos): o job espera na fila
+    readiness = transcription_readiness()
+    if readiness["state"] == "error":
+        return jsonify({"success": False, "message": readiness["message"]}), 500
+
+    # Fila cheia: o arquivo recebido é descartado (fim da requisição ou expiração da sessão)
+    if transcription_scheduler.is_full():
+        return queue_full_response(transcription_scheduler.retry_after())
+
+    task_id = task_service.create_task()
     task_service.set_task_option(task_id, 'include_diarization', enable_diarization)
+    task_service.set_task_option(task_id, 'whisper_model', whisper_model)
+    if result_cache.enabled:
+        task_service.set_task_option(task_id, 'content_hash', content_hash)
 
     # Salvar arquivo com task_id no nome para unicidade e rastreamento
     # A pasta UPLOAD_FOLDER já é verificada/criada no início do app.py
@@ -157,53 +193,347 @@ def upload_file_route():
     file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
 
     try:
-        file.save(file_path)
-        logger.info(f"Task {task_id}: Arquivo {original_filename} salvo como {file_path}.") # Adicionado
+        move_file(file_path)
+        logger.info(f"Task {task_id}: Arquivo {original_filename} ({size} bytes) salvo como {file_path}.")
     except Exception as e:
         logger.error(f"Task {task_id}: Erro ao salvar o arquivo {original_filename}: {e}") # Adicionado
         task_service.update_task_status(task_id, status="error", message=f"Erro ao salvar arquivo: {e}")
         return jsonify({"success": False, "message": f"Erro ao salvar o arquivo: {e}"}), 500
 
-    thread = threading.Thread(target=process_audio_task, args=(file_path, task_id, original_filename))
-    thread.daemon = True
-    thread.start()
+    # O status é definido antes do submit para não sobrescrever o "processing" do worker
+    task_service.update_task_status(task_id, status="queued", message="Upload realizado. Aguardando na fila de transcrição...")
+    try:
+        position = transcription_scheduler.submit(task_id, process_audio_task, file_path, task_id, original_filename)
+    except QueueFullError as e:
+        logger.warning(f"Task {task_id}: Upload rejeitado, {e}")
+        task_service.update_task_status(task_id, status="error", message=str(e))
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        return queue_full_response(e.retry_after)
+
+    if UPLOAD_FOLDER_MAX_BYTES:
+        request_cleanup()  # A cota é verificada logo após cada upload (já na fila), não só no intervalo da limpeza
+
+    return jsonify({
+        "success": True,
+        "task_id": task_id,
+        "queue_position": position,
+        "model": whisper_model,
+        "message": "Upload realizado. Processando..."
+    })
+
+
+@app.route('/uploads', methods=['POST'])
+def create_upload_session_route():
+    """
+    Inicia um upload em partes. Corpo JSON: filename, size (bytes) e, opcionais,
+    sha256 (do arquivo inteiro), enable_diarization e model.
+    """
+    data = request.get_json(silent=True) or {}
+    original_filename = data.get('filename') or ''
+    if not original_filename:
+        return jsonify({"success": False, "message": "Nenhum arquivo selecionado"}), 400
+    if not allowed_file(original_filename):
+        return jsonify({"success": False, "message": "Tipo de arquivo não permitido."}), 400
+
+    whisper_model = data.get('model') or WHISPER_MODEL_NAME
+    model_error = validate_whisper_model(whisper_model)
+    if model_error:
+        return model_error
 
-    # Atualiza o status inicial da tarefa após o upload e início da thread
-    task_service.update_task_status(task_id, status="pending_upload", message="Upload realizado. Processando...")
-    return jsonify({"success": True, "task_id": task_id, "message": "Upload realizado. Processando..."})
+    options = {
+        "enable_diarization": str(data.get('enable_diarization', 'false')).lower() == 'true',
+        "whisper_model": whisper_model
+    }
+    session = upload_sessions.create(original_filename, data.get('size'), options, data.get('sha256'))
+    return jsonify({"success": True, **session}), 201
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def upload_session_status_route(upload_id):
+    # Usado para retomar: o cliente reenvia apenas missing_chunks
+    return jsonify({"success": True, **upload_sessions.status(upload_id)})
+
+@app.route('/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk_route(upload_id):
+    """
+    Recebe uma parte. Cabeçalhos: Content-Range (ex.: "bytes 0-8388607/52428800")
+    e X-Chunk-SHA256. As partes podem chegar em qualquer ordem.
+    """
+    content_range = parse_content_range_header(request.headers.get('Content-Range'))
+    if content_range is None or content_range.units != 'bytes' or content_range.start is None:
+        return jsonify({"success": False, "message": "Cabeçalho Content-Range inválido ou ausente."}), 400
+    session = upload_sessions.status(upload_id)
+    if content_range.length != session["size"]:
+        return jsonify({"success": False, "message": "O tamanho total do Content-Range não confere com o do upload."}), 400
+
+    session = upload_sessions.write_chunk(
+        upload_id, content_range.start, content_range.stop, request.stream, request.headers.get('X-Chunk-SHA256')
+    )
+    return jsonify({"success": True, **session})
+
+@app.route('/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload_session_route(upload_id):
+    """
+    Confere as partes e envia o arquivo montado ao mesmo fluxo de /upload.
+    """
+    data_path, content_hash, meta = upload_sessions.finalize(upload_id)
+    options = meta["options"]
+
+    def move_file(file_path):
+        os.replace(data_path, file_path)
+
+    response = start_transcription(
+        meta["filename"], content_hash, meta["size"], options["enable_diarization"], options["whisper_model"], move_file
+    )
+    # Fila cheia antes de mover o arquivo ou modelo com erro: a sessão continua e o finalize pode ser repetido
+    if response_status(response) == 200 or not os.path.exists(data_path):
+        upload_sessions.delete(upload_id)
+    return response
+
+@app.route('/uploads/<upload_id>', methods=['DELETE'])
+def delete_upload_session_route(upload_id):
+    upload_sessions.delete(upload_id)
+    return jsonify({"success": True})
+
+def response_status(response):
+    # Respostas das rotas: Response ou tupla (Response, status)
+    return response[1] if isinstance(response, tuple) else response.status_code
+
+@app.errorhandler(UploadSessionError)
+def upload_session_error_handler(error):
+    return jsonify({"success": False, "message": str(error)}), error.status_code
+
+
+@app.errorhandler(UploadRejected)
+def upload_rejected_handler(error):
+    return jsonify({"success": False, "message": error.description}), 400
+
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large_handler(error):
+    return jsonify({
+        "success": False,
+        "message": f"Arquivo maior que o limite de {MAX_FILE_SIZE // (1024 * 1024)} MB."
+    }), 413
+
+def queue_full_response(retry_after, message="Servidor ocupado: a fila de transcrição está cheia. Tente novamente mais tarde."):
+    """
+    Resposta 503 padrão para quando uma fila (transcrição ou insights) está cheia.
+    """
+    response = jsonify({
+        "success": False,
+        "message": message,
+        "retry_after": retry_after
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    return response
 
 
 @app.route('/status/<task_id>')
 def get_status_route(task_id):
-    status_info = task_service.get_task_status(task_id)
+    """
+    Status enxuto da tarefa: sem texto, insights e dados da transcrição, que
+    ficam em /transcript/<task_id>; inclui os tamanhos desses campos e suporta
+    ETag/If-None-Match. Use ?full=1 para a tarefa completa (formato antigo).
+    """
+    full = request.args.get('full', '').lower() in ('1', 'true')
+    status_info = task_service.get_task_status(task_id) if full else task_service.get_task_summary(task_id)
     if status_info:
-        return jsonify(status_info)
+        options = status_info.get('options') or {}
+        if options.get('transcript_etag'):
+            status_info['transcript_etag'] = options['transcript_etag']
+            status_info['segments_count'] = options.get('segments_count', 0)
+        scheduler = insights_scheduler if status_info.get('status') == "insights_queued" else transcription_scheduler
+        queue_position = scheduler.get_queue_position(task_id)
+        if queue_position:
+            status_info['queue_position'] = queue_position
+            status_info['estimated_wait_seconds'] = scheduler.estimate_wait_seconds(queue_position)
+        response = jsonify(status_info)
+        response.add_etag()
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
     else:
         return jsonify({"status": "not_found", "message": "Tarefa não encontrada"}), 404
 
-@app.route('/retry_insights/<task_id>', methods=['POST'])
-def retry_insights_generation_route(task_id):
+# Campos de transcription_data que podem ser pedidos em /transcript
+TRANSCRIPT_FIELDS = (
+    "segments", "text", "language", "duration", "timings", "timestamped_text",
+    "diarization", "diarization_error", "speakers_summary", "speakers_text",
+    "combined_text", "speaker_turns", "speaker_turns_text"
+)
+
+@app.route('/transcript/<task_id>')
+def transcript_route(task_id):
+    """
+    Dados da transcrição, paginados por segmento.
+
+    Parâmetros: start (índice do primeiro segmento), limit (segmentos por página),
+    fields (campos separados por vírgula, padrão "segments") e words (false omite
+    os timestamps por palavra). Responde 304 quando If-None-Match confere.
+    """
+    transcript_etag = task_service.get_task_option(task_id, 'transcript_etag')
+    if transcript_etag is None:
+        if task_service.get_task_summary(task_id) is None:
+            return jsonify({"success": False, "message": "Tarefa não encontrada."}), 404
+        return jsonify({"success": False, "message": "Transcrição ainda não disponível."}), 404
+
+    try:
+        start = max(0, int(request.args.get('start', 0)))
+        limit = min(TRANSCRIPT_MAX_PAGE_SIZE, max(1, int(request.args.get('limit', TRANSCRIPT_PAGE_SIZE))))
+    except ValueError:
+        return jsonify({"success": False, "message": "Parâmetros start/limit inválidos."}), 400
+    fields = [field.strip() for field in request.args.get('fields', 'segments').split(',') if field.strip()]
+    unknown_fields = [field for field in fields if field not in TRANSCRIPT_FIELDS]
+    if unknown_fields:
+        return jsonify({"success": False, "message": f"Campos desconhecidos: {', '.join(unknown_fields)}"}), 400
+    include_words = request.args.get('words', 'true').lower() != 'false'
+
+    # ETag derivado da versão da transcrição e da visão pedida: o 304 não lê o payload
+    etag = hashlib.sha1(f"{transcript_etag}:{start}:{limit}:{','.join(fields)}:{include_words}".encode("utf-8")).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    transcription_data = task_service.get_task_payload(task_id, 'transcription_data') or {}
+    body = {"success": True, "task_id": task_id, "fields": fields}
+    for field in fields:
+        if field != 'segments':
+            body[field] = transcription_data.get(field)
+            continue
+        segments = transcription_data.get('segments') or []
+        page = segments[start:start + limit]
+        if not include_words:
+            page = [{key: value for key, value in segment.items() if key != 'words'} for segment in page]
+        body.update({
+            "segments": page,
+            "start": start,
+            "limit": limit,
+            "total_segments": len(segments),
+            "next_start": start + limit if start + limit < len(segments) else None
+        })
+
+    response = jsonify(body)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def insights_stream_delta(fields, sent):
+    """
+    Converte os campos alterados de uma tarefa no delta enviado por /status_stream:
+    sem os campos volumosos e, durante a geração, apenas o trecho novo dos insights.
+
+    Args:
+        fields (dict): Campos passados a update_task_status
+        sent (dict): Estado do stream (insights já enviados), atualizado aqui
+    """
+    delta = task_service.strip_payload(fields)
+    insights = fields.get('insights')
+    if insights is not None:
+        previous = sent.get('insights', "")
+        if insights.startswith(previous):
+            if len(insights) > len(previous):
+                delta['insights_append'] = insights[len(previous):]
+        else:
+            delta['insights'] = insights
+        sent['insights'] = insights
+    return delta
+
+@app.route('/status_stream/<task_id>')
+def status_stream_route(task_id):
+    """
+    Stream SSE do status da tarefa, alimentado pelas notificações de
+    task_service.update_task_status. Eventos:
+    "status" - apenas os campos que mudaram (status, progress, message, trechos de insights...);
+    "transcript" - a tarefa completa, enviada uma única vez quando a transcrição termina.
+    """
+    subscriber = task_service.subscribe_task_updates(task_id)
+    task_info = task_service.get_task_status(task_id)
+    if not task_info:
+        task_service.unsubscribe_task_updates(task_id, subscriber)
+        return jsonify({"status": "not_found", "message": "Tarefa não encontrada"}), 404
+
+    def queue_fields(status):
+        scheduler = insights_scheduler if status == "insights_queued" else transcription_scheduler
+        position = scheduler.get_queue_position(task_id)
+        if not position:
+            return {}
+        return {"queue_position": position, "estimated_wait_seconds": scheduler.estimate_wait_seconds(position)}
+
+    def generate():
+        sent = {"insights": task_info.get('insights') or ""}
+        status = task_info.get('status')
+        transcript_sent = status in TRANSCRIPT_READY_STATUSES
+        try:
+            if transcript_sent:
+                yield sse_event(task_info, event="transcript")
+            else:
+                snapshot = task_service.strip_payload(task_info)
+                snapshot.update(queue_fields(status))
+                yield sse_event(snapshot, event="status")
+
+            while True:
+                try:
+                    fields = subscriber.get(timeout=STATUS_STREAM_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    # Mantém a conexão viva e atualiza a posição na fila
+                    if status in ("queued", "insights_queued"):
+                        yield sse_event(dict(status=status, **queue_fields(status)), event="status")
+                    else:
+                        yield ": keepalive\n\n"
+                    continue
+
+                status = fields.get('status', status)
+                if status in TRANSCRIPT_READY_STATUSES and not transcript_sent:
+                    # Mudanças já enfileiradas estão refletidas no snapshot completo
+                    while not subscriber.empty():
+                        fields = subscriber.get_nowait()
+                    full_task = task_service.get_task_status(task_id)
+                    if full_task:
+                        transcript_sent = True
+                        sent['insights'] = full_task.get('insights') or ""
+                        yield sse_event(full_task, event="transcript")
+                        continue
+                delta = insights_stream_delta(fields, sent)
+                delta.update(queue_fields(status))
+                yield sse_event(delta, event="status")
+        finally:
+            task_service.unsubscribe_task_updates(task_id, subscriber)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Evita buffer em proxies (nginx)
+    })
+
+def prepare_insights_request(task_id):
+    """
+    Valida a requisição de insights e escolhe a melhor fonte de texto da transcrição.
+
+    Returns:
+        tuple: (parâmetros, resposta de erro) - parâmetros contém custom_prompt,
+        selected_model, text e text_source; a resposta de erro é None se tudo estiver ok
+    """
     task_info = task_service.get_task_status(task_id)
 
     if not task_info or 'text' not in task_info or task_info['text'] is None:
         logger.warning(f"Task {task_id}: Tentativa de gerar insights sem transcrição.") # Adicionado
-        return jsonify({"success": False, "message": "Tarefa ou transcrição não encontrada para gerar insights."}), 404
+        return None, (jsonify({"success": False, "message": "Tarefa ou transcrição não encontrada para gerar insights."}), 404)
 
     if task_info.get("status") not in ["transcription_completed", "completed_with_insights", "error_insights"]:
         logger.warning(f"Task {task_id}: Tentativa de gerar insights no estado inválido {task_info.get('status')}.") # Adicionado
-        return jsonify({"success": False, "message": f"Não é possível gerar insights no estado atual da tarefa: {task_info.get('status')}."}), 400
+        return None, (jsonify({"success": False, "message": f"Não é possível gerar insights no estado atual da tarefa: {task_info.get('status')}."}), 400)
 
-    data = request.get_json()
+    data = request.get_json(silent=True)
     if not data:
         logger.warning(f"Task {task_id}: Tentativa de gerar insights sem dados no corpo da requisição.") # Adicionado
-        return jsonify({"success": False, "message": "Dados não enviados no corpo da requisição."}), 400
+        return None, (jsonify({"success": False, "message": "Dados não enviados no corpo da requisição."}), 400)
 
     custom_prompt = data.get('prompt', DEFAULT_INSIGHTS_PROMPT)
     selected_model = data.get('model_name')
 
     if not selected_model:
         logger.warning(f"Task {task_id}: Tentativa de gerar insights sem selecionar modelo Ollama.") # Adicionado
-        return jsonify({"success": False, "message": "Nenhum modelo Ollama foi selecionado."}), 400
+        return None, (jsonify({"success": False, "message": "Nenhum modelo Ollama foi selecionado."}), 400)
 
     # Escolher melhor fonte de texto para insights: diarização > timestamps > texto simples
     transcribed_text = task_info['text']
@@ -212,8 +542,13 @@ def retry_insights_generation_route(task_id):
     # Verificar se há dados de transcrição completos disponíveis
     transcription_data = task_info.get('transcription_data', {})
 
-    # Priorizar texto com diarização (mais contexto)
-    if transcription_data.get('speakers_text'):
+    # Priorizar turnos de fala por palavra (locutor correto mesmo com troca no meio do segmento)
+    if transcription_data.get('speaker_turns_text'):
+        transcribed_text = transcription_data['speaker_turns_text']
+        text_source = "transcrição com turnos de fala por locutor"
+        logger.info(f"Task {task_id}: Usando turnos de fala por locutor para insights")
+    # Texto com diarização (mais contexto)
+    elif transcription_data.get('speakers_text'):
         transcribed_text = transcription_data['speakers_text']
         text_source = "transcrição com identificação de locutores"
         logger.info(f"Task {task_id}: Usando texto com diarização para insights (melhor contexto)")
@@ -226,52 +561,213 @@ def retry_insights_generation_route(task_id):
     else:
         logger.info(f"Task {task_id}: Usando texto simples para insights")
 
+    return {
+        "custom_prompt": custom_prompt,
+        "selected_model": selected_model,
+        "text": transcribed_text,
+        "text_source": text_source
+    }, None
+
+def process_insights_task(task_id, params):
+    """
+    Job em segundo plano: gera insights em streaming, publicando o texto parcial na tarefa.
+    Qualquer erro não tratado encerra a tarefa em "error_insights", para que
+    /stream_insights e o polling de status não esperem indefinidamente.
+    """
+    try:
+        generate_insights_for_task(task_id, params)
+    except Exception as e:
+        logger.exception(f"Task {task_id}: Erro inesperado ao gerar insights.")
+        task_service.update_task_status(task_id, status="error_insights", message=f"Erro inesperado ao gerar insights: {e}")
+
+def generate_insights_for_task(task_id, params):
+    custom_prompt = params['custom_prompt']
+    selected_model = params['selected_model']
+
     task_service.update_task_status(
         task_id,
         status="generating_insights",
-        progress=f"Gerando insights com o modelo {selected_model} baseado em {text_source}...",
+        progress=f"Gerando insights com o modelo {selected_model} baseado em {params['text_source']}...",
         current_prompt=custom_prompt,
         selected_model=selected_model,
-        insights=None # Limpa insights anteriores enquanto gera novos
+        insights=""  # Limpa insights anteriores enquanto gera novos
     )
 
-    # A conexão com Ollama é verificada dentro de generate_ollama_insights
-    insights_text, error_message = ollama_service.generate_ollama_insights(
-        transcribed_text,
-        custom_prompt,
-        selected_model
-    )
+    # Transcrições maiores que o contexto do modelo: resume por partes e aplica o prompt aos resumos
+    insights_input = params['text']
+    if insights_service.needs_map_reduce(insights_input):
+        insights_input, error_message = insights_service.reduce_transcript(
+            insights_input,
+            selected_model,
+            progress_callback=lambda message: task_service.update_task_status(task_id, status="generating_insights", progress=message)
+        )
+        if error_message:
+            task_service.update_task_status(task_id, status="error_insights", message=f"Erro ao resumir a transcrição: {error_message}")
+            logger.error(f"Task {task_id}: Erro na fase map dos insights: {error_message}")
+            return
+        task_service.update_task_status(task_id, status="generating_insights", progress=f"Gerando insights finais com o modelo {selected_model} a partir dos resumos parciais...")
 
+    # A conexão com Ollama é verificada dentro de stream_ollama_insights
+    token_stream, error_message = ollama_service.stream_ollama_insights(insights_input, custom_prompt, selected_model)
     if error_message:
-        task_service.update_task_status(
-            task_id,
-            status="error_insights",
-            message=f"Erro ao gerar insights: {error_message}"
-            # insights já foi limpo ou permanece None
-        )
+        task_service.update_task_status(task_id, status="error_insights", message=f"Erro ao gerar insights: {error_message}")
         logger.error(f"Task {task_id}: Erro ao gerar insights com Ollama: {error_message}") # Adicionado
-        return jsonify({
-            "success": False,
-            "message": f"Erro ao gerar insights: {error_message}",
-            "current_prompt": custom_prompt, # Retorna o prompt que foi usado
-            "selected_model": selected_model # Retorna o modelo que foi usado
-        }), 500 # Pode ser 503 se for erro de conexão com Ollama, ou 500 para outros
-    else:
-        task_service.update_task_status(
-            task_id,
-            status="completed_with_insights",
-            message="Insights gerados com sucesso!",
-            insights=insights_text
-            # current_prompt e selected_model já foram atualizados antes
-        )
-        logger.info(f"Task {task_id}: Insights gerados com sucesso com o modelo {selected_model}.") # Adicionado
-        return jsonify({
-            "success": True,
-            "message": "Insights gerados com sucesso!",
-            "insights": insights_text,
-            "current_prompt": custom_prompt,
-            "selected_model": selected_model
-        })
+        return
+
+    parts = []
+    last_update = time.monotonic()
+    try:
+        for token in token_stream:
+            parts.append(token)
+            # Publica o texto parcial na tarefa sem gravar a cada trecho
+            if time.monotonic() - last_update >= INSIGHTS_STREAM_UPDATE_SECONDS:
+                task_service.update_task_status(task_id, status="generating_insights", insights="".join(parts))
+                last_update = time.monotonic()
+    except ollama_service.OllamaStreamError as e:
+        task_service.update_task_status(task_id, status="error_insights", message=f"Erro ao gerar insights: {e}", insights="".join(parts))
+        logger.error(f"Task {task_id}: Erro durante a geração de insights: {e}")
+        return
+
+    task_service.update_task_status(
+        task_id,
+        status="completed_with_insights",
+        message="Insights gerados com sucesso!",
+        insights="".join(parts).strip()
+        # current_prompt e selected_model já foram atualizados antes
+    )
+    logger.info(f"Task {task_id}: Insights gerados com sucesso com o modelo {selected_model}.") # Adicionado
+
+def enqueue_insights_task(task_id, params):
+    """
+    Coloca a geração de insights na fila do Ollama.
+
+    Returns:
+        tuple: (posição na fila, resposta de erro) - a resposta de erro é None se o job foi aceito
+    """
+    if insights_scheduler.is_full():
+        return None, queue_full_response(insights_scheduler.retry_after(), "Servidor ocupado: a fila de insights está cheia. Tente novamente mais tarde.")
+
+    task_service.update_task_status(
+        task_id,
+        status="insights_queued",
+        message="Geração de insights na fila...",
+        current_prompt=params['custom_prompt'],
+        selected_model=params['selected_model']
+    )
+    try:
+        position = insights_scheduler.submit(task_id, process_insights_task, task_id, params)
+    except QueueFullError as e:
+        task_service.update_task_status(task_id, status="error_insights", message="A fila de insights está cheia. Tente novamente mais tarde.")
+        return None, queue_full_response(e.retry_after, "Servidor ocupado: a fila de insights está cheia. Tente novamente mais tarde.")
+    logger.info(f"Task {task_id}: Geração de insights com {params['selected_model']} enfileirada (posição {position}).")
+    return position, None
+
+@app.route('/retry_insights/<task_id>', methods=['POST'])
+def retry_insights_generation_route(task_id):
+    """
+    Enfileira a geração de insights e retorna imediatamente; o andamento e o
+    resultado são acompanhados por /status/<task_id> (ou /stream_insights).
+    """
+    params, error_response = prepare_insights_request(task_id)
+    if error_response:
+        return error_response
+
+    position, error_response = enqueue_insights_task(task_id, params)
+    if error_response:
+        return error_response
+
+    return jsonify({
+        "success": True,
+        "task_id": task_id,
+        "status": "insights_queued",
+        "queue_position": position,
+        "message": "Geração de insights iniciada.",
+        "current_prompt": params['custom_prompt'],
+        "selected_model": params['selected_model']
+    }), 202
+
+def sse_event(data, event=None):
+    """
+    Formata um evento Server-Sent Events com payload JSON.
+    """
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/stream_insights/<task_id>', methods=['POST'])
+def stream_insights_route(task_id):
+    """
+    Enfileira a geração de insights e acompanha o job em streaming (SSE):
+    o texto novo publicado na tarefa é enviado ao cliente assim que aparece.
+    Eventos: "queued" (posição na fila), "token" ({"token"}), "done" (insights completos) e "error".
+    Se o cliente desconectar, a geração continua em segundo plano.
+    """
+    params, error_response = prepare_insights_request(task_id)
+    if error_response:
+        return error_response
+
+    # Assina antes de enfileirar: nenhuma mudança feita pelo job se perde
+    subscriber = task_service.subscribe_task_updates(task_id)
+    position, error_response = enqueue_insights_task(task_id, params)
+    if error_response:
+        task_service.unsubscribe_task_updates(task_id, subscriber)
+        return error_response
+
+    def finished_event(status, fields):
+        # Campos leves vêm do resumo; dos volumosos só os insights são lidos
+        summary = task_service.get_task_summary(task_id) or {}
+        if status == "completed_with_insights":
+            insights = fields.get('insights')
+            return sse_event({
+                "insights": insights if insights is not None else task_service.get_task_payload(task_id, 'insights', ''),
+                "current_prompt": summary.get('current_prompt'),
+                "selected_model": summary.get('selected_model'),
+                "message": fields.get('message', summary.get('message'))
+            }, event="done")
+        return sse_event({"message": fields.get('message', summary.get('message'))}, event="error")
+
+    def generate():
+        yield sse_event({"queue_position": position}, event="queued")
+        sent = ""
+        last_change = time.monotonic()
+        try:
+            while True:
+                try:
+                    fields = subscriber.get(timeout=STATUS_STREAM_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    # Sem mudanças na tarefa por INSIGHTS_STREAM_IDLE_SECONDS (fila parada, Ollama travado):
+                    # encerra o stream; a geração continua em segundo plano e o resultado aparece em /status
+                    if time.monotonic() - last_change > INSIGHTS_STREAM_IDLE_SECONDS:
+                        yield sse_event({
+                            "message": "Nenhum progresso na geração de insights por muito tempo. Ela continua em segundo plano; acompanhe pelo status da tarefa."
+                        }, event="error")
+                        return
+                    summary = task_service.get_task_summary(task_id)
+                    if not summary:
+                        yield sse_event({"message": "Tarefa não encontrada."}, event="error")
+                        return
+                    if summary.get('status') in ("completed_with_insights", "error_insights"):
+                        yield finished_event(summary['status'], {})
+                        return
+                    # Comentário SSE: mantém proxies abertos e detecta clientes desconectados (GeneratorExit)
+                    yield ": keepalive\n\n"
+                    continue
+
+                last_change = time.monotonic()
+                status = fields.get('status')
+                if status in ("completed_with_insights", "error_insights"):
+                    yield finished_event(status, fields)
+                    return
+                insights = fields.get('insights')
+                if status == "generating_insights" and insights and insights.startswith(sent) and len(insights) > len(sent):
+                    yield sse_event({"token": insights[len(sent):]}, event="token")
+                    sent = insights
+        finally:
+            task_service.unsubscribe_task_updates(task_id, subscriber)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Evita buffer em proxies (nginx)
+    })
 
 @app.route('/toggle_diarization/<task_id>', methods=['POST'])
 def toggle_diarization_route(task_id):
@@ -408,8 +904,9 @@ def health_check():
     Verifica se a aplicação está funcionando corretamente.
     """
     try:
-        # Verificar se o modelo Whisper está carregado
-        whisper_status = whisper_service.is_model_loaded()
+        # Verificar se o modelo Whisper está carregado (sem bloquear durante o aquecimento)
+        readiness = transcription_readiness()
+        whisper_status = readiness["ready"]
 
         # Verificar se a pasta de uploads existe e é acessível
         uploads_accessible = os.path.exists(UPLOAD_FOLDER) and os.access(UPLOAD_FOLDER, os.W_OK)
@@ -417,36 +914,55 @@ def health_check():
         # Verificar conectividade com Ollama (opcional)
         ollama_status = ollama_service.is_ollama_available()
 
-        # Verificar diarização (opcional)
-        try:
-            from services.diarization_service import is_diarization_available
-            diarization_status = is_diarization_available()
-        except Exception:
-            diarization_status = False
-
-        # Status geral
-        status = "healthy" if (whisper_status and uploads_accessible) else "unhealthy"
+        # Diarização (opcional): só informa se já foi carregada, sem importar o pyannote aqui
+        from services.diarization_service import is_diarization_loaded
+        diarization_status = is_diarization_loaded()
+
+        # Status geral ("starting" enquanto o modelo aquece). No modo worker o processo web
+        # não depende dos workers para atender: o estado deles aparece em services.whisper e em /ready
+        if (whisper_status or EXTERNAL_WORKERS) and uploads_accessible:
+            status = "healthy"
+        elif readiness["state"] == "loading" and uploads_accessible:
+            status = "starting"
+        else:
+            status = "unhealthy"
+
+        whisper_health = {
+            "status": "available" if whisper_status else "unavailable",
+            "readiness": readiness,
+            "model": WHISPER_MODEL_NAME,
+            "backend": TRANSCRIPTION_BACKEND
+        }
+        if EXTERNAL_WORKERS:
+            whisper_health["workers"] = transcription_scheduler.get_workers()
+        else:
+            whisper_health["registry"] = whisper_service.model_registry.get_stats()
 
         health_data = {
             "status": status,
             "timestamp": time.time(),
             "services": {
-                "whisper": {
-                    "status": "available" if whisper_status else "unavailable",
-                    "model": WHISPER_MODEL_NAME
-                },
+                "whisper": whisper_health,
                 "uploads": {
                     "status": "accessible" if uploads_accessible else "inaccessible",
-                    "path": UPLOAD_FOLDER
+                    "path": UPLOAD_FOLDER,
+                    "cleanup": get_cleanup_stats()
                 },
                 "ollama": {
                     "status": "available" if ollama_status else "unavailable",
                     "url": OLLAMA_BASE_URL
                 },
                 "diarization": {
-                    "status": "available" if diarization_status else "unavailable"
+                    "status": "available" if diarization_status else "not_loaded"
                 }
             },
+            "queue": transcription_scheduler.get_stats(),
+            "insights_queue": insights_scheduler.get_stats(),
+            "transcription_batches": whisper_service.transcription_batcher.get_stats(),
+            "tasks": task_service.get_task_store_stats(),
+            "result_cache": result_cache.get_stats(),
+            "chunk_summary_cache": insights_service.get_stats(),
+            "upload_sessions": upload_sessions.get_stats(),
             "version": "1.0.0",
             "uptime": time.time()
         }
@@ -463,17 +979,26 @@ def health_check():
             "timestamp": time.time()
         }), 500
 
-# Inicialização do modelo Whisper
-logger.info("Tentando carregar o modelo Whisper na inicialização do aplicativo...") # Modificado
-model_loaded, model_msg = whisper_service.load_whisper_model() # Usa WHISPER_MODEL_NAME de config.py
-if model_loaded:
-    logger.info(f"Servidor Flask: {model_msg}") # Modificado
-else:
-    logger.warning(f"Servidor Flask: AVISO - {model_msg}. O modelo será carregado na primeira requisição, se possível.") # Modificado
+@app.route('/ready')
+def readiness_check():
+    """
+    Prontidão para transcrever: 200 quando o modelo padrão está carregado,
+    503 enquanto aquece ou se a carga falhou.
+    """
+    readiness = transcription_readiness()
+    return jsonify(readiness), 200 if readiness["ready"] else 503
+
+if EXTERNAL_WORKERS:
+    # O progresso é gravado pelos workers em outro processo: repassa as mudanças ao /status_stream
+    task_service.start_update_watcher(TASK_WATCH_SECONDS)
+# Inicialização do modelo Whisper em segundo plano: o servidor já atende enquanto o modelo carrega
+elif WHISPER_WARMUP_ON_START:
+    logger.info("Carregando o modelo Whisper em segundo plano...")
+    whisper_service.start_warmup()
 
 
 if __name__ == '__main__':
-    # A chamada para load_whisper_model() já ocorreu globalmente.
+    # O aquecimento do modelo já foi iniciado globalmente.
     # O Flask development server não é ideal para produção.
     port = int(os.getenv('FLASK_RUN_PORT', 5001))
     debug_mode = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark do tempo de inicialização do processo web.
+
+Importa app.py em um interpretador novo (com -X importtime) e mostra o tempo
+total, os módulos mais lentos e se algum pacote pesado (torch, whisper,
+pyannote) foi importado. O carregamento do modelo acontece em segundo plano,
+então o aquecimento é desativado (WHISPER_WARMUP_ON_START=false) durante a medição.
+
+Sai com código 1 se um módulo proibido for importado ou se o tempo passar de
+--max-seconds, para ser usado como verificação em CI.
+
+Execute com: python benchmarks/bench_import_time.py
+             python benchmarks/bench_import_time.py --max-seconds 2 --top 15
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["torch", "whisper", "pyannote", "faster_whisper"]
+
+# Roda dentro do processo filho: importa o app e lista os pacotes pesados carregados
+CHILD_SCRIPT = """
+import sys, json
+import app
+print(json.dumps(sorted({name.split('.')[0] for name in sys.modules})))
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Lê a saída de -X importtime e devolve [(módulo, microssegundos acumulados)].
+    """
+    timings = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        try:
+            _, cumulative_us, module = line[len("import time:"):].split("|")
+            timings.append((module.strip(), int(cumulative_us)))
+        except ValueError:
+            continue
+    return timings
+
+
+def run(forbidden, max_seconds, top):
+    env = dict(os.environ, WHISPER_WARMUP_ON_START="false", PYTHONDONTWRITEBYTECODE="1")
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD_SCRIPT],
+        cwd=ROOT_DIR, env=env, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - started
+
+    if completed.returncode != 0:
+        print(completed.stderr[-2000:])
+        print("Falha ao importar app.py")
+        return 1
+
+    loaded = set(json.loads(completed.stdout.strip().splitlines()[-1]))
+    timings = parse_importtime(completed.stderr)
+
+    print(f"Tempo até 'import app' terminar: {elapsed:.2f}s ({len(timings)} módulos importados)\n")
+    print(f"{'módulo':>40} | {'acumulado (ms)':>14}")
+    print("-" * 58)
+    # Só módulos de primeiro nível, para o acumulado não repetir os submódulos
+    top_level = [(module, us) for module, us in timings if "." not in module]
+    for module, us in sorted(top_level, key=lambda item: item[1], reverse=True)[:top]:
+        print(f"{module:>40} | {us / 1000:14.1f}")
+
+    status = 0
+    imported_forbidden = [module for module in forbidden if module in loaded]
+    print()
+    if imported_forbidden:
+        print(f"❌ Módulos pesados importados na inicialização: {', '.join(imported_forbidden)}")
+        status = 1
+    else:
+        print(f"✅ Nenhum módulo pesado importado ({', '.join(forbidden)})")
+    if max_seconds is not None and elapsed > max_seconds:
+        print(f"❌ Inicialização levou {elapsed:.2f}s (limite {max_seconds:.2f}s)")
+        status = 1
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--forbid", nargs="*", default=HEAVY_MODULES, help="Pacotes que não podem ser importados pelo app")
+    parser.add_argument("--max-seconds", type=float, default=None, help="Tempo máximo de importação")
+    parser.add_argument("--top", type=int, default=10, help="Quantidade de módulos mais lentos listados")
+    args = parser.parse_args()
+    sys.exit(run(args.forbid, args.max_seconds, args.top))
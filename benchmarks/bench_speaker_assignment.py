@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark da atribuição de locutores (combine_transcription_with_diarization).
+
+Compara a varredura linear antiga (O(N·M)) com o índice ordenado de
+services/speaker_assignment.py em entradas sintéticas de tamanho crescente.
+
+Execute com: python benchmarks/bench_speaker_assignment.py
+             python benchmarks/bench_speaker_assignment.py --sizes 1000 10000 --skip-legacy-above 5000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+# Adicionar o diretório pai ao path para imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.speaker_assignment import assign_speakers, build_speaker_turns
+
+
+def legacy_find_speaker_for_time(start_time, end_time, diarization_segments):
+    """Implementação anterior: ponto médio e depois sobreposição, ambos por varredura linear."""
+    mid_time = (start_time + end_time) / 2
+    for d_segment in diarization_segments:
+        if d_segment['start'] <= mid_time <= d_segment['end']:
+            return d_segment['speaker']
+    best_overlap = 0
+    best_speaker = "SPEAKER_UNKNOWN"
+    for d_segment in diarization_segments:
+        overlap = max(0, min(end_time, d_segment['end']) - max(start_time, d_segment['start']))
+        if overlap > best_overlap:
+            best_overlap = overlap
+            best_speaker = d_segment['speaker']
+    return best_speaker
+
+
+def synthetic_segments(count, mean_duration, speakers=None, seed=0):
+    """Gera segmentos contíguos com pequenas lacunas e, opcionalmente, locutores."""
+    rng = random.Random(seed)
+    segments = []
+    t = 0.0
+    for _ in range(count):
+        duration = rng.uniform(0.5, 2 * mean_duration)
+        segment = {'start': round(t, 2), 'end': round(t + duration, 2), 'text': ' palavra'}
+        if speakers:
+            segment['speaker'] = f"SPEAKER_{rng.randrange(speakers):02d}"
+        segments.append(segment)
+        t += duration + rng.uniform(0.0, 0.3)
+    return segments
+
+
+def with_words(segments, words_per_segment):
+    """Divide cada segmento em palavras de mesma duração."""
+    for segment in segments:
+        step = (segment['end'] - segment['start']) / words_per_segment
+        segment['words'] = [
+            {'word': ' palavra', 'start': segment['start'] + i * step, 'end': segment['start'] + (i + 1) * step}
+            for i in range(words_per_segment)
+        ]
+    return segments
+
+
+def run_words(sizes, words_per_segment):
+    print(f"\nAtribuição por palavra + turnos ({words_per_segment} palavras por segmento)")
+    print(f"{'palavras x M':>15} | {'tempo (s)':>11} | {'turnos':>8}")
+    print("-" * 41)
+    for size in sizes:
+        transcription = with_words(synthetic_segments(size, 3.0, seed=1), words_per_segment)
+        diarization = synthetic_segments(size, 3.0, speakers=4, seed=2)
+
+        started = time.perf_counter()
+        turns = build_speaker_turns(assign_speakers(transcription, diarization))
+        elapsed = time.perf_counter() - started
+
+        print(f"{f'{size * words_per_segment}x{size}':>15} | {elapsed:11.3f} | {len(turns):>8}")
+
+
+def run(sizes, skip_legacy_above):
+    print(f"{'N x M':>15} | {'índice (s)':>11} | {'linear (s)':>11} | {'ganho':>8}")
+    print("-" * 55)
+    for size in sizes:
+        transcription = synthetic_segments(size, 3.0, seed=1)
+        diarization = synthetic_segments(size, 3.0, speakers=4, seed=2)
+
+        started = time.perf_counter()
+        assign_speakers(transcription, diarization)
+        indexed = time.perf_counter() - started
+
+        if size <= skip_legacy_above:
+            started = time.perf_counter()
+            for segment in transcription:
+                legacy_find_speaker_for_time(segment['start'], segment['end'], diarization)
+            legacy = time.perf_counter() - started
+            legacy_text, speedup = f"{legacy:11.3f}", f"{legacy / indexed:7.1f}x"
+        else:
+            legacy_text, speedup = f"{'-':>11}", f"{'-':>8}"
+
+        print(f"{f'{size}x{size}':>15} | {indexed:11.3f} | {legacy_text} | {speedup}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 5000, 10000])
+    parser.add_argument("--skip-legacy-above", type=int, default=10000,
+                        help="Não executa a versão linear acima deste tamanho (ela é quadrática)")
+    parser.add_argument("--words-per-segment", type=int, default=8)
+    args = parser.parse_args()
+    run(args.sizes, args.skip_legacy_above)
+    run_words(args.sizes, args.words_per_segment)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark dos backends de transcrição (services/transcription_backends.py).
+
+Transcreve o mesmo áudio com cada backend e compara o fator de tempo real
+(tempo de transcrição / duração do áudio; abaixo de 1 é mais rápido que o
+tempo real) e a concordância do texto com o primeiro backend da lista.
+
+Execute com: python benchmarks/bench_transcription_backends.py audio.wav
+             python benchmarks/bench_transcription_backends.py audio.wav --backends whisper faster-whisper --model small
+"""
+
+import os
+import sys
+import time
+import difflib
+import argparse
+
+# Adicionar o diretório pai ao path para imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import WHISPER_MODEL_NAME
+from services.audio_service import load_audio, get_duration
+from services.transcription_backends import TRANSCRIPTION_BACKENDS, create_transcription_backend
+
+
+def word_agreement(reference, text):
+    """Fração de palavras em comum (difflib) entre o texto e a referência."""
+    reference_words = reference.lower().split()
+    words = text.lower().split()
+    if not reference_words and not words:
+        return 1.0
+    return difflib.SequenceMatcher(None, reference_words, words, autojunk=False).ratio()
+
+
+def run(audio_path, backend_names, model_name, repeat, word_timestamps):
+    audio = load_audio(audio_path)
+    duration = get_duration(audio)
+    params = {'fp16': False, 'word_timestamps': word_timestamps, 'language': 'pt'}
+    print(f"Áudio: {audio_path} ({duration:.1f}s), modelo '{model_name}', {repeat} execução(ões) por backend\n")
+    print(f"{'backend':>15} | {'carga (s)':>9} | {'transcrição (s)':>15} | {'RTF':>6} | {'segmentos':>9} | {'concordância':>12}")
+    print("-" * 82)
+
+    reference = None
+    for name in backend_names:
+        backend = create_transcription_backend(name, model_name)
+        started = time.perf_counter()
+        try:
+            backend.load()
+        except Exception as e:
+            print(f"{name:>15} | indisponível: {e}")
+            continue
+        load_seconds = time.perf_counter() - started
+
+        elapsed = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = backend.transcribe(audio, **params)
+            elapsed.append(time.perf_counter() - started)
+        best = min(elapsed)
+
+        if reference is None:
+            reference = result["text"]
+        agreement = word_agreement(reference, result["text"])
+        print(f"{name:>15} | {load_seconds:9.2f} | {best:15.2f} | {best / duration:6.3f} | "
+              f"{len(result['segments']):>9} | {agreement:11.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("audio", help="Arquivo de áudio usado em todas as execuções")
+    parser.add_argument("--backends", nargs="+", default=list(TRANSCRIPTION_BACKENDS), choices=list(TRANSCRIPTION_BACKENDS))
+    parser.add_argument("--model", default=WHISPER_MODEL_NAME)
+    parser.add_argument("--repeat", type=int, default=1, help="Execuções por backend (vale a mais rápida)")
+    parser.add_argument("--no-word-timestamps", action="store_true", help="Desativa os timestamps por palavra")
+    args = parser.parse_args()
+    run(args.audio, args.backends, args.model, args.repeat, not args.no_word_timestamps)
@@ -1,5 +1,4 @@
 import os
-import time
 import logging
 from dotenv import load_dotenv
 
@@ -21,6 +20,8 @@ project_root = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, project_root)
 
 from config import UPLOAD_FOLDER, UPLOAD_FILE_MAX_AGE_MINUTES
+# Mesma limpeza do agendador do app (idade, cota e tarefas em andamento)
+from helpers.file_utils import cleanup_old_files
 
 # Configuração do logging para o script de limpeza
 log_file_path = os.path.join(project_root, 'cleanup.log')
@@ -32,36 +33,10 @@ logging.basicConfig(level=logging.INFO,
                     ])
 logger = logging.getLogger(__name__)
 
-def cleanup_old_files():
-    logger.info(f"Iniciando verificação da pasta de uploads: {UPLOAD_FOLDER}")
-    logger.info(f"Tempo máximo de retenção de arquivo: {UPLOAD_FILE_MAX_AGE_MINUTES} minutos.")
-
-    if not os.path.isdir(UPLOAD_FOLDER):
-        logger.warning(f"Diretório de uploads {UPLOAD_FOLDER} não encontrado. Saindo.")
-        return
-
-    now = time.time()
-    files_deleted_count = 0
-    files_checked_count = 0
-
-    for filename in os.listdir(UPLOAD_FOLDER):
-        files_checked_count += 1
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        try:
-            if os.path.isfile(file_path):
-                file_age_seconds = now - os.path.getmtime(file_path)
-                file_age_minutes = file_age_seconds / 60
-
-                if file_age_minutes > UPLOAD_FILE_MAX_AGE_MINUTES:
-                    os.remove(file_path)
-                    files_deleted_count += 1
-                    logger.info(f"Arquivo antigo excluído: {file_path} (idade: {file_age_minutes:.2f} minutos)")
-        except Exception as e:
-            logger.error(f"Erro ao processar o arquivo {file_path}: {e}")
-
-    logger.info(f"Verificação concluída. {files_checked_count} arquivos verificados, {files_deleted_count} arquivos excluídos.")
-
 if __name__ == "__main__":
     logger.info("Script de limpeza de uploads iniciado manualmente.")
+    logger.info(f"Pasta: {UPLOAD_FOLDER}. Tempo máximo de retenção de arquivo: {UPLOAD_FILE_MAX_AGE_MINUTES} minutos.")
+    # Com TASK_BACKEND=memory as tarefas do servidor não são visíveis aqui: use sqlite para
+    # que os arquivos de tarefas em andamento sejam preservados
     cleanup_old_files()
     logger.info("Script de limpeza de uploads concluído.")
@@ -11,23 +11,94 @@ UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', os.path.join(os.path.dirname(os.path.
 ALLOWED_EXTENSIONS = set(os.getenv('ALLOWED_EXTENSIONS', 'mp3,wav,m4a,ogg,flac,mp4,avi,kwf').split(','))
 MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE_MB', 500)) * 1024 * 1024  # Em MB, convertido para Bytes
 UPLOAD_FILE_MAX_AGE_MINUTES = int(os.getenv('UPLOAD_FILE_MAX_AGE_MINUTES', 10))
+UPLOAD_FOLDER_MAX_BYTES = int(os.getenv('UPLOAD_FOLDER_MAX_MB', 0)) * 1024 * 1024  # Cota da pasta de uploads (0 = sem limite), convertida para Bytes
+UPLOAD_CHUNK_SIZE_KB = int(os.getenv('UPLOAD_CHUNK_SIZE_KB', 1024))  # Tamanho dos blocos lidos do corpo do upload e gravados em disco
+UPLOAD_SESSION_CHUNK_MB = int(os.getenv('UPLOAD_SESSION_CHUNK_MB', 8))  # Tamanho das partes no upload retomável (/uploads)
+UPLOAD_SESSION_TTL_MINUTES = int(os.getenv('UPLOAD_SESSION_TTL_MINUTES', 1440))  # Uploads em partes sem atividade por esse tempo são descartados
 
 # Whisper Model Configuration
 WHISPER_MODEL_NAME = os.getenv('WHISPER_MODEL_NAME', "base")
+TRANSCRIPTION_BACKEND = os.getenv('TRANSCRIPTION_BACKEND', 'whisper')  # "whisper", "whisper-int8" ou "faster-whisper"
+FASTER_WHISPER_COMPUTE_TYPE = os.getenv('FASTER_WHISPER_COMPUTE_TYPE', 'int8')  # int8, int8_float32, float32...
+FASTER_WHISPER_CPU_THREADS = int(os.getenv('FASTER_WHISPER_CPU_THREADS', 0))  # 0 = automático
+WHISPER_ALLOWED_MODELS = [name.strip() for name in os.getenv('WHISPER_ALLOWED_MODELS', 'tiny,base,small,medium').split(',') if name.strip()]  # Aceitos no campo "model" do upload
+WHISPER_MODELS_RAM_MB = int(os.getenv('WHISPER_MODELS_RAM_MB', 4096))  # Memória máxima dos modelos carregados (0 = sem limite)
+WHISPER_WARMUP_ON_START = os.getenv('WHISPER_WARMUP_ON_START', 'true').lower() == 'true'  # Carrega o modelo padrão em segundo plano ao iniciar
+
+# Long Audio Configuration (transcrição em blocos paralelos)
+LONG_AUDIO_MODE = os.getenv('LONG_AUDIO_MODE', 'false').lower() == 'true'
+LONG_AUDIO_MIN_SECONDS = int(os.getenv('LONG_AUDIO_MIN_SECONDS', 1200))  # Duração mínima para usar blocos
+LONG_AUDIO_CHUNK_SECONDS = int(os.getenv('LONG_AUDIO_CHUNK_SECONDS', 300))  # Duração alvo de cada bloco
+LONG_AUDIO_CHUNK_OVERLAP_SECONDS = float(os.getenv('LONG_AUDIO_CHUNK_OVERLAP_SECONDS', 1.0))
+TRANSCRIPTION_PROCESSES = int(os.getenv('TRANSCRIPTION_PROCESSES', 0))  # 0 = automático (núcleos / 4)
+
+# Result Cache Configuration (uploads idênticos reutilizam a transcrição)
+RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+RESULT_CACHE_DIR = os.getenv('RESULT_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'result_cache'))
+RESULT_CACHE_MAX_MB = int(os.getenv('RESULT_CACHE_MAX_MB', 1024))  # Tamanho máximo do cache em disco
+
+# Voice Activity Detection (transcreve apenas os trechos com voz)
+VAD_ENABLED = os.getenv('VAD_ENABLED', 'false').lower() == 'true'
+VAD_THRESHOLD_DB = float(os.getenv('VAD_THRESHOLD_DB', 12))  # Margem acima do piso de ruído para considerar voz
+VAD_MIN_SPEECH_SECONDS = float(os.getenv('VAD_MIN_SPEECH_SECONDS', 0.25))  # Trechos de voz mais curtos são descartados
+VAD_MIN_SILENCE_SECONDS = float(os.getenv('VAD_MIN_SILENCE_SECONDS', 1.0))  # Pausas mais curtas não separam trechos
+VAD_PADDING_SECONDS = float(os.getenv('VAD_PADDING_SECONDS', 0.3))  # Margem mantida antes e depois de cada trecho
+VAD_MAX_SPEECH_RATIO = float(os.getenv('VAD_MAX_SPEECH_RATIO', 0.9))  # Acima dessa fração de voz transcreve o áudio inteiro
+VAD_BATCH_SECONDS = int(os.getenv('VAD_BATCH_SECONDS', 300))  # Segundos de voz por lote enviado ao Whisper
+VAD_GAP_SECONDS = float(os.getenv('VAD_GAP_SECONDS', 0.5))  # Silêncio inserido entre trechos dentro de um lote
+
+# Audio Decoding Configuration
+AUDIO_CACHE_ENABLED = os.getenv('AUDIO_CACHE_ENABLED', 'false').lower() == 'true'  # Salva a forma de onda decodificada como .npy ao lado do upload
 
 # Ollama Configuration
 OLLAMA_BASE_URL = os.getenv('OLLAMA_API_URL', "http://localhost:11434")
 DEFAULT_INSIGHTS_PROMPT = os.getenv('DEFAULT_INSIGHTS_PROMPT', "Analise a seguinte transcrição e forneça um resumo dos principais pontos, identifique os principais tópicos discutidos e quaisquer ações ou decisões mencionadas. Considere o tom geral da conversa e quaisquer sentimentos expressos. O texto é: {{text}}")
 OLLAMA_REQUEST_TIMEOUT_SECONDS = int(os.getenv('OLLAMA_REQUEST_TIMEOUT_SECONDS', 300))
+OLLAMA_MODELS_CACHE_TTL_SECONDS = int(os.getenv('OLLAMA_MODELS_CACHE_TTL_SECONDS', 30))  # Validade da lista de modelos em cache
+OLLAMA_POOL_SIZE = int(os.getenv('OLLAMA_POOL_SIZE', 10))  # Conexões HTTP mantidas abertas com o Ollama
+INSIGHTS_STREAM_UPDATE_SECONDS = float(os.getenv('INSIGHTS_STREAM_UPDATE_SECONDS', 0.5))  # Intervalo de gravação do texto parcial durante a geração
+INSIGHTS_STREAM_IDLE_SECONDS = int(os.getenv('INSIGHTS_STREAM_IDLE_SECONDS', 1800))  # /stream_insights termina após esse tempo sem mudanças na tarefa
+STATUS_STREAM_KEEPALIVE_SECONDS = float(os.getenv('STATUS_STREAM_KEEPALIVE_SECONDS', 5))  # Keep-alive e atualização da posição na fila em /status_stream
+TRANSCRIPT_PAGE_SIZE = int(os.getenv('TRANSCRIPT_PAGE_SIZE', 200))  # Segmentos por página em /transcript
+TRANSCRIPT_MAX_PAGE_SIZE = int(os.getenv('TRANSCRIPT_MAX_PAGE_SIZE', 1000))  # Limite do parâmetro limit em /transcript
+
+# Map-reduce de insights (transcrições maiores que o contexto do modelo)
+INSIGHTS_MAP_REDUCE_ENABLED = os.getenv('INSIGHTS_MAP_REDUCE_ENABLED', 'true').lower() == 'true'
+INSIGHTS_CHUNK_TOKENS = int(os.getenv('INSIGHTS_CHUNK_TOKENS', 3000))  # Orçamento de tokens por bloco (abaixo do num_ctx do modelo)
+INSIGHTS_MAP_CONCURRENCY = int(os.getenv('INSIGHTS_MAP_CONCURRENCY', 2))  # Blocos resumidos em paralelo no Ollama
+INSIGHTS_MAP_PROMPT = os.getenv('INSIGHTS_MAP_PROMPT', "Resuma o trecho a seguir de uma transcrição, preservando os principais pontos, decisões, ações mencionadas e quem as mencionou. Responda apenas com o resumo. Trecho: {{text}}")
 
 # Task Management
-TASK_STATUS_DICT = {} # Mantém o status das tarefas de transcrição/insights
+TASK_BACKEND = os.getenv('TASK_BACKEND', 'memory')  # "memory" ou "sqlite" (persistente e compartilhado entre processos)
+TASK_DB_PATH = os.getenv('TASK_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'tasks.db'))
+TASK_TTL_MINUTES = int(os.getenv('TASK_TTL_MINUTES', 60))  # Tempo que uma tarefa finalizada permanece disponível
+TASK_MAX_ENTRIES = int(os.getenv('TASK_MAX_ENTRIES', 1000))  # Máximo de tarefas mantidas em memória
+TASK_MEMORY_BUDGET_MB = int(os.getenv('TASK_MEMORY_BUDGET_MB', 512))  # Memória estimada máxima para resultados de tarefas
+
+# Job Scheduler Configuration
+TRANSCRIPTION_WORKERS = int(os.getenv('TRANSCRIPTION_WORKERS', 1))  # Transcrições simultâneas
+TRANSCRIPTION_QUEUE_SIZE = int(os.getenv('TRANSCRIPTION_QUEUE_SIZE', 20))  # Máximo de jobs aguardando na fila
+PROGRESS_UPDATE_SECONDS = float(os.getenv('PROGRESS_UPDATE_SECONDS', 1.0))  # Intervalo mínimo entre gravações do progresso da transcrição
+WHISPER_BATCH_ENABLED = os.getenv('WHISPER_BATCH_ENABLED', 'false').lower() == 'true'  # Agrupa áudios curtos de jobs simultâneos
+WHISPER_BATCH_SIZE = int(os.getenv('WHISPER_BATCH_SIZE', 8))  # Máximo de janelas de 30s por lote
+WHISPER_BATCH_WAIT_MS = int(os.getenv('WHISPER_BATCH_WAIT_MS', 200))  # Espera máxima por outros jobs antes de executar o lote
+TRANSCRIPTION_EXECUTION_MODE = os.getenv('TRANSCRIPTION_EXECUTION_MODE', 'inline')  # "inline" (threads no processo web) ou "worker" (processos de worker.py; requer TASK_BACKEND=sqlite)
+JOB_QUEUE_DB_PATH = os.getenv('JOB_QUEUE_DB_PATH', TASK_DB_PATH)  # Fila de jobs compartilhada entre o processo web e os workers
+WORKER_PROCESSES = int(os.getenv('WORKER_PROCESSES', 1))  # Processos iniciados por worker.py (cada um com TRANSCRIPTION_WORKERS threads)
+WORKER_POLL_SECONDS = float(os.getenv('WORKER_POLL_SECONDS', 1.0))  # Intervalo de consulta da fila quando ela está vazia
+WORKER_HEARTBEAT_SECONDS = float(os.getenv('WORKER_HEARTBEAT_SECONDS', 5))  # Intervalo de sinal de vida dos workers
+WORKER_TIMEOUT_SECONDS = float(os.getenv('WORKER_TIMEOUT_SECONDS', 30))  # Sem sinal de vida por esse tempo, os jobs do worker voltam à fila
+TASK_WATCH_SECONDS = float(os.getenv('TASK_WATCH_SECONDS', 0.5))  # Intervalo em que o processo web lê as mudanças gravadas pelos workers (SSE)
+INSIGHTS_WORKERS = int(os.getenv('INSIGHTS_WORKERS', 1))  # Gerações de insights simultâneas (ajuste a OLLAMA_NUM_PARALLEL)
+INSIGHTS_QUEUE_SIZE = int(os.getenv('INSIGHTS_QUEUE_SIZE', 20))  # Máximo de gerações de insights aguardando na fila
 
 # Diarization Configuration
 ENABLE_SPEAKER_DIARIZATION = os.getenv('ENABLE_SPEAKER_DIARIZATION', 'true').lower() == 'true'
 DEFAULT_MIN_SPEAKERS = int(os.getenv('DEFAULT_MIN_SPEAKERS', 1))
 DEFAULT_MAX_SPEAKERS = int(os.getenv('DEFAULT_MAX_SPEAKERS', 10))
 HUGGINGFACE_TOKEN = os.getenv('HUGGINGFACE_HUB_TOKEN', None)  # Token para modelos que requerem autenticação
+DIARIZATION_EXECUTION_MODE = os.getenv('DIARIZATION_EXECUTION_MODE', 'sequential')  # "sequential" ou "concurrent" (em paralelo à transcrição)
+DIARIZATION_THREAD_SHARE = float(os.getenv('DIARIZATION_THREAD_SHARE', 0.4))  # Fração dos núcleos reservada à diarização concorrente
 
 # Outras configurações podem ser adicionadas aqui
 # Por exemplo, configurações de logging, chaves de API (se aplicável no futuro), etc.
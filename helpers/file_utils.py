@@ -4,7 +4,9 @@ import time
 import logging
 import threading
 from werkzeug.utils import secure_filename
-from config import UPLOAD_FOLDER, UPLOAD_FILE_MAX_AGE_MINUTES, ALLOWED_EXTENSIONS # Adicionado UPLOAD_FILE_MAX_AGE_MINUTES
+from config import UPLOAD_FOLDER, UPLOAD_FILE_MAX_AGE_MINUTES, ALLOWED_EXTENSIONS, UPLOAD_FOLDER_MAX_BYTES # Adicionado UPLOAD_FILE_MAX_AGE_MINUTES
+from services import task_service
+from services.upload_session_service import upload_sessions, SESSIONS_DIR_NAME
 
 # Logger para as funções de file_utils, pode usar o logger raiz configurado em app.py
 # ou um logger específico se preferir granularidade.
@@ -14,6 +16,9 @@ from config import UPLOAD_FOLDER, UPLOAD_FILE_MAX_AGE_MINUTES, ALLOWED_EXTENSION
 # um logger local precisaria ser configurado aqui.
 logger = logging.getLogger(__name__) # Usará a configuração do logger raiz
 
+# Prefixo dos arquivos ainda em recebimento (ver helpers/upload_stream.py)
+PARTIAL_UPLOAD_PREFIX = ".upload-"
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -28,40 +33,184 @@ def save_uploaded_file(file):
         return file_path
     return None
 
-def cleanup_old_files():
-    logger.info(f"Iniciando verificação da pasta de uploads para limpeza: {UPLOAD_FOLDER}")
-    logger.info(f"Tempo máximo de retenção de arquivo configurado: {UPLOAD_FILE_MAX_AGE_MINUTES} minutos.")
+# Status em que o arquivo da tarefa ainda vai ser (ou está sendo) lido: nunca é removido na limpeza
+# ("pending" cobre o intervalo entre mover o upload para a pasta e colocá-lo na fila)
+ACTIVE_TASK_STATUSES = ("pending", "queued", "processing")
+
+# Métricas acumuladas da limpeza, expostas em /health
+_cleanup_stats_lock = threading.Lock()
+_cleanup_stats = {
+    "runs": 0,
+    "files_deleted": 0,
+    "bytes_freed": 0,
+    "skipped_in_use": 0,
+    "last_run_at": None,
+    "last_scan_seconds": 0.0,
+    "last_usage_bytes": 0,
+    "quota_bytes": UPLOAD_FOLDER_MAX_BYTES
+}
+
+# Acorda o agendador antes do intervalo (ex.: um upload grande chegou e a cota pode ter estourado)
+_cleanup_wakeup = threading.Event()
+
+def _task_id_from_filename(filename):
+    # Uploads são salvos como "<task_id>_<nome>" (e o cache de áudio como "<task_id>_<nome>.npy")
+    return filename.split('_', 1)[0] if '_' in filename else None
+
+def _is_in_use(filename, expired, task_status_cache):
+    """
+    Indica se o arquivo não pode ser removido: upload ainda em recebimento
+    (arquivo parcial recente) ou de uma tarefa na fila ou em processamento.
+    """
+    if filename.startswith(PARTIAL_UPLOAD_PREFIX):
+        # Parciais são gravados a cada bloco recebido: só saem quando param de receber dados
+        return not expired
+    task_id = _task_id_from_filename(filename)
+    if not task_id:
+        return False
+    if task_id not in task_status_cache:
+        summary = task_service.get_task_summary(task_id)
+        task_status_cache[task_id] = summary.get("status") if summary else None
+    return task_status_cache[task_id] in ACTIVE_TASK_STATUSES
+
+def _sessions_disk_usage(sessions_dir):
+    """
+    Espaço em disco ocupado pelos uploads em partes (blocos alocados de cada data.part).
+    """
+    total = 0
+    with os.scandir(sessions_dir) as it:
+        for entry in it:
+            try:
+                stat = os.stat(os.path.join(entry.path, "data.part"))
+            except OSError:
+                continue  # Sessão finalizada ou removida durante a listagem
+            blocks = getattr(stat, "st_blocks", None)
+            total += min(stat.st_size, blocks * 512) if blocks is not None else stat.st_size
+    return total
+
+def cleanup_old_files(max_age_minutes=None, max_total_bytes=None):
+    """
+    Limpa a pasta de uploads em uma única passada com os.scandir (o stat de
+    cada entrada vem da própria listagem): remove os arquivos mais antigos que
+    max_age_minutes e, se o total ainda passar de max_total_bytes, continua
+    removendo do mais antigo para o mais novo até caber na cota. Arquivos de
+    tarefas na fila ou em processamento nunca são removidos.
+
+    Os uploads em partes (SESSIONS_DIR_NAME) contam para a cota pelo espaço
+    que de fato ocupam em disco (data.part é esparso), mas não são removidos
+    aqui: expiram por UPLOAD_SESSION_TTL_MINUTES (upload_sessions.cleanup_expired).
+
+    Args:
+        max_age_minutes (int, optional): Idade máxima (padrão: UPLOAD_FILE_MAX_AGE_MINUTES)
+        max_total_bytes (int, optional): Cota da pasta em bytes, 0 sem limite (padrão: UPLOAD_FOLDER_MAX_MB)
+
+    Returns:
+        dict: files_checked, files_deleted, bytes_freed, skipped_in_use, usage_bytes,
+              sessions_bytes e scan_seconds
+              (None se a pasta não existir)
+    """
+    if max_age_minutes is None:
+        max_age_minutes = UPLOAD_FILE_MAX_AGE_MINUTES
+    if max_total_bytes is None:
+        max_total_bytes = UPLOAD_FOLDER_MAX_BYTES
 
     if not os.path.isdir(UPLOAD_FOLDER):
         logger.warning(f"Diretório de uploads {UPLOAD_FOLDER} não encontrado. Limpeza ignorada.")
-        return
-
-    now = time.time()
-    files_deleted_count = 0
-    files_checked_count = 0
+        return None
 
+    started = time.perf_counter()
+    deadline = time.time() - max_age_minutes * 60
+    files = []
+    sessions_bytes = 0
     try:
-        for filename in os.listdir(UPLOAD_FOLDER):
-            files_checked_count += 1
-            file_path = os.path.join(UPLOAD_FOLDER, filename)
-            try:
-                if os.path.isfile(file_path):
-                    file_age_seconds = now - os.path.getmtime(file_path)
-                    file_age_minutes = file_age_seconds / 60
-
-                    if file_age_minutes > UPLOAD_FILE_MAX_AGE_MINUTES:
-                        os.remove(file_path)
-                        files_deleted_count += 1
-                        logger.info(f"Arquivo antigo excluído: {file_path} (idade: {file_age_minutes:.2f} minutos)")
-            except Exception as e:
-                logger.error(f"Erro ao processar o arquivo {file_path} durante a limpeza: {e}")
-    except Exception as e:
+        with os.scandir(UPLOAD_FOLDER) as it:
+            for entry in it:
+                try:
+                    if entry.name == SESSIONS_DIR_NAME and entry.is_dir(follow_symlinks=False):
+                        sessions_bytes = _sessions_disk_usage(entry.path)
+                        continue
+                    # Outras subpastas não são da aplicação
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue  # Removido durante a listagem
+                files.append((stat.st_mtime, stat.st_size, entry.name, entry.path))
+    except OSError as e:
         logger.error(f"Erro ao listar arquivos no diretório de uploads {UPLOAD_FOLDER}: {e}")
+        return None
+
+    files.sort()  # Mais antigos primeiro
+    usage_bytes = sum(size for _, size, _, _ in files) + sessions_bytes
+    files_deleted = 0
+    bytes_freed = 0
+    skipped_in_use = 0
+    task_status_cache = {}
+
+    for mtime, size, filename, file_path in files:
+        expired = mtime < deadline
+        over_quota = max_total_bytes > 0 and usage_bytes > max_total_bytes
+        if not expired and not over_quota:
+            break  # Os seguintes são mais novos e a cota já foi atendida
+        try:
+            if _is_in_use(filename, expired, task_status_cache):
+                skipped_in_use += 1
+                continue
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass  # Já removido pela própria tarefa
+        except Exception as e:
+            logger.error(f"Erro ao processar o arquivo {file_path} durante a limpeza: {e}")
+            continue
+        usage_bytes -= size
+        bytes_freed += size
+        files_deleted += 1
+        reason = "antigo" if expired else "acima da cota"
+        logger.info(f"Arquivo {reason} excluído: {file_path} (idade: {(time.time() - mtime) / 60:.2f} minutos, {size} bytes)")
+
+    scan_seconds = time.perf_counter() - started
+    if max_total_bytes > 0 and usage_bytes > max_total_bytes:
+        logger.warning(
+            f"Pasta de uploads acima da cota ({usage_bytes} de {max_total_bytes} bytes): "
+            f"os arquivos restantes pertencem a tarefas em andamento."
+        )
+    logger.info(
+        f"Verificação de limpeza concluída em {scan_seconds:.3f}s. {len(files)} arquivos verificados, "
+        f"{files_deleted} arquivos excluídos ({bytes_freed} bytes liberados)."
+    )
+
+    with _cleanup_stats_lock:
+        _cleanup_stats["runs"] += 1
+        _cleanup_stats["files_deleted"] += files_deleted
+        _cleanup_stats["bytes_freed"] += bytes_freed
+        _cleanup_stats["skipped_in_use"] += skipped_in_use
+        _cleanup_stats["last_run_at"] = time.time()
+        _cleanup_stats["last_scan_seconds"] = round(scan_seconds, 4)
+        _cleanup_stats["last_usage_bytes"] = usage_bytes
+        _cleanup_stats["quota_bytes"] = max_total_bytes
 
-    if files_checked_count > 0:
-        logger.info(f"Verificação de limpeza concluída. {files_checked_count} arquivos verificados, {files_deleted_count} arquivos excluídos.")
-    else:
-        logger.info(f"Verificação de limpeza concluída. Nenhum arquivo encontrado em {UPLOAD_FOLDER}.")
+    return {
+        "files_checked": len(files),
+        "files_deleted": files_deleted,
+        "bytes_freed": bytes_freed,
+        "skipped_in_use": skipped_in_use,
+        "usage_bytes": usage_bytes,
+        "sessions_bytes": sessions_bytes,
+        "scan_seconds": scan_seconds
+    }
+
+def get_cleanup_stats():
+    """
+    Retorna as métricas acumuladas da limpeza (arquivos e bytes removidos, duração da última varredura).
+    """
+    with _cleanup_stats_lock:
+        return dict(_cleanup_stats)
+
+def request_cleanup():
+    """
+    Antecipa a próxima limpeza do agendador (sem efeito se ele não estiver rodando).
+    """
+    _cleanup_wakeup.set()
 
 def start_cleanup_scheduler(interval_minutes=None):
     """
@@ -79,8 +228,15 @@ def start_cleanup_scheduler(interval_minutes=None):
 
     def scheduler_task():
         while True:
-            cleanup_old_files()
-            time.sleep(interval_minutes * 60) # Converte minutos para segundos
+            try:
+                cleanup_old_files()
+                # Uploads em partes têm validade própria (UPLOAD_SESSION_TTL_MINUTES), contada da última parte recebida
+                upload_sessions.cleanup_expired()
+            except Exception as e:
+                logger.error(f"Erro na limpeza periódica de uploads: {e}")
+            # Espera o intervalo ou um pedido de request_cleanup
+            _cleanup_wakeup.wait(interval_minutes * 60) # Converte minutos para segundos
+            _cleanup_wakeup.clear()
 
     scheduler_thread = threading.Thread(target=scheduler_task, daemon=True)
     scheduler_thread.start()
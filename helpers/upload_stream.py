@@ -0,0 +1,129 @@
+# Recebimento de uploads direto na pasta final, com hash e tamanho calculados durante a leitura
+import os
+import uuid
+import hashlib
+from flask import Request
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from werkzeug.formparser import FormDataParser, MultiPartParser
+from config import UPLOAD_FOLDER, MAX_FILE_SIZE, UPLOAD_CHUNK_SIZE_KB
+# Arquivos ainda em recebimento usam PARTIAL_UPLOAD_PREFIX (sobras de uploads interrompidos saem na limpeza periódica)
+from helpers.file_utils import allowed_file, PARTIAL_UPLOAD_PREFIX
+
+
+class UploadRejected(BadRequest):
+    """
+    Upload recusado assim que o cabeçalho do arquivo chega, antes de o corpo ser lido.
+    """
+
+
+class HashingUploadFile:
+    """
+    Destino de um arquivo do formulário multipart: os blocos são gravados
+    direto em um arquivo oculto dentro da pasta de uploads, e o SHA-256 e o
+    tamanho são calculados a cada bloco recebido.
+
+    move_to renomeia o arquivo para o caminho final (mesmo sistema de
+    arquivos, sem cópia). Se move_to não for chamado, close apaga o arquivo.
+    """
+
+    def __init__(self, directory, max_bytes):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{PARTIAL_UPLOAD_PREFIX}{uuid.uuid4().hex}.part")
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._file = open(self.path, "w+b")
+        self._committed = False
+
+    @property
+    def sha256(self):
+        return self._digest.hexdigest()
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise RequestEntityTooLarge()
+        self._digest.update(data)
+        return self._file.write(data)
+
+    def move_to(self, destination):
+        """
+        Fecha o arquivo e o move para destination.
+        """
+        self._file.close()
+        os.replace(self.path, destination)
+        self.path = destination
+        self._committed = True
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        if not self._committed:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def __getattr__(self, name):
+        # read, seek, tell, readline... do arquivo subjacente
+        return getattr(self._file, name)
+
+
+class ChunkedFormDataParser(FormDataParser):
+    """
+    FormDataParser que lê o corpo multipart em blocos de UPLOAD_CHUNK_SIZE_KB
+    (o padrão do Werkzeug é 64 KB).
+    """
+
+    def _parse_multipart(self, stream, mimetype, content_length, options):
+        chunk_size = UPLOAD_CHUNK_SIZE_KB * 1024
+        # O decodificador aplica max_form_memory_size também ao seu buffer interno
+        # (um bloco lido mais a sobra do anterior): o limite precisa comportar dois blocos
+        max_form_memory_size = self.max_form_memory_size
+        if max_form_memory_size is not None:
+            max_form_memory_size = max(max_form_memory_size, 2 * chunk_size)
+        parser = MultiPartParser(
+            stream_factory=self.stream_factory,
+            max_form_memory_size=max_form_memory_size,
+            max_form_parts=self.max_form_parts,
+            cls=self.cls,
+            buffer_size=chunk_size
+        )
+        boundary = options.get("boundary", "").encode("ascii")
+        if not boundary:
+            raise ValueError("Missing boundary")
+        form, files = parser.parse(stream, boundary, content_length)
+        return stream, form, files
+
+
+class StreamingUploadRequest(Request):
+    """
+    Request do Flask em que os arquivos enviados vão direto para UPLOAD_FOLDER
+    como HashingUploadFile, em vez de passar por um arquivo temporário do
+    Werkzeug e depois ser copiados com FileStorage.save.
+
+    Extensões não permitidas são recusadas (UploadRejected) pelo nome do
+    arquivo, antes de ler o conteúdo; corpos maiores que MAX_CONTENT_LENGTH
+    já são recusados pelo Werkzeug a partir do Content-Length.
+    """
+
+    form_data_parser_class = ChunkedFormDataParser
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if filename and not allowed_file(filename):
+            raise UploadRejected("Tipo de arquivo não permitido.")
+        upload = HashingUploadFile(UPLOAD_FOLDER, self.max_content_length or MAX_FILE_SIZE)
+        # Guardado aqui também: um arquivo interrompido no meio não entra em request.files
+        if not hasattr(self, "_upload_files"):
+            self._upload_files = []
+        self._upload_files.append(upload)
+        return upload
+
+    def close(self):
+        super().close()
+        for upload in getattr(self, "_upload_files", ()):
+            upload.close()
@@ -1,5 +1,6 @@
 let currentTaskId = null;
 let statusCheckInterval = null;
+let statusEventSource = null;
 const defaultInsightsPrompt = "Analise a seguinte transcrição e forneça um resumo dos principais pontos, identifique os principais tópicos discutidos e quaisquer ações ou decisões mencionadas. Considere o tom geral da conversa e quaisquer sentimentos expressos. O texto é: {{text}}";
 
 // Verificar modelo na inicialização
@@ -28,9 +29,15 @@ function checkModel() {
         return;
       }
 
+      populateWhisperModels(data.models, data.default_model);
       if (data.success) {
         modelStatus.textContent = data.message;
         indicator.className = 'status-indicator online';
+      } else if (data.state === 'loading') {
+        // O servidor ainda está carregando o modelo em segundo plano
+        modelStatus.textContent = data.message;
+        indicator.className = 'status-indicator loading';
+        setTimeout(checkModel, 2000);
       } else {
         modelStatus.textContent = data.message;
         indicator.className = 'status-indicator error';
@@ -230,6 +237,11 @@ function createFileList(file) {
   return dataTransfer.files;
 }
 
+// Arquivos a partir deste tamanho são enviados em partes (/uploads), retomáveis após quedas de conexão
+const CHUNKED_UPLOAD_MIN_BYTES = 64 * 1024 * 1024;
+// Tentativas por parte antes de desistir do upload
+const CHUNK_UPLOAD_RETRIES = 3;
+
 function startTranscription() {
   const fileInput = document.getElementById('file-input');
   if (!fileInput || !fileInput.files || fileInput.files.length === 0) {
@@ -237,23 +249,25 @@ function startTranscription() {
     return;
   }
 
-  const formData = new FormData();
-  formData.append('file', fileInput.files[0]);
-
-  // Adiciona opção de diarização
+  const file = fileInput.files[0];
   const diarizationEnabled = document.getElementById('use-diarization');
-  if (diarizationEnabled) {
-    formData.append('enable_diarization', diarizationEnabled.checked);
-  }
+  const whisperModel = document.getElementById('whisper-model');
+  const options = {
+    // Opção de diarização
+    enable_diarization: diarizationEnabled ? diarizationEnabled.checked : false,
+    // Modelo Whisper escolhido (vazio usa o padrão do servidor)
+    model: whisperModel && whisperModel.value ? whisperModel.value : ''
+  };
 
   showStatus('Enviando arquivo...', 'loading');
   showProgress(true);
 
-  fetch('http://localhost:5001/upload', {
-    method: 'POST',
-    body: formData
-  })
-    .then(response => response.json())
+  // O SHA-256 de cada parte usa crypto.subtle (disponível em localhost e HTTPS)
+  const upload = file.size >= CHUNKED_UPLOAD_MIN_BYTES && window.crypto && window.crypto.subtle
+    ? uploadInChunks(file, options)
+    : uploadWholeFile(file, options);
+
+  upload
     .then(data => {
       if (data.success) {
         currentTaskId = data.task_id;
@@ -270,11 +284,103 @@ function startTranscription() {
     });
 }
 
+function uploadWholeFile(file, options) {
+  const formData = new FormData();
+  formData.append('file', file);
+  formData.append('enable_diarization', options.enable_diarization);
+  if (options.model) {
+    formData.append('model', options.model);
+  }
+
+  return fetch('http://localhost:5001/upload', {
+    method: 'POST',
+    body: formData
+  }).then(response => response.json());
+}
+
+function uploadInChunks(file, options) {
+  return fetch('http://localhost:5001/uploads', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({
+      filename: file.name,
+      size: file.size,
+      enable_diarization: options.enable_diarization,
+      model: options.model
+    })
+  })
+    .then(response => response.json())
+    .then(session => {
+      if (!session.success) {
+        return session;
+      }
+      return uploadMissingChunks(file, session).then(() =>
+        fetch(`http://localhost:5001/uploads/${session.upload_id}/finalize`, { method: 'POST' })
+          .then(response => response.json())
+      );
+    });
+}
+
+function uploadMissingChunks(file, session) {
+  const pending = session.missing_chunks.slice();
+  const total = session.total_chunks;
+
+  function next() {
+    if (pending.length === 0) {
+      return Promise.resolve();
+    }
+    const index = pending.shift();
+    showStatus(`Enviando arquivo... parte ${total - pending.length} de ${total}`, 'loading');
+    return uploadChunk(file, session, index, CHUNK_UPLOAD_RETRIES).then(next);
+  }
+
+  return next();
+}
+
+function uploadChunk(file, session, index, retries) {
+  const start = index * session.chunk_size;
+  const stop = Math.min(start + session.chunk_size, file.size);
+  const chunk = file.slice(start, stop);
+
+  return chunk.arrayBuffer()
+    .then(buffer => crypto.subtle.digest('SHA-256', buffer).then(digest => ({ buffer, digest })))
+    .then(({ buffer, digest }) => fetch(`http://localhost:5001/uploads/${session.upload_id}`, {
+      method: 'PUT',
+      headers: {
+        'Content-Type': 'application/octet-stream',
+        'Content-Range': `bytes ${start}-${stop - 1}/${file.size}`,
+        'X-Chunk-SHA256': Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('')
+      },
+      body: buffer
+    }))
+    .then(response => response.json().then(data => {
+      if (!data.success) {
+        throw new Error(data.message);
+      }
+      return data;
+    }))
+    .catch(error => {
+      // Queda de conexão ou checksum divergente: reenvia só esta parte
+      if (retries > 0) {
+        return uploadChunk(file, session, index, retries - 1);
+      }
+      throw error;
+    });
+}
+
 function startStatusCheck() {
-  if (statusCheckInterval) {
-    clearInterval(statusCheckInterval);
+  stopStatusUpdates();
+
+  // Preferir o stream SSE: o servidor envia só as mudanças e a transcrição completa uma única vez
+  if (window.EventSource) {
+    startStatusStream();
+    return;
   }
 
+  startStatusPolling();
+}
+
+function startStatusPolling() {
   statusCheckInterval = setInterval(() => {
     if (currentTaskId) {
       checkTranscriptionStatus();
@@ -282,100 +388,171 @@ function startStatusCheck() {
   }, 2000);
 }
 
+function startStatusStream() {
+  let taskState = {};
+  statusEventSource = new EventSource(`http://localhost:5001/status_stream/${currentTaskId}`);
+
+  statusEventSource.addEventListener('status', event => {
+    const delta = JSON.parse(event.data);
+    if (delta.insights_append) {
+      taskState.insights = (taskState.insights || '') + delta.insights_append;
+      delete delta.insights_append;
+    }
+    taskState = Object.assign(taskState, delta);
+    handleStatusUpdate(taskState);
+  });
+
+  statusEventSource.addEventListener('transcript', event => {
+    taskState = JSON.parse(event.data);
+    handleStatusUpdate(taskState);
+  });
+
+  statusEventSource.onerror = () => {
+    // Stream indisponível (ex.: tarefa inexistente ou proxy sem SSE): volta ao polling
+    stopStatusUpdates();
+    if (currentTaskId) {
+      startStatusPolling();
+    }
+  };
+}
+
+function stopStatusUpdates() {
+  if (statusCheckInterval) {
+    clearInterval(statusCheckInterval);
+    statusCheckInterval = null;
+  }
+  if (statusEventSource) {
+    statusEventSource.close();
+    statusEventSource = null;
+  }
+}
+
 function checkTranscriptionStatus() {
+  // /status é enxuto; a tarefa completa só é buscada quando há resultado para exibir
   fetch(`http://localhost:5001/status/${currentTaskId}`)
     .then(response => response.json())
     .then(data => {
-      if (data.status === 'processing') {
-        showStatus(data.progress || 'Processando transcrição...', 'loading');
-      } else if (data.status === 'transcription_completed') {
-        showStatus(data.message || 'Transcrição Concluída!', 'success');
-
-        // Atualiza o resultado da transcrição
-        displayTranscriptionResult(data);
-
-        // Mostra a seção de resultados
-        const resultsSection = document.getElementById('results-section');
-        if (resultsSection) {
-          resultsSection.style.display = 'block';
-        }
+      if (['transcription_completed', 'completed_with_insights', 'error_insights'].includes(data.status)) {
+        return fetch(`http://localhost:5001/status/${currentTaskId}?full=1`).then(response => response.json());
+      }
+      return data;
+    })
+    .then(handleStatusUpdate)
+    .catch(error => {
+      showStatus('Erro ao verificar status: ' + error, 'error');
+      showProgress(false);
+      stopStatusUpdates();
+    });
+}
 
-        // Prepara para geração de Insights
-        populateOllamaModels(data.available_ollama_models || []);
-        fetchAndDisplayPrompt(currentTaskId, data.current_prompt);
+function handleStatusUpdate(data) {
+  if (data.status === 'queued') {
+    const position = data.queue_position ? ` (posição ${data.queue_position} na fila)` : '';
+    showStatus((data.message || 'Aguardando na fila...') + position, 'loading');
+  } else if (data.status === 'processing') {
+    showStatus(data.progress || 'Processando transcrição...', 'loading');
+  } else if (data.status === 'transcription_completed') {
+    showStatus(data.message || 'Transcrição Concluída!', 'success');
+
+    // Atualiza o resultado da transcrição
+    displayTranscriptionResult(data);
+
+    // Mostra a seção de resultados
+    const resultsSection = document.getElementById('results-section');
+    if (resultsSection) {
+      resultsSection.style.display = 'block';
+    }
 
-        const generateBtn = document.getElementById('generate-insights-btn');
-        if (generateBtn) {
-          generateBtn.textContent = '💡 Gerar Insights';
-        }
+    // Prepara para geração de Insights
+    populateOllamaModels(data.available_ollama_models || []);
+    fetchAndDisplayPrompt(currentTaskId, data.current_prompt);
 
-        showProgress(false);
-        clearInterval(statusCheckInterval);
+    const generateBtn = document.getElementById('generate-insights-btn');
+    if (generateBtn) {
+      generateBtn.textContent = '💡 Gerar Insights';
+    }
 
-      } else if (data.status === 'generating_insights') {
-        showStatus(data.progress || 'Gerando insights...', 'loading');
+    showProgress(false);
+    stopStatusUpdates();
 
-      } else if (data.status === 'completed_with_insights') {
-        showStatus(data.message || 'Insights gerados com sucesso!', 'success');
+  } else if (data.status === 'insights_queued') {
+    const position = data.queue_position ? ` (posição ${data.queue_position} na fila)` : '';
+    showStatus((data.message || 'Geração de insights na fila...') + position, 'loading');
 
-        const insightsResult = document.getElementById('insights-result');
-        if (insightsResult) {
-          insightsResult.textContent = data.insights;
-        }
+  } else if (data.status === 'generating_insights') {
+    showStatus(data.progress || 'Gerando insights...', 'loading');
 
-        const insightsContainer = document.getElementById('insights-result-container');
-        if (insightsContainer) {
-          insightsContainer.style.display = 'block';
-        }
+  } else if (data.status === 'completed_with_insights') {
+    showStatus(data.message || 'Insights gerados com sucesso!', 'success');
 
-        fetchAndDisplayPrompt(currentTaskId, data.current_prompt, data.selected_model);
+    const insightsResult = document.getElementById('insights-result');
+    if (insightsResult) {
+      insightsResult.textContent = data.insights;
+    }
 
-        const generateBtn = document.getElementById('generate-insights-btn');
-        if (generateBtn) {
-          generateBtn.textContent = '🔁 Regerar Insights';
-        }
+    const insightsContainer = document.getElementById('insights-result-container');
+    if (insightsContainer) {
+      insightsContainer.style.display = 'block';
+    }
 
-        showProgress(false);
-        clearInterval(statusCheckInterval);
+    fetchAndDisplayPrompt(currentTaskId, data.current_prompt, data.selected_model);
 
-      } else if (data.status === 'error_insights') {
-        showStatus(data.message || 'Erro ao gerar insights.', 'error');
+    const generateBtn = document.getElementById('generate-insights-btn');
+    if (generateBtn) {
+      generateBtn.textContent = '🔁 Regerar Insights';
+    }
 
-        const insightsResult = document.getElementById('insights-result');
-        if (insightsResult) {
-          insightsResult.textContent = data.message || 'Falha ao gerar insights.';
-        }
+    showProgress(false);
+    stopStatusUpdates();
 
-        const insightsContainer = document.getElementById('insights-result-container');
-        if (insightsContainer) {
-          insightsContainer.style.display = 'block';
-        }
+  } else if (data.status === 'error_insights') {
+    showStatus(data.message || 'Erro ao gerar insights.', 'error');
 
-        fetchAndDisplayPrompt(currentTaskId, data.current_prompt, data.selected_model);
+    const insightsResult = document.getElementById('insights-result');
+    if (insightsResult) {
+      insightsResult.textContent = data.message || 'Falha ao gerar insights.';
+    }
 
-        const generateBtn = document.getElementById('generate-insights-btn');
-        if (generateBtn) {
-          generateBtn.textContent = '🔁 Tentar Novamente Insights';
-        }
+    const insightsContainer = document.getElementById('insights-result-container');
+    if (insightsContainer) {
+      insightsContainer.style.display = 'block';
+    }
 
-        showProgress(false);
-        clearInterval(statusCheckInterval);
+    fetchAndDisplayPrompt(currentTaskId, data.current_prompt, data.selected_model);
 
-      } else if (data.status === 'error') {
-        showStatus(data.message, 'error');
-        showProgress(false);
-        clearInterval(statusCheckInterval);
-      } else if (data.status === 'not_found') {
-        showStatus('Tarefa não encontrada.', 'error');
-        showProgress(false);
-        clearInterval(statusCheckInterval);
-      }
-    })
-    .catch(error => {
-      showStatus('Erro ao verificar status: ' + error, 'error');
-      showProgress(false);
-      clearInterval(statusCheckInterval);
-    });
+    const generateBtn = document.getElementById('generate-insights-btn');
+    if (generateBtn) {
+      generateBtn.textContent = '🔁 Tentar Novamente Insights';
+    }
+
+    showProgress(false);
+    stopStatusUpdates();
+
+  } else if (data.status === 'error') {
+    showStatus(data.message, 'error');
+    showProgress(false);
+    stopStatusUpdates();
+  } else if (data.status === 'not_found') {
+    showStatus('Tarefa não encontrada.', 'error');
+    showProgress(false);
+    stopStatusUpdates();
+  }
+}
+
+function populateWhisperModels(models, defaultModel) {
+  const selectElement = document.getElementById('whisper-model');
+  if (!selectElement || !models) {
+    return;
+  }
+
+  selectElement.innerHTML = '';
+  models.forEach(modelName => {
+    const option = document.createElement('option');
+    option.value = modelName;
+    option.textContent = modelName === defaultModel ? `${modelName} (padrão)` : modelName;
+    option.selected = modelName === defaultModel;
+    selectElement.appendChild(option);
+  });
 }
 
 function populateOllamaModels(models) {
@@ -472,18 +649,28 @@ function generateOrRetryInsights() { // Renomeada de retryInsightsGeneration
     generateBtn.disabled = true;
   }
 
-  fetch(`http://localhost:5001/retry_insights/${currentTaskId}`, // Endpoint pode ser renomeado no backend para /generate_insights
+  // Streaming: os trechos aparecem à medida que o modelo gera
+  let streamedText = '';
+  readInsightsStream(`http://localhost:5001/stream_insights/${currentTaskId}`,
     {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json'
-      },
-      body: JSON.stringify({
-        prompt: customPrompt.value,
-        model_name: selectedModel.value // Envia o modelo selecionado
-      })
+      prompt: customPrompt.value,
+      model_name: selectedModel.value // Envia o modelo selecionado
+    },
+    token => {
+      if (!streamedText) {
+        if (insightsLoading) {
+          insightsLoading.style.display = 'none';
+        }
+        const insightsContainer = document.getElementById('insights-result-container');
+        if (insightsContainer) {
+          insightsContainer.style.display = 'block';
+        }
+      }
+      streamedText += token;
+      if (insightsResult) {
+        insightsResult.textContent = streamedText;
+      }
     })
-    .then(response => response.json())
     .then(data => {
       if (generateBtn) {
         generateBtn.disabled = false;
@@ -558,6 +745,74 @@ function generateOrRetryInsights() { // Renomeada de retryInsightsGeneration
     });
 }
 
+function readInsightsStream(url, payload, onToken) {
+  // Lê a resposta SSE de /stream_insights e resolve com o resultado final
+  // no mesmo formato de /retry_insights ({success, message, insights, ...})
+  return fetch(url, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json'
+    },
+    body: JSON.stringify(payload)
+  })
+    .then(response => {
+      const contentType = response.headers.get('Content-Type') || '';
+      if (!contentType.includes('text/event-stream')) {
+        return response.json(); // Erros de validação chegam como JSON comum
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let result = { success: false, message: 'Conexão encerrada antes do fim da geração.' };
+
+      const handleEvent = rawEvent => {
+        let eventName = 'message';
+        const dataLines = [];
+        rawEvent.split('\n').forEach(line => {
+          if (line.startsWith('event:')) {
+            eventName = line.slice(6).trim();
+          } else if (line.startsWith('data:')) {
+            dataLines.push(line.slice(5).trim());
+          }
+        });
+        if (!dataLines.length) {
+          return;
+        }
+        const eventData = JSON.parse(dataLines.join('\n'));
+        if (eventName === 'queued') {
+          if (eventData.queue_position > 1) {
+            showStatus(`Geração de insights na fila (posição ${eventData.queue_position})...`, 'loading');
+          }
+        } else if (eventName === 'token') {
+          onToken(eventData.token);
+        } else if (eventName === 'done') {
+          result = Object.assign({ success: true }, eventData);
+        } else if (eventName === 'error') {
+          result = { success: false, message: eventData.message };
+        }
+      };
+
+      const pump = () => reader.read().then(({ done, value }) => {
+        if (done) {
+          if (buffer.trim()) {
+            handleEvent(buffer);
+          }
+          return result;
+        }
+        buffer += decoder.decode(value, { stream: true });
+        let separator;
+        while ((separator = buffer.indexOf('\n\n')) !== -1) {
+          handleEvent(buffer.slice(0, separator));
+          buffer = buffer.slice(separator + 2);
+        }
+        return pump();
+      });
+
+      return pump();
+    });
+}
+
 function displayTranscriptionResult(data) {
   // Armazena os dados da transcrição globalmente
   window.transcriptionData = data;
@@ -677,8 +932,23 @@ function parseDialogueData(data) {
       hasDiarization: !!(data.transcription_data && data.transcription_data.diarization)
     });
 
-    // PRIORITÁRIO: Usa combined_text se disponível (formato já processado com speakers e timestamps)
-    if (data.transcription_data && data.transcription_data.combined_text) {
+    // PRIORITÁRIO: Usa os turnos de fala por palavra (troca de locutor no meio de um segmento)
+    if (data.transcription_data && data.transcription_data.speaker_turns && data.transcription_data.speaker_turns.length) {
+      console.log('Processando speaker_turns:', data.transcription_data.speaker_turns.length);
+      data.transcription_data.speaker_turns.forEach(turn => {
+        if (turn.text) {
+          messages.push({
+            speaker: turn.speaker,
+            text: turn.text,
+            start: turn.start,
+            end: turn.end,
+            timestamp: formatTime(turn.start)
+          });
+        }
+      });
+    }
+    // Usa combined_text se disponível (formato já processado com speakers e timestamps)
+    else if (data.transcription_data && data.transcription_data.combined_text) {
       console.log('Processando combined_text (formato já processado)');
       const combinedText = data.transcription_data.combined_text;
       const lines = combinedText.split('\n');
@@ -0,0 +1,260 @@
+# Serviço para decodificação e segmentação de áudio antes da transcrição
+import os
+import logging
+import numpy as np
+from config import (
+    AUDIO_CACHE_ENABLED, VAD_THRESHOLD_DB, VAD_MIN_SPEECH_SECONDS,
+    VAD_MIN_SILENCE_SECONDS, VAD_PADDING_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+# Taxa de amostragem esperada pelo Whisper e pelo pyannote
+SAMPLE_RATE = 16000
+
+# Tamanho do quadro usado na análise de energia (30 ms)
+ENERGY_FRAME_SECONDS = 0.03
+
+# Piso absoluto do limiar do VAD (dBFS): abaixo disso é sempre silêncio
+VAD_ABSOLUTE_FLOOR_DB = -60.0
+
+
+def load_audio(file_path):
+    """
+    Decodifica um arquivo de áudio/vídeo para um array mono float32 em 16 kHz.
+
+    Args:
+        file_path (str): Caminho para o arquivo
+
+    Returns:
+        numpy.ndarray: Forma de onda normalizada em [-1, 1]
+    """
+    # Importado aqui para não carregar o whisper só para usar as funções de segmentação
+    from whisper.audio import load_audio as whisper_load_audio
+    return whisper_load_audio(file_path, sr=SAMPLE_RATE)
+
+
+def get_cache_path(file_path):
+    """
+    Caminho do cache .npy da forma de onda decodificada, ao lado do upload.
+    """
+    return f"{file_path}.npy"
+
+
+def load_audio_cached(file_path, use_cache=None):
+    """
+    Decodifica o arquivo uma única vez, opcionalmente persistindo a forma de
+    onda como .npy ao lado do upload. Quando o cache existe, ele é aberto como
+    memory-map (copy-on-write), sem nova chamada ao ffmpeg.
+
+    Args:
+        file_path (str): Caminho para o arquivo
+        use_cache (bool, optional): Sobrepõe AUDIO_CACHE_ENABLED
+
+    Returns:
+        numpy.ndarray: Forma de onda mono float32 em 16 kHz
+    """
+    if use_cache is None:
+        use_cache = AUDIO_CACHE_ENABLED
+    cache_path = get_cache_path(file_path)
+
+    if use_cache and os.path.exists(cache_path):
+        try:
+            return np.load(cache_path, mmap_mode="c")
+        except Exception as e:
+            logger.warning(f"Cache de áudio inválido em {cache_path}, decodificando novamente: {e}")
+
+    audio = load_audio(file_path)
+
+    if use_cache:
+        try:
+            np.save(cache_path, audio)
+            return np.load(cache_path, mmap_mode="c")
+        except Exception as e:
+            logger.warning(f"Não foi possível gravar o cache de áudio {cache_path}: {e}")
+    return audio
+
+
+def remove_cached_audio(file_path):
+    """
+    Remove o cache .npy associado a um upload, se existir.
+    """
+    cache_path = get_cache_path(file_path)
+    if os.path.exists(cache_path):
+        os.remove(cache_path)
+
+
+def get_duration(audio, sample_rate=SAMPLE_RATE):
+    """
+    Retorna a duração em segundos de uma forma de onda.
+    """
+    return len(audio) / float(sample_rate)
+
+
+def frame_energy(audio, sample_rate=SAMPLE_RATE, frame_seconds=ENERGY_FRAME_SECONDS):
+    """
+    Calcula a energia RMS de quadros consecutivos da forma de onda.
+
+    Returns:
+        tuple: (energias por quadro, tamanho do quadro em amostras)
+    """
+    frame_length = max(1, int(sample_rate * frame_seconds))
+    n_frames = len(audio) // frame_length
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32), frame_length
+    frames = audio[:n_frames * frame_length].reshape(n_frames, frame_length)
+    return np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1)), frame_length
+
+
+def split_on_silence(audio, chunk_seconds, search_seconds=10.0, sample_rate=SAMPLE_RATE):
+    """
+    Divide a forma de onda em blocos de aproximadamente chunk_seconds,
+    cortando no quadro de menor energia dentro de uma janela de busca
+    em torno de cada ponto de corte ideal.
+
+    Args:
+        audio (numpy.ndarray): Forma de onda
+        chunk_seconds (float): Duração alvo de cada bloco
+        search_seconds (float): Meia-largura da janela de busca pelo silêncio
+        sample_rate (int): Taxa de amostragem
+
+    Returns:
+        list: Lista de tuplas (amostra_inicial, amostra_final)
+    """
+    total_samples = len(audio)
+    chunk_samples = int(chunk_seconds * sample_rate)
+    if chunk_samples <= 0 or total_samples <= chunk_samples:
+        return [(0, total_samples)]
+
+    energy, frame_length = frame_energy(audio, sample_rate)
+    search_frames = max(1, int(search_seconds * sample_rate / frame_length))
+
+    boundaries = [0]
+    while total_samples - boundaries[-1] > chunk_samples:
+        target_frame = (boundaries[-1] + chunk_samples) // frame_length
+        lo = max(boundaries[-1] // frame_length + 1, target_frame - search_frames)
+        hi = min(len(energy), target_frame + search_frames + 1)
+        if lo >= hi:
+            cut = boundaries[-1] + chunk_samples
+        else:
+            # Centro do quadro mais silencioso da janela
+            quietest = lo + int(np.argmin(energy[lo:hi]))
+            cut = quietest * frame_length + frame_length // 2
+        boundaries.append(min(cut, total_samples))
+
+    boundaries.append(total_samples)
+    return [(start, end) for start, end in zip(boundaries[:-1], boundaries[1:]) if end > start]
+
+
+def detect_voiced_regions(audio, sample_rate=SAMPLE_RATE, threshold_db=VAD_THRESHOLD_DB,
+                          min_speech_seconds=VAD_MIN_SPEECH_SECONDS, min_silence_seconds=VAD_MIN_SILENCE_SECONDS,
+                          padding_seconds=VAD_PADDING_SECONDS):
+    """
+    VAD por energia: marca como voz os quadros com energia acima do piso de
+    ruído estimado (percentil 10) mais threshold_db, une trechos separados por
+    pausas curtas, descarta ruídos curtos e acrescenta uma margem nas bordas.
+
+    Args:
+        audio (numpy.ndarray): Forma de onda
+        sample_rate (int): Taxa de amostragem
+        threshold_db (float): Margem acima do piso de ruído para considerar voz
+        min_speech_seconds (float): Duração mínima de um trecho de voz
+        min_silence_seconds (float): Pausas menores que isso não separam trechos
+        padding_seconds (float): Margem acrescentada antes e depois de cada trecho
+
+    Returns:
+        list: Lista de tuplas (amostra_inicial, amostra_final), ordenadas
+    """
+    energy, frame_length = frame_energy(audio, sample_rate)
+    if len(energy) == 0:
+        return []
+    energy_db = 20 * np.log10(energy + 1e-10)
+    threshold = max(float(np.percentile(energy_db, 10)) + threshold_db, VAD_ABSOLUTE_FLOOR_DB)
+    voiced = np.concatenate(([0], (energy_db > threshold).astype(np.int8), [0]))
+    changes = np.flatnonzero(np.diff(voiced))
+    frame_starts, frame_ends = changes[0::2], changes[1::2]
+
+    min_gap_frames = int(min_silence_seconds * sample_rate / frame_length)
+    min_speech_samples = int(min_speech_seconds * sample_rate)
+    padding = int(padding_seconds * sample_rate)
+
+    regions = []
+    for frame_start, frame_end in zip(frame_starts.tolist(), frame_ends.tolist()):
+        if regions and frame_start - regions[-1][1] < min_gap_frames:
+            regions[-1][1] = frame_end
+        else:
+            regions.append([frame_start, frame_end])
+
+    padded = []
+    for frame_start, frame_end in regions:
+        start = max(0, frame_start * frame_length - padding)
+        end = min(len(audio), frame_end * frame_length + padding)
+        if (frame_end - frame_start) * frame_length < min_speech_samples:
+            continue
+        if padded and start <= padded[-1][1]:
+            padded[-1] = (padded[-1][0], end)
+        else:
+            padded.append((start, end))
+    return padded
+
+
+def group_regions(regions, max_batch_seconds, sample_rate=SAMPLE_RATE):
+    """
+    Agrupa trechos de voz consecutivos em lotes de até max_batch_seconds de voz.
+    Um trecho maior que o limite forma um lote sozinho.
+
+    Returns:
+        list: Lista de lotes, cada um uma lista de tuplas (amostra_inicial, amostra_final)
+    """
+    max_samples = int(max_batch_seconds * sample_rate)
+    batches = []
+    batch_samples = 0
+    for start, end in regions:
+        if not batches or batch_samples + (end - start) > max_samples:
+            batches.append([])
+            batch_samples = 0
+        batches[-1].append((start, end))
+        batch_samples += end - start
+    return batches
+
+
+def concatenate_regions(audio, regions, gap_seconds, sample_rate=SAMPLE_RATE):
+    """
+    Junta os trechos em uma única forma de onda, separados por gap_seconds de silêncio.
+
+    Returns:
+        tuple: (forma de onda do lote, spans) - spans são tuplas
+        (início no lote, início original, duração), em segundos
+    """
+    gap = np.zeros(int(gap_seconds * sample_rate), dtype=audio.dtype)
+    pieces = []
+    spans = []
+    position = 0
+    for index, (start, end) in enumerate(regions):
+        if index > 0 and len(gap):
+            pieces.append(gap)
+            position += len(gap)
+        pieces.append(np.asarray(audio[start:end]))
+        spans.append((position / sample_rate, start / sample_rate, (end - start) / sample_rate))
+        position += end - start
+    if not pieces:
+        return np.zeros(0, dtype=audio.dtype), spans
+    return np.concatenate(pieces), spans
+
+
+def map_to_original_times(times, spans):
+    """
+    Converte tempos da forma de onda concatenada para a linha do tempo
+    original. Tempos dentro das pausas inseridas ficam presos ao fim do trecho anterior.
+
+    Args:
+        times (array-like): Tempos no lote (segundos)
+        spans (list): Spans retornados por concatenate_regions
+
+    Returns:
+        numpy.ndarray: Tempos na linha do tempo original
+    """
+    times = np.asarray(times, dtype=np.float64)
+    batch_starts, original_starts, lengths = (np.array(column, dtype=np.float64) for column in zip(*spans))
+    index = np.clip(np.searchsorted(batch_starts, times, side="right") - 1, 0, len(spans) - 1)
+    return original_starts[index] + np.clip(times - batch_starts[index], 0.0, lengths[index])
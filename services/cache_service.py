@@ -0,0 +1,164 @@
+# Cache em disco de resultados de transcrição, endereçado pelo conteúdo do upload
+import os
+import json
+import gzip
+import hashlib
+import logging
+import threading
+from config import RESULT_CACHE_ENABLED, RESULT_CACHE_DIR, RESULT_CACHE_MAX_MB
+
+logger = logging.getLogger(__name__)
+
+# Tamanho dos blocos lidos ao calcular o hash (1 MB)
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_stream(stream, chunk_size=HASH_CHUNK_SIZE):
+    """
+    Calcula o SHA-256 de um stream binário lendo-o em blocos, sem carregá-lo inteiro na memória.
+
+    Returns:
+        str: Hash hexadecimal
+    """
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def compute_file_hash(file_path):
+    """
+    Calcula o SHA-256 de um arquivo em disco.
+    """
+    with open(file_path, "rb") as f:
+        return hash_stream(f)
+
+
+def build_cache_key(content_hash, model_name, language, include_diarization, **options):
+    """
+    Monta a chave do cache a partir do hash do conteúdo e de todas as opções
+    que alteram o resultado da transcrição.
+
+    Returns:
+        str: Chave hexadecimal
+    """
+    key_data = {
+        "content": content_hash,
+        "model": model_name,
+        "language": language,
+        "diarization": bool(include_diarization),
+        "options": options
+    }
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Cache LRU em disco: cada entrada é um JSON comprimido com gzip. O mtime do
+    arquivo marca o último acesso e, quando o total passa de max_bytes, as
+    entradas acessadas há mais tempo são removidas primeiro.
+    """
+
+    def __init__(self, cache_dir, max_bytes, enabled=True):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json.gz")
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def get(self, key):
+        """
+        Retorna o resultado armazenado para a chave ou None.
+        """
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+            os.utime(path)  # Marca o acesso para a política LRU
+            self._count("hits")
+            return data
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Entrada de cache corrompida {path}, descartando: {e}")
+            self._count("misses")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+    def put(self, key, data):
+        """
+        Armazena um resultado, gravando em arquivo temporário e renomeando
+        para que leitores concorrentes nunca vejam uma entrada parcial.
+        """
+        if not self.enabled:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, path)
+            self._count("stores")
+            self.evict()
+        except OSError as e:
+            logger.warning(f"Não foi possível gravar o resultado no cache: {e}")
+
+    def evict(self):
+        """
+        Remove as entradas menos usadas até o total caber em max_bytes.
+        """
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(".json.gz") and entry.is_file():
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                        total += stat.st_size
+        except FileNotFoundError:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self._count("evictions")
+            except OSError:
+                pass
+
+    def get_stats(self):
+        entries = 0
+        total = 0
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(".json.gz"):
+                        entries += 1
+                        total += entry.stat().st_size
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            stats = dict(self._counters)
+        stats.update({"enabled": self.enabled, "entries": entries, "bytes": total, "max_bytes": self.max_bytes})
+        return stats
+
+
+result_cache = ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_MB * 1024 * 1024, enabled=RESULT_CACHE_ENABLED)
@@ -1,12 +1,17 @@
 # Serviço para diarização de locutores usando pyannote.audio
-import torch
-from pyannote.audio import Pipeline
-from pyannote.core import Annotation, Segment
+# torch e pyannote são importados só quando a diarização é usada: importá-los
+# leva segundos e o processo web não precisa deles para servir status e arquivos
 import tempfile
 import os
+import time
 import logging
 import warnings
-from config import HUGGINGFACE_TOKEN
+import threading
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import HUGGINGFACE_TOKEN, DIARIZATION_THREAD_SHARE
 
 # Suprimir warning específico do SpeechBrain
 warnings.filterwarnings("ignore", message="Module 'speechbrain.pretrained' was deprecated")
@@ -16,6 +21,10 @@ logger = logging.getLogger(__name__)
 # Modelo de diarização global
 diarization_pipeline = None
 
+# Processo dedicado para a diarização concorrente (modo "concurrent")
+_diarization_pool = None
+_diarization_pool_lock = threading.Lock()
+
 def load_diarization_model():
     """
     Carrega o modelo de diarização de locutores.
@@ -24,6 +33,9 @@ def load_diarization_model():
     global diarization_pipeline
     if diarization_pipeline is None:
         try:
+            import torch
+            from pyannote.audio import Pipeline
+
             # Verificar se temos o token do Hugging Face
             hf_token = HUGGINGFACE_TOKEN
 
@@ -71,7 +83,7 @@ def load_diarization_model():
 
     return True, "Modelo de diarização já carregado."
 
-def perform_diarization(audio_file_path, num_speakers=None, min_speakers=1, max_speakers=10):
+def perform_diarization(audio_file_path, num_speakers=None, min_speakers=1, max_speakers=10, waveform=None, sample_rate=16000):
     """
     Realiza a diarização de locutores em um arquivo de áudio.
 
@@ -80,6 +92,9 @@ def perform_diarization(audio_file_path, num_speakers=None, min_speakers=1, max_
         num_speakers (int, optional): Número específico de locutores (se conhecido)
         min_speakers (int): Número mínimo de locutores (padrão: 1)
         max_speakers (int): Número máximo de locutores (padrão: 10)
+        waveform (numpy.ndarray, optional): Forma de onda mono já decodificada;
+            quando informada, o arquivo não é decodificado novamente
+        sample_rate (int): Taxa de amostragem de waveform
 
     Returns:
         tuple: (annotation_segments, error_message)
@@ -94,8 +109,17 @@ def perform_diarization(audio_file_path, num_speakers=None, min_speakers=1, max_
             return None, message
 
     try:
-        if not os.path.exists(audio_file_path):
+        if waveform is not None:
+            import torch
+            # Formato em memória aceito pelo pyannote: tensor (canal, tempo)
+            audio_input = {
+                "waveform": torch.from_numpy(waveform).unsqueeze(0),
+                "sample_rate": sample_rate
+            }
+        elif not os.path.exists(audio_file_path):
             return None, f"Arquivo de áudio não encontrado: {audio_file_path}"
+        else:
+            audio_input = audio_file_path
 
         logger.info(f"Iniciando diarização de: {audio_file_path}")
 
@@ -110,10 +134,10 @@ def perform_diarization(audio_file_path, num_speakers=None, min_speakers=1, max_
                 params['max_speakers'] = max_speakers
 
             # Aplicar diarização
-            diarization = diarization_pipeline(audio_file_path, **params)
+            diarization = diarization_pipeline(audio_input, **params)
         else:
             # Para modelos mais simples
-            diarization = diarization_pipeline(audio_file_path)
+            diarization = diarization_pipeline(audio_input)
 
         # Converter resultado para formato útil
         segments = []
@@ -138,6 +162,74 @@ def perform_diarization(audio_file_path, num_speakers=None, min_speakers=1, max_
         logger.error(error_msg)
         return None, error_msg
 
+def get_concurrent_thread_split():
+    """
+    Divide os núcleos entre a transcrição e a diarização concorrente,
+    conforme DIARIZATION_THREAD_SHARE.
+
+    Returns:
+        tuple: (threads_transcricao, threads_diarizacao)
+    """
+    cpu_count = os.cpu_count() or 1
+    diarization_threads = min(cpu_count, max(1, int(round(cpu_count * DIARIZATION_THREAD_SHARE))))
+    return max(1, cpu_count - diarization_threads), diarization_threads
+
+def _init_diarization_worker(torch_threads):
+    import torch
+    torch.set_num_threads(torch_threads)
+    load_diarization_model()
+
+def _diarize_in_worker(audio_file_path, audio_ref, sample_rate, min_speakers, max_speakers):
+    # audio_ref é o caminho do cache .npy (aberto via memory-map) ou None (decodifica o upload)
+    waveform = np.load(audio_ref, mmap_mode="c") if audio_ref else None
+    started = time.perf_counter()
+    segments, error = perform_diarization(
+        audio_file_path, min_speakers=min_speakers, max_speakers=max_speakers,
+        waveform=waveform, sample_rate=sample_rate
+    )
+    return segments, error, time.perf_counter() - started
+
+def submit_diarization(audio_file_path, audio_ref, sample_rate=16000, min_speakers=1, max_speakers=10):
+    """
+    Agenda a diarização em um processo dedicado, para rodar ao mesmo tempo que
+    a transcrição. O processo mantém o pipeline carregado entre as tarefas e
+    usa apenas a sua parcela das threads do torch.
+
+    Args:
+        audio_file_path (str): Caminho do upload (usado nos logs)
+        audio_ref (str | None): Caminho do cache .npy da forma de onda (aberto via
+            memory-map, sem copiar o áudio entre processos) ou None para decodificar o upload
+
+    Returns:
+        concurrent.futures.Future: Resolve para (segmentos, erro, segundos)
+    """
+    global _diarization_pool
+    with _diarization_pool_lock:
+        if _diarization_pool is None:
+            _diarization_pool = _create_diarization_pool()
+        try:
+            return _diarization_pool.submit(
+                _diarize_in_worker, audio_file_path, audio_ref, sample_rate, min_speakers, max_speakers
+            )
+        except BrokenProcessPool:
+            # O processo de diarização morreu (ex.: falta de memória): recria o pool uma vez
+            logger.warning("Processo de diarização concorrente encerrado inesperadamente; recriando.")
+            _diarization_pool.shutdown(wait=False)
+            _diarization_pool = _create_diarization_pool()
+            return _diarization_pool.submit(
+                _diarize_in_worker, audio_file_path, audio_ref, sample_rate, min_speakers, max_speakers
+            )
+
+def _create_diarization_pool():
+    _, diarization_threads = get_concurrent_thread_split()
+    logger.info(f"Criando processo de diarização concorrente com {diarization_threads} thread(s).")
+    return ProcessPoolExecutor(
+        max_workers=1,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_diarization_worker,
+        initargs=(diarization_threads,)
+    )
+
 def get_speakers_summary(segments):
     """
     Gera um resumo dos locutores identificados.
@@ -231,6 +323,12 @@ def format_time(seconds):
     else:
         return f"{minutes:02d}:{secs:02d}"
 
+def is_diarization_loaded():
+    """
+    Indica se o pipeline de diarização já está carregado neste processo, sem carregá-lo.
+    """
+    return diarization_pipeline is not None
+
 def is_diarization_available():
     """
     Verifica se o serviço de diarização está disponível.
@@ -0,0 +1,151 @@
+# Serviço de insights hierárquicos (map-reduce) para transcrições maiores que o contexto do modelo
+import os
+import json
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from config import (
+    INSIGHTS_MAP_REDUCE_ENABLED, INSIGHTS_CHUNK_TOKENS, INSIGHTS_MAP_CONCURRENCY,
+    INSIGHTS_MAP_PROMPT, RESULT_CACHE_DIR, RESULT_CACHE_MAX_MB, RESULT_CACHE_ENABLED
+)
+from services import ollama_service
+from services.cache_service import ResultCache
+
+logger = logging.getLogger(__name__)
+
+# Aproximação de caracteres por token usada para estimar o tamanho do prompt
+CHARS_PER_TOKEN = 4
+
+# Limite de níveis de redução, para nunca entrar em laço se os resumos não encolherem
+MAX_REDUCE_LEVELS = 4
+
+# Resumos parciais em disco: refazer os insights com outro prompt final só repete o reduce
+chunk_summary_cache = ResultCache(
+    os.path.join(RESULT_CACHE_DIR, 'chunk_summaries'),
+    RESULT_CACHE_MAX_MB * 1024 * 1024,
+    enabled=RESULT_CACHE_ENABLED
+)
+
+
+def estimate_tokens(text):
+    """
+    Estimativa simples da quantidade de tokens de um texto.
+    """
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def needs_map_reduce(text, chunk_tokens=None):
+    """
+    Indica se o texto deve ser resumido em partes antes do prompt final.
+    """
+    return INSIGHTS_MAP_REDUCE_ENABLED and estimate_tokens(text) > (chunk_tokens or INSIGHTS_CHUNK_TOKENS)
+
+
+def split_transcript(text, chunk_tokens):
+    """
+    Divide a transcrição em blocos de até chunk_tokens, cortando apenas entre
+    linhas (cada linha é um segmento ou turno de fala). Uma linha maior que o
+    orçamento é dividida entre palavras.
+
+    Args:
+        text (str): Transcrição, um segmento por linha
+        chunk_tokens (int): Orçamento de tokens por bloco
+
+    Returns:
+        list: Blocos de texto
+    """
+    max_chars = chunk_tokens * CHARS_PER_TOKEN
+    units = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        while len(line) > max_chars:
+            cut = line.rfind(" ", 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            units.append(line[:cut])
+            line = line[cut:].lstrip()
+        units.append(line)
+
+    chunks = []
+    current = []
+    current_chars = 0
+    for unit in units:
+        if current and current_chars + len(unit) + 1 > max_chars:
+            chunks.append("\n".join(current))
+            current, current_chars = [], 0
+        current.append(unit)
+        current_chars += len(unit) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def _chunk_cache_key(chunk, model_name, map_prompt):
+    key_data = {"chunk": chunk, "model": model_name, "prompt": map_prompt}
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def summarize_chunk(chunk, model_name, map_prompt=INSIGHTS_MAP_PROMPT):
+    """
+    Resume um bloco da transcrição, reaproveitando o cache quando possível.
+
+    Returns:
+        (resumo, erro) - Tupla com resumo ou None, e mensagem de erro ou None
+    """
+    cache_key = _chunk_cache_key(chunk, model_name, map_prompt)
+    cached = chunk_summary_cache.get(cache_key)
+    if cached is not None:
+        return cached["summary"], None
+
+    summary, error = ollama_service.generate_ollama_insights(chunk, map_prompt, model_name)
+    if error:
+        return None, error
+    chunk_summary_cache.put(cache_key, {"summary": summary})
+    return summary, None
+
+
+def reduce_transcript(text, model_name, chunk_tokens=None, progress_callback=None):
+    """
+    Fase map do map-reduce: resume os blocos da transcrição em paralelo e junta
+    os resumos em ordem cronológica. Se o resultado ainda exceder o orçamento,
+    os resumos são resumidos de novo (redução hierárquica).
+
+    Args:
+        text (str): Transcrição completa
+        model_name (str): Modelo Ollama
+        chunk_tokens (int, optional): Orçamento por bloco (padrão INSIGHTS_CHUNK_TOKENS)
+        progress_callback (callable, optional): Recebe uma mensagem de progresso
+
+    Returns:
+        (texto_reduzido, erro) - Resumos parciais concatenados, pronto para o prompt final
+    """
+    chunk_tokens = chunk_tokens or INSIGHTS_CHUNK_TOKENS
+    for level in range(1, MAX_REDUCE_LEVELS + 1):
+        chunks = split_transcript(text, chunk_tokens)
+        if progress_callback:
+            progress_callback(f"Resumindo {len(chunks)} parte(s) da transcrição (nível {level})...")
+        logger.info(f"Map-reduce nível {level}: {len(chunks)} bloco(s) com até {chunk_tokens} tokens")
+
+        with ThreadPoolExecutor(max_workers=max(1, INSIGHTS_MAP_CONCURRENCY)) as executor:
+            results = list(executor.map(lambda chunk: summarize_chunk(chunk, model_name), chunks))
+
+        errors = [error for _, error in results if error]
+        if errors:
+            return None, errors[0]
+
+        text = "\n\n".join(
+            f"Parte {index} de {len(results)}:\n{summary}" for index, (summary, _) in enumerate(results, start=1)
+        )
+        if len(chunks) == 1 or estimate_tokens(text) <= chunk_tokens:
+            break
+
+    header = "Resumos parciais da transcrição, em ordem cronológica:\n\n"
+    return header + text, None
+
+
+def get_stats():
+    """
+    Contadores do cache de resumos parciais.
+    """
+    return chunk_summary_cache.get_stats()
@@ -0,0 +1,404 @@
+# Fila de jobs persistente em SQLite, compartilhada entre o processo web e os workers de inferência
+import os
+import json
+import time
+import heapq
+import socket
+import sqlite3
+import logging
+import importlib
+import threading
+from .job_scheduler import QueueFullError, DEFAULT_JOB_DURATION_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def job_function_name(func):
+    """
+    Nome pelo qual um worker encontra a função do job ("modulo:funcao").
+    """
+    if func.__module__ == "__main__" or "<" in func.__qualname__:
+        raise ValueError(f"A função {func.__qualname__} não pode ser importada por outro processo.")
+    return f"{func.__module__}:{func.__qualname__}"
+
+
+def resolve_job_function(name):
+    """
+    Importa a função registrada por job_function_name.
+    """
+    module_name, qualname = name.split(":", 1)
+    target = importlib.import_module(module_name)
+    for attribute in qualname.split("."):
+        target = getattr(target, attribute)
+    return target
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class SQLiteJobQueue:
+    """
+    Fila FIFO limitada gravada em SQLite, com a mesma interface de consulta do
+    JobScheduler (submit, is_full, retry_after, get_queue_position,
+    report_remaining, estimate_wait_seconds, get_stats).
+
+    O processo que chama submit não executa nada: os jobs são retirados com
+    claim por processos separados (worker.py), que registram um sinal de vida
+    em heartbeat. Jobs de um worker que parou de dar sinal de vida voltam à
+    fila (recover_stale_jobs) até max_attempts tentativas.
+
+    A função do job precisa ser importável pelo nome (função de módulo) e os
+    argumentos precisam ser serializáveis em JSON.
+    """
+
+    def __init__(self, name, db_path, max_queue_size, worker_timeout_seconds, max_attempts=2):
+        self.name = name
+        self.db_path = db_path
+        self.max_queue_size = max(0, int(max_queue_size))
+        self.worker_timeout_seconds = worker_timeout_seconds
+        self.max_attempts = max(1, int(max_attempts))
+        self._local = threading.local()
+
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                queue TEXT NOT NULL,
+                func TEXT NOT NULL,
+                args TEXT NOT NULL,
+                status TEXT NOT NULL,
+                enqueued_at REAL NOT NULL,
+                started_at REAL,
+                worker_id TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                remaining_seconds REAL,
+                remaining_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_queue_status ON jobs(queue, status, enqueued_at);
+            CREATE TABLE IF NOT EXISTS workers (
+                worker_id TEXT PRIMARY KEY,
+                queue TEXT NOT NULL,
+                host TEXT NOT NULL,
+                pid INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                message TEXT,
+                started_at REAL NOT NULL,
+                last_seen REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS job_stats (
+                queue TEXT PRIMARY KEY,
+                completed INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                rejected INTEGER NOT NULL DEFAULT 0,
+                avg_duration REAL NOT NULL
+            );
+        """)
+        conn.execute(
+            "INSERT OR IGNORE INTO job_stats (queue, avg_duration) VALUES (?, ?)",
+            (self.name, DEFAULT_JOB_DURATION_SECONDS)
+        )
+
+    def _connection(self):
+        # Conexões SQLite não podem ser compartilhadas entre threads: uma por thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _count_queued(self, conn):
+        return conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE queue = ? AND status = 'queued'", (self.name,)
+        ).fetchone()[0]
+
+    def _avg_duration(self, conn):
+        return conn.execute("SELECT avg_duration FROM job_stats WHERE queue = ?", (self.name,)).fetchone()[0]
+
+    def _live_workers(self, conn):
+        deadline = time.time() - self.worker_timeout_seconds
+        return conn.execute(
+            "SELECT COUNT(*) FROM workers WHERE queue = ? AND last_seen >= ?", (self.name, deadline)
+        ).fetchone()[0]
+
+    # ------------------------------------------------------------------
+    # Lado do processo web
+    # ------------------------------------------------------------------
+
+    def submit(self, job_id, func, *args, **kwargs):
+        """
+        Grava um job na fila para ser executado por um worker.
+
+        Returns:
+            int: Posição do job na fila (1 = próximo a executar)
+
+        Raises:
+            QueueFullError: Se a fila estiver cheia
+            ValueError: Se a função não puder ser importada por outro processo
+        """
+        func_name = job_function_name(func)
+        payload = json.dumps({"args": args, "kwargs": kwargs}, ensure_ascii=False)
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            queued = self._count_queued(conn)
+            if queued >= self.max_queue_size:
+                conn.execute("UPDATE job_stats SET rejected = rejected + 1 WHERE queue = ?", (self.name,))
+                conn.execute("COMMIT")
+                raise QueueFullError(
+                    f"Fila de {self.name} cheia ({self.max_queue_size} jobs aguardando).",
+                    self.retry_after()
+                )
+            conn.execute(
+                "INSERT INTO jobs (job_id, queue, func, args, status, enqueued_at) VALUES (?, ?, ?, ?, 'queued', ?)",
+                (job_id, self.name, func_name, payload, time.time())
+            )
+            conn.execute("COMMIT")
+        except QueueFullError:
+            raise
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return queued + 1
+
+    def is_full(self):
+        return self._count_queued(self._connection()) >= self.max_queue_size
+
+    def retry_after(self):
+        """Retorna o número de segundos sugerido para o cabeçalho Retry-After."""
+        conn = self._connection()
+        return max(1, int(self._avg_duration(conn) / max(1, self._live_workers(conn))))
+
+    def get_queue_position(self, job_id):
+        """
+        Returns:
+            int | None: 1..N se aguardando, 0 se em execução, None se desconhecido
+        """
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT status, enqueued_at, rowid FROM jobs WHERE job_id = ? AND queue = ?", (job_id, self.name)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[0] == "running":
+            return 0
+        return conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE queue = ? AND status = 'queued' AND (enqueued_at, rowid) <= (?, ?)",
+            (self.name, row[1], row[2])
+        ).fetchone()[0]
+
+    def estimate_wait_seconds(self, position):
+        """
+        Mesma estimativa do JobScheduler, com os workers vivos no lugar do
+        número fixo de threads.
+        """
+        if not position:
+            return 0
+        conn = self._connection()
+        now = time.time()
+        avg_duration = self._avg_duration(conn)
+        free_at = []
+        for started_at, remaining, reported_at in conn.execute(
+            "SELECT started_at, remaining_seconds, remaining_at FROM jobs WHERE queue = ? AND status = 'running'",
+            (self.name,)
+        ):
+            if remaining is not None:
+                free_at.append(max(0.0, remaining - (now - reported_at)))
+            else:
+                free_at.append(max(0.0, avg_duration - (now - started_at)))
+        free_at.extend([0.0] * max(0, max(1, self._live_workers(conn)) - len(free_at)))
+        heapq.heapify(free_at)
+        for _ in range(position - 1):
+            heapq.heappush(free_at, heapq.heappop(free_at) + avg_duration)
+        return int(free_at[0])
+
+    def get_stats(self):
+        conn = self._connection()
+        counts = dict(conn.execute(
+            "SELECT status, COUNT(*) FROM jobs WHERE queue = ? GROUP BY status", (self.name,)
+        ).fetchall())
+        completed, failed, rejected, avg_duration = conn.execute(
+            "SELECT completed, failed, rejected, avg_duration FROM job_stats WHERE queue = ?", (self.name,)
+        ).fetchone()
+        return {
+            "mode": "worker",
+            "workers": self._live_workers(conn),
+            "max_queue_size": self.max_queue_size,
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "completed": completed,
+            "failed": failed,
+            "rejected": rejected,
+            "avg_job_seconds": round(avg_duration, 2)
+        }
+
+    def get_workers(self):
+        """
+        Workers com sinal de vida recente.
+
+        Returns:
+            list: Dicionários com worker_id, host, pid, state, message, started_at e last_seen
+        """
+        deadline = time.time() - self.worker_timeout_seconds
+        rows = self._connection().execute(
+            "SELECT worker_id, host, pid, state, message, started_at, last_seen FROM workers "
+            "WHERE queue = ? AND last_seen >= ? ORDER BY started_at",
+            (self.name, deadline)
+        ).fetchall()
+        keys = ("worker_id", "host", "pid", "state", "message", "started_at", "last_seen")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def get_readiness(self):
+        """
+        Prontidão no formato de whisper_service.get_readiness, a partir dos
+        workers: pronto se algum worker já carregou o modelo.
+        """
+        workers = self.get_workers()
+        states = [worker["state"] for worker in workers]
+        if "ready" in states:
+            state = "ready"
+        elif "loading" in states:
+            state = "loading"
+        elif workers:
+            state = "error"
+        else:
+            state = "no_workers"
+        messages = {
+            "ready": f"{states.count('ready')} worker(s) de inferência pronto(s).",
+            "loading": "Workers de inferência carregando o modelo Whisper...",
+            "error": workers[0]["message"] if workers else None,
+            "no_workers": "Nenhum worker de inferência ativo. Os jobs aguardam na fila até um worker iniciar (python worker.py)."
+        }
+        return {"ready": state == "ready", "state": state, "message": messages[state], "load_seconds": None}
+
+    # ------------------------------------------------------------------
+    # Lado dos workers
+    # ------------------------------------------------------------------
+
+    def heartbeat(self, worker_id, state, message=None):
+        """
+        Registra o sinal de vida de um worker e o seu estado ("loading", "ready" ou "error").
+        """
+        now = time.time()
+        self._connection().execute(
+            "INSERT INTO workers (worker_id, queue, host, pid, state, message, started_at, last_seen) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(worker_id) DO UPDATE SET state = excluded.state, message = excluded.message, last_seen = excluded.last_seen",
+            (worker_id, self.name, socket.gethostname(), os.getpid(), state, message, now, now)
+        )
+
+    def remove_worker(self, worker_id):
+        self._connection().execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+
+    def claim(self, worker_id):
+        """
+        Retira o job mais antigo da fila e o marca como em execução pelo worker.
+
+        Returns:
+            tuple | None: (job_id, função, args, kwargs) ou None se a fila estiver vazia
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT job_id, func, args FROM jobs WHERE queue = ? AND status = 'queued' "
+                "ORDER BY enqueued_at, rowid LIMIT 1",
+                (self.name,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, worker_id = ?, attempts = attempts + 1, "
+                "remaining_seconds = NULL, remaining_at = NULL WHERE job_id = ?",
+                (time.time(), worker_id, row[0])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        job_id, func_name, payload = row
+        payload = json.loads(payload)
+        return job_id, resolve_job_function(func_name), payload["args"], payload["kwargs"]
+
+    def report_remaining(self, job_id, seconds):
+        """
+        Informa quanto falta para um job em execução terminar (ETA gravado na fila
+        e lido pelo processo web nas estimativas de espera).
+        """
+        if seconds is None:
+            return
+        self._connection().execute(
+            "UPDATE jobs SET remaining_seconds = ?, remaining_at = ? WHERE job_id = ? AND status = 'running'",
+            (float(seconds), time.time(), job_id)
+        )
+
+    def complete(self, job_id, failed=False):
+        """
+        Remove um job executado e atualiza os contadores e a duração média.
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT started_at FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+            counter = "failed" if failed else "completed"
+            if row is not None and row[0] is not None:
+                duration = time.time() - row[0]
+                # Média móvel exponencial para estimativas de espera
+                conn.execute(
+                    f"UPDATE job_stats SET {counter} = {counter} + 1, avg_duration = 0.8 * avg_duration + 0.2 * ? WHERE queue = ?",
+                    (duration, self.name)
+                )
+            else:
+                conn.execute(f"UPDATE job_stats SET {counter} = {counter} + 1 WHERE queue = ?", (self.name,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def recover_stale_jobs(self):
+        """
+        Devolve à fila os jobs de workers sem sinal de vida há mais de
+        worker_timeout_seconds (ex.: processo morto durante a transcrição).
+        Jobs que já usaram max_attempts tentativas são descartados como falha.
+
+        Returns:
+            tuple: (ids devolvidos à fila, ids descartados)
+        """
+        deadline = time.time() - self.worker_timeout_seconds
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            stale = conn.execute(
+                "SELECT job_id, attempts FROM jobs WHERE queue = ? AND status = 'running' AND worker_id NOT IN "
+                "(SELECT worker_id FROM workers WHERE last_seen >= ?)",
+                (self.name, deadline)
+            ).fetchall()
+            requeued = [job_id for job_id, attempts in stale if attempts < self.max_attempts]
+            abandoned = [job_id for job_id, attempts in stale if attempts >= self.max_attempts]
+            for job_id in requeued:
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', worker_id = NULL, started_at = NULL WHERE job_id = ?", (job_id,)
+                )
+            for job_id in abandoned:
+                conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+            if abandoned:
+                conn.execute("UPDATE job_stats SET failed = failed + ? WHERE queue = ?", (len(abandoned), self.name))
+            conn.execute("DELETE FROM workers WHERE queue = ? AND last_seen < ?", (self.name, deadline))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        for job_id in requeued:
+            logger.warning(f"Job {job_id} da fila '{self.name}' devolvido à fila: o worker parou de responder.")
+        for job_id in abandoned:
+            logger.error(f"Job {job_id} da fila '{self.name}' descartado após {self.max_attempts} tentativa(s).")
+        return requeued, abandoned
@@ -0,0 +1,215 @@
+# Serviço de agendamento de tarefas com pool fixo de workers e fila FIFO limitada
+import heapq
+import threading
+import time
+import logging
+from collections import OrderedDict
+from config import (
+    TRANSCRIPTION_WORKERS, TRANSCRIPTION_QUEUE_SIZE, INSIGHTS_WORKERS, INSIGHTS_QUEUE_SIZE,
+    TRANSCRIPTION_EXECUTION_MODE, JOB_QUEUE_DB_PATH, WORKER_TIMEOUT_SECONDS, TASK_BACKEND
+)
+
+logger = logging.getLogger(__name__)
+
+# Estimativa inicial de duração de um job (segundos) antes de haver medições reais
+DEFAULT_JOB_DURATION_SECONDS = 60.0
+
+
+class QueueFullError(Exception):
+    """
+    Levantada quando a fila do agendador atingiu sua capacidade máxima.
+    O atributo retry_after indica em quantos segundos vale a pena tentar novamente.
+    """
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class JobScheduler:
+    """
+    Agendador com número fixo de workers e fila FIFO limitada.
+
+    Os workers são threads daemon criadas sob demanda no primeiro submit.
+    Cada job é identificado por um job_id (normalmente o task_id), o que
+    permite consultar a posição na fila enquanto ele aguarda execução.
+    """
+
+    def __init__(self, name, num_workers, max_queue_size):
+        self.name = name
+        self.num_workers = max(1, int(num_workers))
+        self.max_queue_size = max(0, int(max_queue_size))
+        self._condition = threading.Condition()
+        self._pending = OrderedDict()  # job_id -> (func, args, kwargs, enqueued_at)
+        self._running = {}  # job_id -> started_at
+        self._remaining = {}  # job_id -> (segundos restantes informados, quando foram informados)
+        self._workers = []
+        self._avg_duration = DEFAULT_JOB_DURATION_SECONDS
+        self._completed_count = 0
+        self._failed_count = 0
+        self._rejected_count = 0
+
+    def submit(self, job_id, func, *args, **kwargs):
+        """
+        Enfileira um job para execução.
+
+        Args:
+            job_id (str): Identificador do job (ex.: task_id)
+            func (callable): Função a ser executada por um worker
+            *args, **kwargs: Argumentos repassados para func
+
+        Returns:
+            int: Posição do job na fila (1 = próximo a executar)
+
+        Raises:
+            QueueFullError: Se a fila estiver cheia
+        """
+        with self._condition:
+            if len(self._pending) >= self.max_queue_size:
+                self._rejected_count += 1
+                raise QueueFullError(
+                    f"Fila de {self.name} cheia ({self.max_queue_size} jobs aguardando).",
+                    self._retry_after_locked()
+                )
+            self._pending[job_id] = (func, args, kwargs, time.time())
+            self._ensure_workers_locked()
+            self._condition.notify()
+            return len(self._pending)
+
+    def is_full(self):
+        with self._condition:
+            return len(self._pending) >= self.max_queue_size
+
+    def retry_after(self):
+        """Retorna o número de segundos sugerido para o cabeçalho Retry-After."""
+        with self._condition:
+            return self._retry_after_locked()
+
+    def get_queue_position(self, job_id):
+        """
+        Retorna a posição do job na fila.
+
+        Returns:
+            int | None: 1..N se aguardando, 0 se em execução, None se desconhecido
+        """
+        with self._condition:
+            if job_id in self._running:
+                return 0
+            for position, pending_id in enumerate(self._pending, start=1):
+                if pending_id == job_id:
+                    return position
+            return None
+
+    def report_remaining(self, job_id, seconds):
+        """
+        Informa quanto falta para um job em execução terminar (ex.: ETA da
+        transcrição), refinando as estimativas de espera da fila.
+        """
+        with self._condition:
+            if job_id in self._running and seconds is not None:
+                self._remaining[job_id] = (float(seconds), time.time())
+
+    def estimate_wait_seconds(self, position):
+        """
+        Estima o tempo de espera até um job na posição informada começar a executar.
+
+        Cada worker fica livre quando seu job atual termina (pelo tempo restante
+        informado em report_remaining ou, sem ele, pela duração média) e os jobs
+        à frente na fila ocupam o worker que liberar primeiro.
+        """
+        if not position:
+            return 0
+        with self._condition:
+            now = time.time()
+            free_at = []
+            for job_id, started_at in self._running.items():
+                if job_id in self._remaining:
+                    remaining, reported_at = self._remaining[job_id]
+                    free_at.append(max(0.0, remaining - (now - reported_at)))
+                else:
+                    free_at.append(max(0.0, self._avg_duration - (now - started_at)))
+            free_at.extend([0.0] * max(0, self.num_workers - len(free_at)))
+            heapq.heapify(free_at)
+            for _ in range(position - 1):
+                heapq.heappush(free_at, heapq.heappop(free_at) + self._avg_duration)
+            return int(free_at[0])
+
+    def get_stats(self):
+        with self._condition:
+            return {
+                "workers": self.num_workers,
+                "max_queue_size": self.max_queue_size,
+                "queued": len(self._pending),
+                "running": len(self._running),
+                "completed": self._completed_count,
+                "failed": self._failed_count,
+                "rejected": self._rejected_count,
+                "avg_job_seconds": round(self._avg_duration, 2)
+            }
+
+    def _retry_after_locked(self):
+        # Tempo aproximado até um worker liberar uma vaga na fila
+        return max(1, int(self._avg_duration / self.num_workers))
+
+    def _ensure_workers_locked(self):
+        while len(self._workers) < self.num_workers:
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f"{self.name}-worker-{len(self._workers) + 1}",
+                daemon=True
+            )
+            self._workers.append(worker)
+            worker.start()
+
+    def _worker_loop(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                job_id, (func, args, kwargs, _) = self._pending.popitem(last=False)
+                started_at = time.time()
+                self._running[job_id] = started_at
+
+            failed = False
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                failed = True
+                logger.exception(f"Job {job_id} da fila '{self.name}' falhou com erro não tratado.")
+            finally:
+                duration = time.time() - started_at
+                with self._condition:
+                    self._running.pop(job_id, None)
+                    self._remaining.pop(job_id, None)
+                    if failed:
+                        self._failed_count += 1
+                    else:
+                        self._completed_count += 1
+                    # Média móvel exponencial para estimativas de espera
+                    self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+
+
+def create_transcription_scheduler(mode=TRANSCRIPTION_EXECUTION_MODE):
+    """
+    Cria o agendador das transcrições conforme TRANSCRIPTION_EXECUTION_MODE:
+    "inline" executa em threads deste processo; "worker" apenas grava os jobs
+    em uma fila SQLite consumida pelos processos de worker.py.
+    """
+    if mode == "worker":
+        # Os workers precisam ler e atualizar as mesmas tarefas que o processo web
+        if TASK_BACKEND != "sqlite":
+            logger.warning("TRANSCRIPTION_EXECUTION_MODE=worker requer TASK_BACKEND=sqlite; usando o modo inline.")
+        else:
+            from .job_queue import SQLiteJobQueue
+            logger.info(f"Transcrições executadas por workers separados (fila em {JOB_QUEUE_DB_PATH})")
+            return SQLiteJobQueue("transcricao", JOB_QUEUE_DB_PATH, TRANSCRIPTION_QUEUE_SIZE, WORKER_TIMEOUT_SECONDS)
+    elif mode != "inline":
+        logger.warning(f"Modo de execução desconhecido '{mode}', usando 'inline'.")
+    return JobScheduler("transcricao", TRANSCRIPTION_WORKERS, TRANSCRIPTION_QUEUE_SIZE)
+
+
+# Agendador global das transcrições Whisper
+transcription_scheduler = create_transcription_scheduler()
+
+# Agendador global da geração de insights (limitado à capacidade do Ollama)
+insights_scheduler = JobScheduler("insights", INSIGHTS_WORKERS, INSIGHTS_QUEUE_SIZE)
@@ -1,35 +1,94 @@
 # Serviço para interagir com o servidor Ollama para geração de insights
 import requests
 import json
-from config import OLLAMA_BASE_URL
+import time
+import threading
+from requests.adapters import HTTPAdapter
+from config import OLLAMA_BASE_URL, OLLAMA_REQUEST_TIMEOUT_SECONDS, OLLAMA_MODELS_CACHE_TTL_SECONDS, OLLAMA_POOL_SIZE
+
+# Timeout das consultas rápidas (lista de modelos / disponibilidade)
+OLLAMA_TAGS_TIMEOUT_SECONDS = 5
+
+# Sessão HTTP compartilhada: reaproveita conexões keep-alive com o Ollama
+http_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=OLLAMA_POOL_SIZE)
+http_session.mount("http://", _adapter)
+http_session.mount("https://", _adapter)
+
+# Cache da lista de modelos (/api/tags) com TTL
+_models_cache = {"models": None, "fetched_at": 0.0}
+_models_cache_lock = threading.Lock()
+
+def invalidate_models_cache():
+    """
+    Descarta a lista de modelos em cache; a próxima consulta vai ao Ollama.
+    """
+    with _models_cache_lock:
+        _models_cache["models"] = None
+        _models_cache["fetched_at"] = 0.0
 
 def is_ollama_available():
     """
     Verifica se o serviço Ollama está disponível.
     Retorna True se disponível, False caso contrário.
+    Usa a lista de modelos em cache, evitando uma requisição a cada chamada.
     """
-    try:
-        response = requests.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=5)
-        response.raise_for_status()
-        return True
-    except requests.exceptions.RequestException:
-        return False
+    _, connected, _ = get_available_ollama_models()
+    return connected
 
-def get_available_ollama_models():
+def get_available_ollama_models(force_refresh=False):
     """
     Obtém a lista de modelos disponíveis no Ollama.
+    A lista fica em cache por OLLAMA_MODELS_CACHE_TTL_SECONDS; falhas não são cacheadas.
+
+    Args:
+        force_refresh (bool): Ignora o cache e consulta o Ollama
+
     Retorna: (lista_modelos, conectado, quantidade_modelos)
     """
+    with _models_cache_lock:
+        cached = _models_cache["models"]
+        age = time.monotonic() - _models_cache["fetched_at"]
+    if not force_refresh and cached is not None and age < OLLAMA_MODELS_CACHE_TTL_SECONDS:
+        return list(cached), True, len(cached)
+
     try:
-        response = requests.get(f"{OLLAMA_BASE_URL}/api/tags")
+        response = http_session.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=OLLAMA_TAGS_TIMEOUT_SECONDS)
         response.raise_for_status()
         models_data = response.json()
         model_names = [model['name'] for model in models_data.get('models', [])]
-        return model_names, True, len(model_names)
+        with _models_cache_lock:
+            _models_cache["models"] = model_names
+            _models_cache["fetched_at"] = time.monotonic()
+        return list(model_names), True, len(model_names)
     except requests.exceptions.RequestException as e:
+        invalidate_models_cache()
         print(f"Erro ao conectar com Ollama: {e}")
         return [], False, 0
 
+class OllamaStreamError(Exception):
+    """
+    Falha ocorrida no meio de uma geração em streaming.
+    """
+    pass
+
+def check_ollama_model(model_name):
+    """
+    Verifica se o Ollama está acessível e possui o modelo.
+
+    Returns:
+        str ou None: Mensagem de erro, ou None se o modelo estiver disponível
+    """
+    ollama_models, ollama_connected, _ = get_available_ollama_models()
+    if ollama_connected and model_name not in ollama_models:
+        # O modelo pode ter sido baixado depois do último cache: confirma no Ollama
+        ollama_models, ollama_connected, _ = get_available_ollama_models(force_refresh=True)
+    if not ollama_connected:
+        return "Ollama não está acessível."
+    if model_name not in ollama_models:
+        return f"Modelo Ollama '{model_name}' não encontrado."
+    return None
+
 def generate_ollama_insights(text, prompt_template, model_name):
     """
     Gera insights usando o modelo Ollama especificado.
@@ -42,18 +101,21 @@ def generate_ollama_insights(text, prompt_template, model_name):
     Returns:
         (resposta, erro) - Tupla com resposta ou None, e mensagem de erro ou None
     """
-    ollama_models, ollama_connected, _ = get_available_ollama_models()
-    if not ollama_connected:
-        return None, "Ollama não está acessível."
-    if model_name not in ollama_models:
-        return None, f"Modelo Ollama '{model_name}' não encontrado."
+    error = check_ollama_model(model_name)
+    if error:
+        return None, error
 
     prompt = prompt_template.replace("{{text}}", text)
     try:
-        response = requests.post(
+        response = http_session.post(
             f"{OLLAMA_BASE_URL}/api/generate",
-            json={"model": model_name, "prompt": prompt, "stream": False}
+            json={"model": model_name, "prompt": prompt, "stream": False},
+            timeout=OLLAMA_REQUEST_TIMEOUT_SECONDS
         )
+        if response.status_code == 404:
+            # Modelo removido depois do cache: a próxima consulta recarrega a lista
+            invalidate_models_cache()
+            return None, f"Modelo Ollama '{model_name}' não encontrado."
         response.raise_for_status()
         response_data = response.json()
         return response_data.get("response", "").strip(), None
@@ -61,3 +123,62 @@ def generate_ollama_insights(text, prompt_template, model_name):
         return None, f"Erro ao gerar insights com Ollama: {e}"
     except json.JSONDecodeError:
         return None, "Erro ao decodificar a resposta do Ollama (não JSON)."
+
+def stream_ollama_insights(text, prompt_template, model_name):
+    """
+    Inicia a geração de insights em streaming: o Ollama devolve NDJSON e os
+    trechos de texto são entregues à medida que chegam.
+
+    Args:
+        text: Texto para análise
+        prompt_template: Template do prompt (deve conter {{text}})
+        model_name: Nome do modelo Ollama
+
+    Returns:
+        (gerador, erro) - Gerador de trechos de texto ou None, e mensagem de erro ou None.
+        O gerador levanta OllamaStreamError se a geração falhar no meio.
+    """
+    error = check_ollama_model(model_name)
+    if error:
+        return None, error
+
+    prompt = prompt_template.replace("{{text}}", text)
+    try:
+        response = http_session.post(
+            f"{OLLAMA_BASE_URL}/api/generate",
+            json={"model": model_name, "prompt": prompt, "stream": True},
+            stream=True,
+            # O timeout de leitura vale entre dois trechos, não para a geração inteira
+            timeout=(OLLAMA_TAGS_TIMEOUT_SECONDS, OLLAMA_REQUEST_TIMEOUT_SECONDS)
+        )
+        if response.status_code == 404:
+            response.close()
+            invalidate_models_cache()
+            return None, f"Modelo Ollama '{model_name}' não encontrado."
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        return None, f"Erro ao gerar insights com Ollama: {e}"
+    return _iter_stream_tokens(response), None
+
+def _iter_stream_tokens(response):
+    """
+    Lê as linhas NDJSON de /api/generate e produz os trechos de texto.
+    """
+    try:
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if chunk.get("error"):
+                raise OllamaStreamError(f"Erro ao gerar insights com Ollama: {chunk['error']}")
+            token = chunk.get("response", "")
+            if token:
+                yield token
+            if chunk.get("done"):
+                break
+    except requests.exceptions.RequestException as e:
+        raise OllamaStreamError(f"Erro ao gerar insights com Ollama: {e}")
+    except json.JSONDecodeError:
+        raise OllamaStreamError("Erro ao decodificar a resposta do Ollama (não JSON).")
+    finally:
+        response.close()
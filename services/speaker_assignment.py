@@ -0,0 +1,204 @@
+# Atribuição de locutores aos segmentos e palavras da transcrição
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+import numpy as np
+
+UNKNOWN_SPEAKER = "SPEAKER_UNKNOWN"
+
+
+class SpeakerTimeline:
+    """
+    Índice ordenado dos segmentos de diarização para consultas por intervalo.
+
+    Os segmentos são ordenados pelo início e guardamos o máximo acumulado dos
+    fins; assim, com duas buscas binárias, cada consulta visita apenas os
+    segmentos que podem se sobrepor ao intervalo, em vez de varrer todos.
+    """
+
+    def __init__(self, diarization_segments):
+        ordered = sorted(diarization_segments, key=lambda segment: segment['start'])
+        self.starts = [segment['start'] for segment in ordered]
+        self.ends = [segment['end'] for segment in ordered]
+        self.speakers = [segment['speaker'] for segment in ordered]
+        # max_ends[i] = maior fim entre os segmentos 0..i (não decrescente)
+        self.max_ends = list(accumulate(self.ends, max))
+
+    def _candidate_range(self, start, end):
+        # Segmentos antes de lo terminam antes de start; a partir de hi começam depois de end
+        lo = bisect_right(self.max_ends, start)
+        hi = bisect_left(self.starts, end)
+        return lo, hi
+
+    def speaker_for(self, start, end, default=UNKNOWN_SPEAKER):
+        """
+        Retorna o locutor com maior sobreposição total com o intervalo.
+        Intervalos sem sobreposição (ex.: duração zero) usam o locutor que
+        contém o ponto médio, se houver.
+
+        Args:
+            start (float): Tempo de início
+            end (float): Tempo de fim
+            default (str): Valor retornado quando nenhum locutor é encontrado
+
+        Returns:
+            str: Identificação do locutor
+        """
+        overlaps = {}
+        lo, hi = self._candidate_range(start, end)
+        for i in range(lo, hi):
+            overlap = min(end, self.ends[i]) - max(start, self.starts[i])
+            if overlap > 0:
+                speaker = self.speakers[i]
+                overlaps[speaker] = overlaps.get(speaker, 0.0) + overlap
+        if overlaps:
+            return max(overlaps, key=overlaps.get)
+
+        mid_time = (start + end) / 2
+        lo = bisect_left(self.max_ends, mid_time)
+        hi = bisect_right(self.starts, mid_time)
+        for i in range(lo, hi):
+            if self.starts[i] <= mid_time <= self.ends[i]:
+                return self.speakers[i]
+        return default
+
+
+def _merge_intervals(starts, ends):
+    """
+    Une intervalos sobrepostos (já ordenados pelo início), de forma vetorizada.
+    """
+    running_end = np.maximum.accumulate(ends)
+    new_group = np.concatenate(([True], starts[1:] > running_end[:-1]))
+    group_index = np.flatnonzero(new_group)
+    return starts[group_index], np.maximum.reduceat(ends, group_index)
+
+
+def speaker_overlaps(starts, ends, diarization_segments):
+    """
+    Calcula, para cada locutor, quanto tempo ele fala dentro de cada intervalo.
+
+    Para cada locutor monta-se a função acumulada de tempo de fala C(t), linear
+    por partes nos limites dos seus turnos; a sobreposição com [s, e] é então
+    C(e) - C(s), avaliada para todos os intervalos de uma vez com np.interp.
+
+    Args:
+        starts (numpy.ndarray): Inícios dos intervalos
+        ends (numpy.ndarray): Fins dos intervalos
+        diarization_segments (list): Segmentos de diarização
+
+    Returns:
+        tuple: (lista de locutores, matriz locutores x intervalos de sobreposições)
+    """
+    turns_by_speaker = {}
+    for segment in diarization_segments:
+        if segment['end'] > segment['start']:
+            turns_by_speaker.setdefault(segment['speaker'], []).append((segment['start'], segment['end']))
+
+    speakers = sorted(turns_by_speaker)
+    overlaps = np.zeros((len(speakers), len(starts)), dtype=np.float64)
+    for k, speaker in enumerate(speakers):
+        turns = np.array(sorted(turns_by_speaker[speaker]), dtype=np.float64)
+        turn_starts, turn_ends = _merge_intervals(turns[:, 0], turns[:, 1])
+        spoken = np.cumsum(turn_ends - turn_starts)
+        breakpoints = np.column_stack((turn_starts, turn_ends)).ravel()
+        coverage = np.zeros(len(breakpoints))
+        coverage[1::2] = spoken
+        coverage[2::2] = spoken[:-1]
+        overlaps[k] = np.interp(ends, breakpoints, coverage) - np.interp(starts, breakpoints, coverage)
+    return speakers, overlaps
+
+
+def assign_word_speakers(words, diarization_segments, defaults):
+    """
+    Atribui um locutor a cada palavra pela maior sobreposição, em tempo linear
+    no número de palavras e de turnos (por locutor).
+
+    Args:
+        words (list): Palavras com 'start' e 'end'
+        diarization_segments (list): Segmentos de diarização
+        defaults (list): Locutor usado para cada palavra sem sobreposição
+
+    Returns:
+        list: Locutor de cada palavra
+    """
+    if not words:
+        return []
+    starts = np.fromiter((word['start'] for word in words), dtype=np.float64, count=len(words))
+    ends = np.fromiter((word['end'] for word in words), dtype=np.float64, count=len(words))
+    speakers, overlaps = speaker_overlaps(starts, ends, diarization_segments)
+    if not speakers:
+        return list(defaults)
+
+    best = np.argmax(overlaps, axis=0)
+    has_overlap = overlaps[best, np.arange(len(words))] > 0
+    labels = np.array(speakers, dtype=object)[best]
+    return np.where(has_overlap, labels, np.array(defaults, dtype=object)).tolist()
+
+
+def assign_speakers(transcription_segments, diarization_segments):
+    """
+    Atribui um locutor a cada segmento do Whisper (e a cada palavra, quando
+    houver timestamps por palavra) pela maior sobreposição com a diarização.
+
+    Args:
+        transcription_segments (list): Segmentos do Whisper
+        diarization_segments (list): Segmentos de diarização
+
+    Returns:
+        list: Cópias dos segmentos com a chave 'speaker' (também em 'words')
+    """
+    timeline = SpeakerTimeline(diarization_segments)
+    assigned = []
+    all_words = []
+    word_defaults = []
+    for segment in transcription_segments:
+        segment = dict(segment)
+        segment['speaker'] = timeline.speaker_for(segment['start'], segment['end'])
+        if segment.get('words'):
+            segment['words'] = [dict(word) for word in segment['words']]
+            all_words.extend(segment['words'])
+            word_defaults.extend([segment['speaker']] * len(segment['words']))
+        assigned.append(segment)
+
+    # Todas as palavras do arquivo em uma única passada vetorizada
+    for word, speaker in zip(all_words, assign_word_speakers(all_words, diarization_segments, word_defaults)):
+        word['speaker'] = speaker
+    return assigned
+
+
+def build_speaker_turns(segments):
+    """
+    Reagrupa a transcrição em turnos de fala: sequências contíguas de palavras
+    (ou de segmentos, sem timestamps por palavra) do mesmo locutor. Assim uma
+    troca de locutor no meio de um segmento do Whisper gera um novo turno.
+
+    Args:
+        segments (list): Segmentos retornados por assign_speakers
+
+    Returns:
+        list: Turnos com 'speaker', 'start', 'end' e 'text'
+    """
+    # Palavras de cada segmento quando existem; o próprio segmento quando não (mesmo em entradas mistas)
+    units = []
+    for segment in segments:
+        words = segment.get('words')
+        if words:
+            units.extend((word['speaker'], word['start'], word['end'], word['word']) for word in words)
+        else:
+            units.append((segment['speaker'], segment['start'], segment['end'], segment['text']))
+    if not units:
+        return []
+
+    speakers = np.array([unit[0] for unit in units], dtype=object)
+    boundaries = np.flatnonzero(speakers[1:] != speakers[:-1]) + 1
+    turn_starts = np.concatenate(([0], boundaries))
+    turn_ends = np.concatenate((boundaries, [len(units)]))
+
+    return [
+        {
+            'speaker': units[first][0],
+            'start': units[first][1],
+            'end': units[last - 1][2],
+            'text': "".join(unit[3] for unit in units[first:last]).strip()
+        }
+        for first, last in zip(turn_starts.tolist(), turn_ends.tolist())
+    ]
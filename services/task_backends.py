@@ -0,0 +1,473 @@
+# Backends de armazenamento das tarefas usados por task_service
+import os
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+# Status a partir dos quais uma tarefa pode ser removida do armazenamento
+FINISHED_STATUSES = {"transcription_completed", "completed_with_insights", "error", "error_insights"}
+
+# Campos volumosos: contabilizados no orçamento de memória e, no SQLite,
+# gravados comprimidos fora da linha de status
+PAYLOAD_FIELDS = ("text", "insights", "transcription_data")
+
+
+def _estimate_size(value):
+    """
+    Estima o tamanho em bytes de um valor armazenado na tarefa.
+    """
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode("utf-8", errors="ignore"))
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+class TaskBackend(ABC):
+    """
+    Interface comum dos backends de tarefas.
+
+    Uma tarefa é um dicionário com os campos definidos em task_service.create_task;
+    as opções ficam no subdicionário "options".
+    """
+
+    @abstractmethod
+    def create(self, task_id, task_data):
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, task_id, fields):
+        """Atualiza campos da tarefa. Retorna False se a tarefa não existir."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, task_id):
+        """Retorna uma cópia da tarefa ou None."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_summary(self, task_id):
+        """
+        Retorna a tarefa sem os campos volumosos, com o tamanho de cada um
+        em "payload_sizes" (bytes), ou None.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_payload(self, task_id, field, default_value=None):
+        """Retorna apenas um dos campos volumosos da tarefa."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_option(self, task_id, option_name, option_value):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_option(self, task_id, option_name, default_value=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_stats(self):
+        raise NotImplementedError
+
+
+class InMemoryTaskBackend(TaskBackend):
+    """
+    Armazenamento em memória das tarefas, seguro para uso entre threads.
+
+    Tarefas finalizadas são removidas quando expiram (TTL), quando o número
+    máximo de tarefas é excedido ou quando o orçamento de memória estimado
+    é ultrapassado; nos dois últimos casos a menos usada recentemente sai
+    primeiro (LRU). Tarefas em andamento nunca são removidas.
+    """
+
+    def __init__(self, ttl_seconds, max_entries, memory_budget_bytes):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.memory_budget_bytes = memory_budget_bytes
+        self._lock = threading.RLock()
+        self._tasks = OrderedDict()  # task_id -> dict da tarefa (ordem LRU)
+        self._sizes = {}  # task_id -> {campo: bytes estimados}
+        self._finished_at = {}  # task_id -> timestamp de finalização
+        self._total_bytes = 0
+        self._evictions = {"ttl": 0, "lru": 0, "memory": 0}
+
+    def create(self, task_id, task_data):
+        with self._lock:
+            self._tasks[task_id] = task_data
+            self._sizes[task_id] = {}
+            self._evict_locked()
+
+    def update(self, task_id, fields):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return False
+            for field, value in fields.items():
+                task[field] = value
+                if field in PAYLOAD_FIELDS:
+                    self._account_size_locked(task_id, field, value)
+            if task.get("status") in FINISHED_STATUSES:
+                self._finished_at[task_id] = time.time()
+            else:
+                self._finished_at.pop(task_id, None)
+            self._tasks.move_to_end(task_id)
+            self._evict_locked()
+            return True
+
+    def get(self, task_id):
+        """
+        Retorna uma cópia rasa da tarefa (ou None), para que o chamador
+        não observe alterações parciais feitas por outras threads.
+        """
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return None
+            self._tasks.move_to_end(task_id)
+            snapshot = dict(task)
+            snapshot["options"] = dict(task.get("options") or {})
+            return snapshot
+
+    def get_summary(self, task_id):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return None
+            self._tasks.move_to_end(task_id)
+            summary = {field: value for field, value in task.items() if field not in PAYLOAD_FIELDS}
+            summary["options"] = dict(task.get("options") or {})
+            sizes = self._sizes.get(task_id, {})
+            summary["payload_sizes"] = {field: sizes.get(field, 0) for field in PAYLOAD_FIELDS}
+            return summary
+
+    def get_payload(self, task_id, field, default_value=None):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return default_value
+            value = task.get(field)
+            return default_value if value is None else value
+
+    def set_option(self, task_id, option_name, option_value):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return False
+            task.setdefault("options", {})[option_name] = option_value
+            return True
+
+    def get_option(self, task_id, option_name, default_value=None):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return default_value
+            return (task.get("options") or {}).get(option_name, default_value)
+
+    def get_stats(self):
+        with self._lock:
+            self._evict_locked()
+            return {
+                "backend": "memory",
+                "tasks": len(self._tasks),
+                "finished_tasks": len(self._finished_at),
+                "estimated_bytes": self._total_bytes,
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "evictions": dict(self._evictions)
+            }
+
+    def _account_size_locked(self, task_id, field, value):
+        sizes = self._sizes.setdefault(task_id, {})
+        new_size = _estimate_size(value)
+        self._total_bytes += new_size - sizes.get(field, 0)
+        sizes[field] = new_size
+
+    def _remove_locked(self, task_id, reason):
+        self._tasks.pop(task_id, None)
+        self._finished_at.pop(task_id, None)
+        self._total_bytes -= sum(self._sizes.pop(task_id, {}).values())
+        self._evictions[reason] += 1
+
+    def _evict_locked(self):
+        if not self._finished_at:
+            return
+
+        # 1. Expiração por TTL
+        if self.ttl_seconds > 0:
+            deadline = time.time() - self.ttl_seconds
+            for task_id in [t for t, finished in self._finished_at.items() if finished < deadline]:
+                self._remove_locked(task_id, "ttl")
+
+        # 2. Limite de quantidade e 3. orçamento de memória, removendo as menos usadas primeiro
+        for task_id in list(self._tasks):
+            if task_id not in self._finished_at:
+                continue
+            if self.max_entries > 0 and len(self._tasks) > self.max_entries:
+                self._remove_locked(task_id, "lru")
+            elif self.memory_budget_bytes > 0 and self._total_bytes > self.memory_budget_bytes:
+                self._remove_locked(task_id, "memory")
+            else:
+                break
+
+
+class SQLiteTaskBackend(TaskBackend):
+    """
+    Armazenamento persistente das tarefas em SQLite (modo WAL).
+
+    A tabela tasks guarda apenas o status e um JSON pequeno com os demais
+    campos, mantendo o polling barato. Os campos volumosos (texto, insights e
+    dados completos da transcrição) ficam na tabela task_payloads como JSON
+    comprimido com zlib. Vários processos (ex.: workers do gunicorn) podem
+    compartilhar o mesmo arquivo de banco.
+    """
+
+    def __init__(self, db_path, ttl_seconds, max_entries):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._evictions = {"ttl": 0, "lru": 0}
+        self._stats_lock = threading.Lock()
+
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                meta TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                finished_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_finished_at ON tasks(finished_at);
+            CREATE TABLE IF NOT EXISTS task_payloads (
+                task_id TEXT NOT NULL,
+                field TEXT NOT NULL,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                PRIMARY KEY (task_id, field)
+            );
+        """)
+
+    def _connection(self):
+        # Conexões SQLite não podem ser compartilhadas entre threads: uma por thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _compress(value):
+        raw = json.dumps(value, ensure_ascii=False, default=str).encode("utf-8")
+        return zlib.compress(raw, 6), len(raw)
+
+    @staticmethod
+    def _decompress(blob):
+        return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+    def _split_fields(self, fields):
+        meta, payloads = {}, {}
+        for field, value in fields.items():
+            if field == "status":
+                continue
+            if field in PAYLOAD_FIELDS:
+                payloads[field] = value
+            else:
+                meta[field] = value
+        return meta, payloads
+
+    def _write_payloads(self, conn, task_id, payloads):
+        for field, value in payloads.items():
+            if value is None:
+                conn.execute("DELETE FROM task_payloads WHERE task_id = ? AND field = ?", (task_id, field))
+                continue
+            blob, size = self._compress(value)
+            conn.execute(
+                "INSERT OR REPLACE INTO task_payloads (task_id, field, data, size) VALUES (?, ?, ?, ?)",
+                (task_id, field, blob, size)
+            )
+
+    def create(self, task_id, task_data):
+        meta, payloads = self._split_fields(task_data)
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO tasks (task_id, status, meta, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (task_id, task_data.get("status", "pending"), json.dumps(meta, ensure_ascii=False), now, now)
+            )
+            self._write_payloads(conn, task_id, payloads)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._evict()
+
+    def update(self, task_id, fields):
+        meta_update, payloads = self._split_fields(fields)
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT status, meta FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return False
+            status = fields.get("status", row[0])
+            meta = json.loads(row[1])
+            meta.update(meta_update)
+            finished_at = now if status in FINISHED_STATUSES else None
+            conn.execute(
+                "UPDATE tasks SET status = ?, meta = ?, updated_at = ?, finished_at = ? WHERE task_id = ?",
+                (status, json.dumps(meta, ensure_ascii=False, default=str), now, finished_at, task_id)
+            )
+            self._write_payloads(conn, task_id, payloads)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return True
+
+    def _read_task(self, task_id, payload_column):
+        # As duas leituras ficam na mesma transação (mesmo snapshot do WAL): sem ela,
+        # um update entre os SELECTs misturaria o status antigo com os payloads novos
+        conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute("SELECT status, meta FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+            payload_rows = [] if row is None else conn.execute(
+                f"SELECT field, {payload_column} FROM task_payloads WHERE task_id = ?", (task_id,)
+            ).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        return row, payload_rows
+
+    def get(self, task_id):
+        row, payload_rows = self._read_task(task_id, "data")
+        if row is None:
+            return None
+        task = json.loads(row[1])
+        task["status"] = row[0]
+        for field in PAYLOAD_FIELDS:
+            task.setdefault(field, None)
+        for field, blob in payload_rows:
+            task[field] = self._decompress(blob)
+        task.setdefault("options", {})
+        return task
+
+    def get_summary(self, task_id):
+        row, payload_rows = self._read_task(task_id, "size")
+        if row is None:
+            return None
+        summary = json.loads(row[1])
+        summary["status"] = row[0]
+        summary.setdefault("options", {})
+        sizes = dict(payload_rows)
+        summary["payload_sizes"] = {field: sizes.get(field, 0) for field in PAYLOAD_FIELDS}
+        return summary
+
+    def get_payload(self, task_id, field, default_value=None):
+        row = self._connection().execute(
+            "SELECT data FROM task_payloads WHERE task_id = ? AND field = ?", (task_id, field)
+        ).fetchone()
+        if row is None:
+            return default_value
+        return self._decompress(row[0])
+
+    def set_option(self, task_id, option_name, option_value):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT meta FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return False
+            meta = json.loads(row[0])
+            meta.setdefault("options", {})[option_name] = option_value
+            conn.execute(
+                "UPDATE tasks SET meta = ? WHERE task_id = ?",
+                (json.dumps(meta, ensure_ascii=False, default=str), task_id)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return True
+
+    def get_option(self, task_id, option_name, default_value=None):
+        row = self._connection().execute("SELECT meta FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        if row is None:
+            return default_value
+        return (json.loads(row[0]).get("options") or {}).get(option_name, default_value)
+
+    def get_stats(self):
+        self._evict()
+        conn = self._connection()
+        tasks, finished = conn.execute(
+            "SELECT COUNT(*), COUNT(finished_at) FROM tasks"
+        ).fetchone()
+        stored_bytes, raw_bytes = conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(data)), 0), COALESCE(SUM(size), 0) FROM task_payloads"
+        ).fetchone()
+        with self._stats_lock:
+            evictions = dict(self._evictions)
+        return {
+            "backend": "sqlite",
+            "tasks": tasks,
+            "finished_tasks": finished,
+            "payload_bytes_compressed": stored_bytes,
+            "payload_bytes_raw": raw_bytes,
+            "evictions": evictions
+        }
+
+    def _delete_tasks(self, conn, task_ids):
+        for task_id in task_ids:
+            conn.execute("DELETE FROM task_payloads WHERE task_id = ?", (task_id,))
+            conn.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+
+    def _evict(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            expired = []
+            if self.ttl_seconds > 0:
+                deadline = time.time() - self.ttl_seconds
+                expired = [r[0] for r in conn.execute(
+                    "SELECT task_id FROM tasks WHERE finished_at IS NOT NULL AND finished_at < ?", (deadline,)
+                )]
+                self._delete_tasks(conn, expired)
+
+            overflow = []
+            if self.max_entries > 0:
+                total = conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+                if total > self.max_entries:
+                    overflow = [r[0] for r in conn.execute(
+                        "SELECT task_id FROM tasks WHERE finished_at IS NOT NULL ORDER BY updated_at LIMIT ?",
+                        (total - self.max_entries,)
+                    )]
+                    self._delete_tasks(conn, overflow)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if expired or overflow:
+            with self._stats_lock:
+                self._evictions["ttl"] += len(expired)
+                self._evictions["lru"] += len(overflow)
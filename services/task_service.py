@@ -1,13 +1,55 @@
-# Serviço para gerenciar o status das tarefas de transcrição e insights
+# Serviço para gerenciar o status das tarefas de transcrição e insights
+import time
 import uuid
-from config import TASK_STATUS_DICT, DEFAULT_INSIGHTS_PROMPT
+import queue
+import logging
+import threading
+from config import (
+    DEFAULT_INSIGHTS_PROMPT, TASK_BACKEND, TASK_DB_PATH,
+    TASK_TTL_MINUTES, TASK_MAX_ENTRIES, TASK_MEMORY_BUDGET_MB
+)
+from .task_backends import InMemoryTaskBackend, SQLiteTaskBackend, PAYLOAD_FIELDS
+
+logger = logging.getLogger(__name__)
+
+
+def create_backend(backend_name=TASK_BACKEND):
+    """
+    Cria o backend de armazenamento configurado em TASK_BACKEND ("memory" ou "sqlite").
+    """
+    if backend_name == "sqlite":
+        logger.info(f"Usando backend SQLite para tarefas: {TASK_DB_PATH}")
+        return SQLiteTaskBackend(
+            TASK_DB_PATH,
+            ttl_seconds=TASK_TTL_MINUTES * 60,
+            max_entries=TASK_MAX_ENTRIES
+        )
+    if backend_name != "memory":
+        logger.warning(f"Backend de tarefas desconhecido '{backend_name}', usando memória.")
+    return InMemoryTaskBackend(
+        ttl_seconds=TASK_TTL_MINUTES * 60,
+        max_entries=TASK_MAX_ENTRIES,
+        memory_budget_bytes=TASK_MEMORY_BUDGET_MB * 1024 * 1024
+    )
+
+
+task_store = create_backend()
+
+# Assinantes de mudanças por tarefa (ex.: streams SSE de status)
+SUBSCRIBER_QUEUE_SIZE = 256
+_subscribers = {}
+_subscribers_lock = threading.Lock()
+_watcher_thread = None
+
 
 def create_task():
     task_id = str(uuid.uuid4())
-    TASK_STATUS_DICT[task_id] = {
+    task_store.create(task_id, {
         "status": "pending",
         "message": "Tarefa criada",
         "progress": "0%",
+        "progress_fraction": 0.0,
+        "eta_seconds": None,
         "text": None,
         "insights": None,
         "transcription_data": None,
@@ -16,43 +58,153 @@ def create_task():
         "available_ollama_models": [],
         "ollama_connected": False,
         "options": {}
-    }
+    })
     return task_id
 
-def update_task_status(task_id, status, message=None, progress=None, text=None, insights=None, current_prompt=None, selected_model=None, available_ollama_models=None, ollama_connected=None, transcription_data=None):
-    if task_id in TASK_STATUS_DICT:
-        task = TASK_STATUS_DICT[task_id]
-        task["status"] = status
-        if message is not None: task["message"] = message
-        if progress is not None: task["progress"] = progress
-        if text is not None: task["text"] = text
-        if insights is not None: task["insights"] = insights
-        if current_prompt is not None: task["current_prompt"] = current_prompt
-        if selected_model is not None: task["selected_model"] = selected_model
-        if available_ollama_models is not None: task["available_ollama_models"] = available_ollama_models
-        if ollama_connected is not None: task["ollama_connected"] = ollama_connected
-        if transcription_data is not None: task["transcription_data"] = transcription_data
-        return True
-    return False
+def update_task_status(task_id, status, message=None, progress=None, text=None, insights=None, current_prompt=None, selected_model=None, available_ollama_models=None, ollama_connected=None, transcription_data=None,
+                       progress_fraction=None, audio_seconds_processed=None, audio_duration_seconds=None, realtime_factor=None, eta_seconds=None):
+    fields = {"status": status}
+    if message is not None: fields["message"] = message
+    if progress is not None: fields["progress"] = progress
+    # Progresso numérico da transcrição (fração 0-1, segundos de áudio, fator de tempo real e ETA)
+    if progress_fraction is not None: fields["progress_fraction"] = progress_fraction
+    if audio_seconds_processed is not None: fields["audio_seconds_processed"] = audio_seconds_processed
+    if audio_duration_seconds is not None: fields["audio_duration_seconds"] = audio_duration_seconds
+    if realtime_factor is not None: fields["realtime_factor"] = realtime_factor
+    if eta_seconds is not None: fields["eta_seconds"] = eta_seconds
+    if text is not None: fields["text"] = text
+    if insights is not None: fields["insights"] = insights
+    if current_prompt is not None: fields["current_prompt"] = current_prompt
+    if selected_model is not None: fields["selected_model"] = selected_model
+    if available_ollama_models is not None: fields["available_ollama_models"] = available_ollama_models
+    if ollama_connected is not None: fields["ollama_connected"] = ollama_connected
+    if transcription_data is not None: fields["transcription_data"] = transcription_data
+    updated = task_store.update(task_id, fields)
+    if updated:
+        _publish(task_id, fields)
+    return updated
 
 def get_task_status(task_id):
-    return TASK_STATUS_DICT.get(task_id)
+    return task_store.get(task_id)
+
+def get_task_summary(task_id):
+    """
+    Retorna a tarefa sem texto, insights e dados da transcrição (barato para
+    polling), com o tamanho de cada um desses campos em "payload_sizes".
+    """
+    return task_store.get_summary(task_id)
+
+def get_task_payload(task_id, field, default_value=None):
+    """
+    Retorna um único campo volumoso da tarefa ("text", "insights" ou "transcription_data").
+    """
+    return task_store.get_payload(task_id, field, default_value)
 
 def set_task_option(task_id, option_name, option_value):
     """
     Define uma opção específica para uma tarefa.
     """
-    if task_id in TASK_STATUS_DICT:
-        if "options" not in TASK_STATUS_DICT[task_id]:
-            TASK_STATUS_DICT[task_id]["options"] = {}
-        TASK_STATUS_DICT[task_id]["options"][option_name] = option_value
-        return True
-    return False
+    return task_store.set_option(task_id, option_name, option_value)
 
 def get_task_option(task_id, option_name, default_value=None):
     """
     Obtém uma opção específica de uma tarefa.
     """
-    if task_id in TASK_STATUS_DICT and "options" in TASK_STATUS_DICT[task_id]:
-        return TASK_STATUS_DICT[task_id]["options"].get(option_name, default_value)
-    return default_value
+    return task_store.get_option(task_id, option_name, default_value)
+
+def get_task_store_stats():
+    """
+    Retorna contadores do armazenamento de tarefas (quantidade, memória estimada e remoções).
+    """
+    return task_store.get_stats()
+
+def subscribe_task_updates(task_id):
+    """
+    Registra um assinante das mudanças de uma tarefa.
+
+    Returns:
+        queue.Queue: Recebe um dict com os campos alterados a cada update_task_status
+    """
+    subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    with _subscribers_lock:
+        _subscribers.setdefault(task_id, []).append(subscriber)
+    return subscriber
+
+def unsubscribe_task_updates(task_id, subscriber):
+    """
+    Remove um assinante registrado por subscribe_task_updates.
+    """
+    with _subscribers_lock:
+        subscribers = _subscribers.get(task_id, [])
+        if subscriber in subscribers:
+            subscribers.remove(subscriber)
+        if not subscribers:
+            _subscribers.pop(task_id, None)
+
+def start_update_watcher(interval_seconds):
+    """
+    Repassa aos assinantes deste processo as mudanças gravadas por outros
+    processos no armazenamento compartilhado (ex.: progresso publicado pelos
+    workers de inferência). Cada tarefa assinada é relida a cada
+    interval_seconds e os campos alterados são publicados como em
+    update_task_status (sem os campos volumosos).
+    """
+    global _watcher_thread
+    with _subscribers_lock:
+        if _watcher_thread is not None:
+            return
+        _watcher_thread = threading.Thread(
+            target=_watch_updates, args=(interval_seconds,), name="task-update-watcher", daemon=True
+        )
+    _watcher_thread.start()
+
+def _watch_updates(interval_seconds):
+    last_seen = {}
+    while True:
+        time.sleep(interval_seconds)
+        with _subscribers_lock:
+            task_ids = list(_subscribers)
+        for task_id in list(last_seen):
+            if task_id not in task_ids:
+                last_seen.pop(task_id)
+        for task_id in task_ids:
+            try:
+                summary = task_store.get_summary(task_id)
+            except Exception as e:
+                logger.warning(f"Falha ao ler a tarefa {task_id} para os assinantes: {e}")
+                continue
+            if summary is None:
+                continue
+            summary.pop("payload_sizes", None)
+            summary.pop("options", None)
+            previous = last_seen.get(task_id)
+            last_seen[task_id] = summary
+            if previous is None:
+                continue
+            changed = {field: value for field, value in summary.items() if previous.get(field) != value}
+            if changed:
+                changed["status"] = summary.get("status")
+                _publish(task_id, changed)
+
+def _publish(task_id, fields):
+    with _subscribers_lock:
+        subscribers = list(_subscribers.get(task_id, ()))
+    for subscriber in subscribers:
+        try:
+            subscriber.put_nowait(fields)
+        except queue.Full:
+            # Assinante lento: descarta a mudança mais antiga (cada mudança traz o status atual)
+            try:
+                subscriber.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                subscriber.put_nowait(fields)
+            except queue.Full:
+                pass
+
+def strip_payload(task_info):
+    """
+    Cópia da tarefa sem os campos volumosos (texto, insights e dados da transcrição).
+    """
+    return {field: value for field, value in task_info.items() if field not in PAYLOAD_FIELDS}
@@ -0,0 +1,267 @@
+# Backends de transcrição usados por whisper_service (openai-whisper, torch quantizado, CTranslate2)
+# Os pacotes de cada backend (whisper, torch, faster_whisper) são importados em load(),
+# para que importar este módulo não custe segundos ao processo web
+import types
+import logging
+import importlib
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from config import FASTER_WHISPER_COMPUTE_TYPE, FASTER_WHISPER_CPU_THREADS
+
+logger = logging.getLogger(__name__)
+
+# Frames de mel por segundo de áudio (hop de 10 ms), unidade da barra de progresso do Whisper
+MEL_FRAMES_PER_SECOND = 100
+
+# Parâmetros de cada tamanho de modelo (milhões), para estimar a memória antes de carregar
+MODEL_PARAMETERS_MILLIONS = {"tiny": 39, "base": 74, "small": 244, "medium": 769, "turbo": 809, "large": 1550}
+
+# Callback de progresso da transcrição em andamento na thread atual
+_progress_local = threading.local()
+_progress_hook_installed = False
+_progress_hook_lock = threading.Lock()
+
+
+def _install_progress_hook():
+    """
+    Substitui a barra tqdm usada por whisper.transcribe por uma que repassa o
+    avanço do loop de decodificação ao callback registrado na thread atual.
+    O loop roda na thread que chamou model.transcribe, então transcrições
+    simultâneas em workers diferentes não se misturam.
+    """
+    global _progress_hook_installed
+    with _progress_hook_lock:
+        if _progress_hook_installed:
+            return
+        _progress_hook_installed = True
+        try:
+            import tqdm
+            transcribe_module = importlib.import_module("whisper.transcribe")
+            if not hasattr(transcribe_module, "tqdm"):
+                raise AttributeError("whisper.transcribe não usa tqdm")
+        except Exception as e:
+            logger.warning(f"Progresso detalhado do Whisper indisponível: {e}")
+            return
+
+        class _ProgressBar(tqdm.tqdm):
+            def update(self, n=1):
+                callback = getattr(_progress_local, "callback", None)
+                if callback is not None and self.total:
+                    self._frames_done = getattr(self, "_frames_done", 0) + n
+                    callback(min(self._frames_done, self.total) / MEL_FRAMES_PER_SECOND, self.total / MEL_FRAMES_PER_SECOND)
+                return super().update(n)
+
+        transcribe_module.tqdm = types.SimpleNamespace(tqdm=_ProgressBar)
+
+
+@contextmanager
+def _whisper_progress(progress_callback):
+    """
+    Registra progress_callback para o model.transcribe executado dentro do bloco.
+    """
+    if progress_callback is None:
+        yield
+        return
+    _install_progress_hook()
+    _progress_local.callback = progress_callback
+    try:
+        yield
+    finally:
+        _progress_local.callback = None
+
+
+class TranscriptionBackend(ABC):
+    """
+    Interface comum dos backends de transcrição.
+
+    transcribe recebe a forma de onda mono 16 kHz e os mesmos parâmetros do
+    whisper.transcribe (language, word_timestamps, fp16, beam_size, best_of) e
+    devolve um dicionário no formato do openai-whisper: 'text', 'language' e
+    'segments' (com 'id', 'start', 'end', 'text' e, se pedido, 'words').
+    """
+
+    name = None
+    # Expõe um modelo openai-whisper em self.model (necessário para a transcrição em lote)
+    supports_batch_decode = False
+    # Bytes por parâmetro dos pesos carregados (fp32 = 4, int8 = 1)
+    bytes_per_parameter = 4
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.model = None
+
+    @abstractmethod
+    def load(self):
+        raise NotImplementedError
+
+    def unload(self):
+        self.model = None
+
+    def memory_bytes(self):
+        """
+        Memória aproximada dos pesos do modelo, pelo tamanho do modelo
+        ("large-v3" conta como "large"; nomes desconhecidos como o maior modelo).
+        """
+        base_name = self.model_name.split(".")[0].split("-")[0]
+        parameters = MODEL_PARAMETERS_MILLIONS.get(base_name, max(MODEL_PARAMETERS_MILLIONS.values()))
+        return int(parameters * 1_000_000 * self.bytes_per_parameter)
+
+    @abstractmethod
+    def transcribe(self, audio, progress_callback=None, **params):
+        """
+        Args:
+            audio (numpy.ndarray): Forma de onda mono 16 kHz
+            progress_callback (callable, optional): Chamado com (segundos_processados, duração_total)
+            **params: Parâmetros no formato do whisper.transcribe
+
+        Returns:
+            dict: Resultado no formato do openai-whisper
+        """
+        raise NotImplementedError
+
+
+class OpenAIWhisperBackend(TranscriptionBackend):
+    """
+    Implementação de referência com o pacote openai-whisper.
+    """
+
+    name = "whisper"
+    supports_batch_decode = True
+
+    def load(self):
+        import whisper
+        self.model = whisper.load_model(self.model_name)
+
+    def memory_bytes(self):
+        # Com o modelo carregado, mede os tensores em vez de estimar
+        if self.model is not None and hasattr(self.model, "parameters"):
+            try:
+                return sum(tensor.numel() * tensor.element_size()
+                           for tensor in list(self.model.parameters()) + list(self.model.buffers()))
+            except Exception:
+                pass
+        return super().memory_bytes()
+
+    def transcribe(self, audio, progress_callback=None, **params):
+        with _whisper_progress(progress_callback):
+            return self.model.transcribe(audio, **params)
+
+
+def _as_plain_linear(model, linear_class):
+    """
+    Converte as subclasses de nn.Linear do modelo (whisper.model.Linear, que só
+    ajusta o dtype dos pesos no forward) em nn.Linear. quantize_dynamic compara
+    o tipo exato do módulo, então sem isso nenhuma camada seria quantizada.
+
+    Returns:
+        int: Quantidade de camadas convertidas
+    """
+    converted = 0
+    for module in model.modules():
+        if isinstance(module, linear_class) and type(module) is not linear_class:
+            module.__class__ = linear_class
+            converted += 1
+    return converted
+
+
+class QuantizedWhisperBackend(OpenAIWhisperBackend):
+    """
+    openai-whisper com as camadas lineares quantizadas dinamicamente para int8
+    (torch.quantization.quantize_dynamic). Roda só em CPU e em fp32 nas demais camadas.
+    """
+
+    name = "whisper-int8"
+    # Lineares em int8, embeddings e convoluções em fp32
+    bytes_per_parameter = 1.5
+
+    def memory_bytes(self):
+        # Os pesos quantizados não aparecem em parameters(): usa a estimativa
+        return TranscriptionBackend.memory_bytes(self)
+
+    def load(self):
+        import torch
+        import whisper
+        model = whisper.load_model(self.model_name, device="cpu")
+        _as_plain_linear(model, torch.nn.Linear)
+        self.model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def transcribe(self, audio, progress_callback=None, **params):
+        params['fp16'] = False
+        return super().transcribe(audio, progress_callback=progress_callback, **params)
+
+
+class FasterWhisperBackend(TranscriptionBackend):
+    """
+    Backend CTranslate2 (pacote opcional faster-whisper), com pesos int8 por
+    padrão. Os segmentos são convertidos para o formato do openai-whisper.
+    """
+
+    name = "faster-whisper"
+    bytes_per_parameter = 1 if FASTER_WHISPER_COMPUTE_TYPE.startswith("int8") else 4
+
+    def load(self):
+        from faster_whisper import WhisperModel
+        self.model = WhisperModel(
+            self.model_name,
+            device="cpu",
+            compute_type=FASTER_WHISPER_COMPUTE_TYPE,
+            cpu_threads=FASTER_WHISPER_CPU_THREADS
+        )
+
+    def transcribe(self, audio, progress_callback=None, **params):
+        segments_iter, info = self.model.transcribe(
+            audio,
+            language=params.get('language'),
+            word_timestamps=bool(params.get('word_timestamps')),
+            # Mesmo padrão do openai-whisper: decodificação gulosa, best_of nas temperaturas de fallback
+            beam_size=params.get('beam_size') or 1,
+            best_of=params.get('best_of') or 5
+        )
+        segments = []
+        for segment in segments_iter:
+            segments.append(self._segment_to_dict(len(segments), segment))
+            if progress_callback and info.duration:
+                progress_callback(min(segment.end, info.duration), info.duration)
+        return {
+            "text": "".join(segment["text"] for segment in segments),
+            "language": info.language,
+            "segments": segments
+        }
+
+    @staticmethod
+    def _segment_to_dict(segment_id, segment):
+        data = {
+            "id": segment_id,
+            "seek": segment.seek,
+            "start": segment.start,
+            "end": segment.end,
+            "text": segment.text,
+            "tokens": list(segment.tokens),
+            "temperature": segment.temperature,
+            "avg_logprob": segment.avg_logprob,
+            "compression_ratio": segment.compression_ratio,
+            "no_speech_prob": segment.no_speech_prob
+        }
+        if segment.words:
+            data["words"] = [
+                {"word": word.word, "start": word.start, "end": word.end, "probability": word.probability}
+                for word in segment.words
+            ]
+        return data
+
+
+TRANSCRIPTION_BACKENDS = {
+    backend.name: backend for backend in (OpenAIWhisperBackend, QuantizedWhisperBackend, FasterWhisperBackend)
+}
+
+
+def create_transcription_backend(backend_name, model_name):
+    """
+    Cria (sem carregar) o backend configurado em TRANSCRIPTION_BACKEND.
+    """
+    backend_class = TRANSCRIPTION_BACKENDS.get(backend_name)
+    if backend_class is None:
+        logger.warning(f"Backend de transcrição desconhecido '{backend_name}', usando '{OpenAIWhisperBackend.name}'.")
+        backend_class = OpenAIWhisperBackend
+    return backend_class(model_name)
@@ -0,0 +1,131 @@
+# Agrupamento de janelas de áudio de vários jobs em um único lote para o modelo
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _BatchRequest:
+    """
+    Uma janela aguardando o lote. O worker que chamou submit fica bloqueado em
+    done até o lote ser executado e o resultado ser devolvido.
+    """
+
+    def __init__(self, key, payload):
+        self.key = key
+        self.payload = payload
+        self.enqueued_at = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.batch_size = 0
+
+
+class TranscriptionBatcher:
+    """
+    Junta requisições enviadas por workers diferentes em lotes de até
+    max_batch_size itens e executa cada lote de uma vez em run_batch.
+
+    Um lote sai quando atinge max_batch_size ou quando a requisição mais antiga
+    já esperou max_wait_seconds. Só entram no mesmo lote requisições com a mesma
+    chave (ex.: as mesmas opções de decodificação).
+    """
+
+    def __init__(self, name, run_batch, max_batch_size, max_wait_seconds):
+        self.name = name
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_seconds = max(0.0, float(max_wait_seconds))
+        self._condition = threading.Condition()
+        self._pending = []
+        self._thread = None
+        self._batches = 0
+        self._items = 0
+        self._largest_batch = 0
+        self._failed_batches = 0
+
+    def submit(self, key, payload):
+        """
+        Envia um item para o próximo lote e aguarda o seu resultado.
+
+        Args:
+            key (hashable): Itens só são agrupados com outros da mesma chave
+            payload: Item repassado para run_batch
+
+        Returns:
+            tuple: (resultado do item, tamanho do lote em que foi executado)
+
+        Raises:
+            Exception: O erro levantado por run_batch, se o lote falhar
+        """
+        request = _BatchRequest(key, payload)
+        with self._condition:
+            self._pending.append(request)
+            self._ensure_thread_locked()
+            self._condition.notify_all()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result, request.batch_size
+
+    def get_stats(self):
+        with self._condition:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_seconds": self.max_wait_seconds,
+                "waiting": len(self._pending),
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "largest_batch": self._largest_batch,
+                "failed_batches": self._failed_batches
+            }
+
+    def _ensure_thread_locked(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name=f"{self.name}-batcher", daemon=True)
+            self._thread.start()
+
+    def _same_key_count_locked(self, key):
+        return sum(1 for request in self._pending if request.key == key)
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._pending:
+                self._condition.wait()
+            key = self._pending[0].key
+            deadline = self._pending[0].enqueued_at + self.max_wait_seconds
+            while self._same_key_count_locked(key) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            batch = [request for request in self._pending if request.key == key][:self.max_batch_size]
+            self._pending = [request for request in self._pending if request not in batch]
+            return key, batch
+
+    def _loop(self):
+        while True:
+            key, batch = self._next_batch()
+            failed = False
+            try:
+                results = self.run_batch(key, [request.payload for request in batch])
+                for request, result in zip(batch, results):
+                    request.result = result
+            except Exception as e:
+                failed = True
+                logger.exception(f"Lote de {len(batch)} item(ns) de '{self.name}' falhou.")
+                for request in batch:
+                    request.error = e
+            finally:
+                with self._condition:
+                    self._batches += 1
+                    self._items += len(batch)
+                    self._largest_batch = max(self._largest_batch, len(batch))
+                    if failed:
+                        self._failed_batches += 1
+                for request in batch:
+                    request.batch_size = len(batch)
+                    request.done.set()
@@ -0,0 +1,142 @@
+# Jobs de transcrição executados pelo agendador: em threads do processo web
+# (TRANSCRIPTION_EXECUTION_MODE=inline) ou nos processos de worker.py (worker)
+import os
+import json
+import time
+import hashlib
+import logging
+from config import DEFAULT_INSIGHTS_PROMPT, WHISPER_MODEL_NAME, TRANSCRIPTION_BACKEND
+from services import whisper_service, ollama_service, task_service, audio_service
+from services.job_scheduler import transcription_scheduler
+from services.cache_service import result_cache, build_cache_key
+
+logger = logging.getLogger(__name__)
+
+
+def process_audio_task(file_path, task_id, original_filename):
+    """
+    Transcreve o áudio de uma tarefa e a prepara para os insights.
+    """
+    try:
+        task_service.update_task_status(task_id, status="processing", progress="Iniciando transcrição...")
+
+        # Transcrição
+        task_service.update_task_status(task_id, status="processing", progress="Transcrevendo áudio...")
+        if not os.path.exists(file_path):
+            task_service.update_task_status(task_id, status="error", message="Arquivo não encontrado para processamento.")
+            logger.error(f"Task {task_id}: Arquivo {file_path} não encontrado para processamento.") # Adicionado
+            return
+
+        # Executar transcrição com diarização se solicitado
+        include_diarization = task_service.get_task_option(task_id, 'include_diarization', False)
+        whisper_model = task_service.get_task_option(task_id, 'whisper_model', WHISPER_MODEL_NAME)
+        transcription_result, error = whisper_service.transcribe_audio(
+            file_path,
+            include_timestamps=True,
+            include_diarization=include_diarization,
+            progress_callback=whisper_service.TranscriptionProgress(
+                lambda metrics: report_transcription_progress(task_id, metrics)
+            ),
+            model_name=whisper_model
+        )
+
+        if error:
+            task_service.update_task_status(task_id, status="error", message=error)
+            logger.error(f"Task {task_id}: Erro na transcrição Whisper: {error}")
+            return
+
+        if transcription_result is None:
+            task_service.update_task_status(task_id, status="error", message="Transcrição retornou resultado vazio.")
+            logger.error(f"Task {task_id}: Transcrição retornou resultado vazio para o arquivo {original_filename}.")
+            return
+
+        # Guardar no cache por conteúdo para uploads idênticos futuros. Se a diarização
+        # falhou, o resultado não corresponde à chave (com diarização) e não é guardado
+        content_hash = task_service.get_task_option(task_id, 'content_hash')
+        if content_hash and not transcription_result.get('diarization_error'):
+            result_cache.put(transcription_cache_key(content_hash, include_diarization, whisper_model), transcription_result)
+
+        complete_transcription_task(task_id, transcription_result)
+
+    except FileNotFoundError as fnf_error:
+        error_message = f"Erro: Arquivo não encontrado durante o processamento da tarefa: {fnf_error}"
+        logger.error(f"Task {task_id}: {error_message}")
+        task_service.update_task_status(task_id, status="error", message=error_message)
+    except ConnectionError as conn_error: # Exemplo para erros de conexão (ajustar conforme os serviços)
+        error_message = f"Erro de conexão durante o processamento da tarefa: {conn_error}"
+        logger.error(f"Task {task_id}: {error_message}")
+        task_service.update_task_status(task_id, status="error", message=error_message)
+    except Exception as e:
+        error_message = f"Erro inesperado durante o processamento da tarefa: {e}"
+        if "ffmpeg" in str(e).lower():
+            error_message += "\\nVerifique se o ffmpeg está instalado no sistema e acessível no PATH."
+        logger.exception(f"Task {task_id}: {error_message}") # Usar logger.exception para incluir o stack trace
+        task_service.update_task_status(task_id, status="error", message=error_message)
+
+    finally:
+        try:
+            audio_service.remove_cached_audio(file_path)
+            if os.path.exists(file_path):
+                time.sleep(2)
+                os.remove(file_path)
+                logger.info(f"Task {task_id}: Arquivo {file_path} removido com sucesso.") # Modificado
+        except Exception as e:
+            logger.warning(f"Task {task_id}: Aviso - Não foi possível remover o arquivo {file_path}: {e}") # Modificado
+
+
+def report_transcription_progress(task_id, metrics):
+    """
+    Publica na tarefa o progresso numérico da transcrição e repassa o ETA ao agendador.
+    """
+    percent = metrics['progress_fraction'] * 100
+    eta_seconds = metrics['eta_seconds']
+    progress = f"Transcrevendo áudio... {percent:.0f}%"
+    if eta_seconds is not None and metrics['progress_fraction'] < 1:
+        progress += f" (restam ~{int(eta_seconds)}s)"
+    task_service.update_task_status(task_id, status="processing", progress=progress, **metrics)
+    transcription_scheduler.report_remaining(task_id, eta_seconds)
+
+
+def complete_transcription_task(task_id, transcription_result, message="Transcrição concluída! Pronto para gerar insights."):
+    """
+    Marca a tarefa como transcrita, anexando os dados da transcrição e os modelos Ollama disponíveis.
+    """
+    # Extrair texto principal para compatibilidade
+    transcribed_text = transcription_result.get('text', '')
+
+    # Verificar conexão e modelos Ollama
+    available_models, ollama_conn, _ = ollama_service.get_available_ollama_models()
+
+    # Versão da transcrição (ETag de /transcript) calculada uma única vez, antes de publicar o status
+    transcript_etag = hashlib.sha1(
+        json.dumps(transcription_result, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    ).hexdigest()
+    task_service.set_task_option(task_id, 'transcript_etag', transcript_etag)
+    task_service.set_task_option(task_id, 'segments_count', len(transcription_result.get('segments') or []))
+
+    task_service.update_task_status(
+        task_id,
+        status="transcription_completed",
+        text=transcribed_text,
+        transcription_data=transcription_result,  # Dados completos da transcrição
+        message=message,
+        current_prompt=DEFAULT_INSIGHTS_PROMPT,
+        available_ollama_models=available_models,
+        ollama_connected=ollama_conn,
+        progress_fraction=1.0,
+        eta_seconds=0
+    )
+
+
+def transcription_cache_key(content_hash, include_diarization, whisper_model=WHISPER_MODEL_NAME):
+    """
+    Chave do cache de resultados: conteúdo do arquivo mais as opções que alteram a transcrição.
+    """
+    return build_cache_key(
+        content_hash,
+        model_name=whisper_model,
+        language=whisper_service.TRANSCRIPTION_LANGUAGE,
+        include_diarization=include_diarization,
+        word_timestamps=True,
+        backend=TRANSCRIPTION_BACKEND
+    )
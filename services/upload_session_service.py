@@ -0,0 +1,271 @@
+# Uploads retomáveis em partes: sessões em disco para arquivos grandes enviados por conexões instáveis
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+from config import UPLOAD_FOLDER, MAX_FILE_SIZE, UPLOAD_SESSION_CHUNK_MB, UPLOAD_SESSION_TTL_MINUTES, UPLOAD_CHUNK_SIZE_KB
+
+logger = logging.getLogger(__name__)
+
+# Subpasta de UPLOAD_FOLDER com as sessões (mesmo sistema de arquivos: finalize só renomeia)
+SESSIONS_DIR_NAME = ".sessions"
+
+
+class UploadSessionError(Exception):
+    """
+    Erro no protocolo de upload em partes. status_code é o código HTTP da resposta.
+    """
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class UploadSessionStore:
+    """
+    Sessões de upload em partes.
+
+    Cada sessão é uma pasta com meta.json (nome, tamanho e opções do upload),
+    data.part (arquivo já com o tamanho final) e uma marca em chunks/ para
+    cada parte recebida e verificada. As partes são gravadas direto na sua
+    posição em data.part, em qualquer ordem, então o arquivo já está montado
+    quando a última parte chega: finalize só confere as partes e move
+    data.part para a pasta de uploads.
+
+    Sessões sem atividade por ttl_seconds são removidas por cleanup_expired.
+    """
+
+    def __init__(self, root_dir, chunk_size, max_bytes, ttl_seconds, read_block_size):
+        self.root_dir = root_dir
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.read_block_size = read_block_size
+
+    def _session_dir(self, upload_id):
+        # upload_id vem da URL: só aceita o formato gerado em create
+        try:
+            upload_id = uuid.UUID(upload_id).hex
+        except (ValueError, TypeError):
+            raise UploadSessionError("Upload não encontrado.", 404)
+        return os.path.join(self.root_dir, upload_id)
+
+    def _load_meta(self, upload_id):
+        session_dir = self._session_dir(upload_id)
+        try:
+            with open(os.path.join(session_dir, "meta.json"), encoding="utf-8") as f:
+                return session_dir, json.load(f)
+        except FileNotFoundError:
+            raise UploadSessionError("Upload não encontrado ou expirado.", 404)
+
+    def _received_chunks(self, session_dir):
+        try:
+            return sorted(int(name) for name in os.listdir(os.path.join(session_dir, "chunks")) if name.isdigit())
+        except FileNotFoundError:
+            return []
+
+    def create(self, filename, size, options=None, sha256=None):
+        """
+        Abre uma sessão para um arquivo de size bytes.
+
+        Args:
+            filename (str): Nome original do arquivo
+            size (int): Tamanho total em bytes
+            options (dict, optional): Opções do upload repassadas à tarefa (diarização, modelo)
+            sha256 (str, optional): Hash do arquivo inteiro, conferido em finalize
+
+        Returns:
+            dict: Estado da sessão (ver status)
+        """
+        if not isinstance(size, int) or size <= 0:
+            raise UploadSessionError("Informe o tamanho do arquivo em bytes.")
+        if size > self.max_bytes:
+            raise UploadSessionError(f"Arquivo maior que o limite de {self.max_bytes // (1024 * 1024)} MB.", 413)
+
+        upload_id = uuid.uuid4().hex
+        session_dir = os.path.join(self.root_dir, upload_id)
+        os.makedirs(os.path.join(session_dir, "chunks"))
+        # Arquivo esparso com o tamanho final: cada parte é gravada na sua posição
+        with open(os.path.join(session_dir, "data.part"), "wb") as f:
+            f.truncate(size)
+        meta = {
+            "upload_id": upload_id,
+            "filename": filename,
+            "size": size,
+            "chunk_size": self.chunk_size,
+            "total_chunks": (size + self.chunk_size - 1) // self.chunk_size,
+            "sha256": sha256.lower() if sha256 else None,
+            "options": options or {},
+            "created_at": time.time()
+        }
+        with open(os.path.join(session_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        logger.info(f"Upload em partes {upload_id} iniciado: {filename} ({size} bytes, {meta['total_chunks']} partes)")
+        return self.status(upload_id)
+
+    def status(self, upload_id):
+        """
+        Returns:
+            dict: upload_id, filename, size, chunk_size, total_chunks,
+                  received_chunks, missing_chunks, complete e expires_at
+        """
+        session_dir, meta = self._load_meta(upload_id)
+        received = self._received_chunks(session_dir)
+        received_set = set(received)
+        missing = [index for index in range(meta["total_chunks"]) if index not in received_set]
+        return {
+            "upload_id": meta["upload_id"],
+            "filename": meta["filename"],
+            "size": meta["size"],
+            "chunk_size": meta["chunk_size"],
+            "total_chunks": meta["total_chunks"],
+            "received_chunks": received,
+            "missing_chunks": missing,
+            "complete": not missing,
+            "expires_at": os.path.getmtime(session_dir) + self.ttl_seconds
+        }
+
+    def write_chunk(self, upload_id, start, stop, stream, expected_sha256):
+        """
+        Grava a parte [start, stop) lida de stream na sua posição do arquivo.
+        A parte só é marcada como recebida se o SHA-256 conferir; reenviar uma
+        parte já recebida é permitido (a nova cópia a substitui e, se não
+        conferir, a parte volta a ficar pendente).
+
+        Args:
+            start (int): Primeiro byte (múltiplo de chunk_size)
+            stop (int): Byte seguinte ao último (fim da parte ou do arquivo)
+            stream: Corpo da requisição
+            expected_sha256 (str): SHA-256 da parte informado pelo cliente
+
+        Returns:
+            dict: Estado da sessão após a gravação
+        """
+        session_dir, meta = self._load_meta(upload_id)
+        chunk_size = meta["chunk_size"]
+        if not expected_sha256:
+            raise UploadSessionError("Informe o SHA-256 da parte no cabeçalho X-Chunk-SHA256.")
+        if start % chunk_size or stop != min(start + chunk_size, meta["size"]) or start >= meta["size"]:
+            raise UploadSessionError(
+                f"Intervalo inválido: cada parte deve começar em um múltiplo de {chunk_size} bytes "
+                f"e ter {chunk_size} bytes (a última pode ser menor)."
+            )
+
+        index = start // chunk_size
+        # A marca sai antes de sobrescrever: um reenvio que falhe deixa a parte como pendente,
+        # em vez de manter a marca de uma cópia anterior que não está mais no arquivo
+        marker_path = os.path.join(session_dir, "chunks", str(index))
+        try:
+            os.remove(marker_path)
+        except FileNotFoundError:
+            pass
+
+        digest = hashlib.sha256()
+        remaining = stop - start
+        offset = start
+        fd = os.open(os.path.join(session_dir, "data.part"), os.O_WRONLY)
+        try:
+            while remaining > 0:
+                block = stream.read(min(self.read_block_size, remaining))
+                if not block:
+                    break
+                digest.update(block)
+                os.pwrite(fd, block, offset)
+                offset += len(block)
+                remaining -= len(block)
+        finally:
+            os.close(fd)
+
+        if remaining > 0:
+            raise UploadSessionError(f"Parte {index} incompleta: faltaram {remaining} bytes. Envie-a novamente.")
+        if digest.hexdigest() != expected_sha256.lower():
+            raise UploadSessionError(f"Checksum da parte {index} não confere. Envie-a novamente.")
+
+        with open(f"{marker_path}.tmp", "w") as f:
+            f.write(digest.hexdigest())
+        os.replace(f"{marker_path}.tmp", marker_path)
+        # A data da pasta marca a última atividade, usada na expiração
+        os.utime(session_dir)
+        return self.status(upload_id)
+
+    def finalize(self, upload_id):
+        """
+        Confere se todas as partes chegaram e calcula o SHA-256 do arquivo montado
+        (comparado com o informado em create, se houver).
+
+        Returns:
+            tuple: (caminho de data.part, sha256 do arquivo, meta da sessão)
+        """
+        session_dir, meta = self._load_meta(upload_id)
+        state = self.status(upload_id)
+        if not state["complete"]:
+            raise UploadSessionError(
+                f"Upload incompleto: faltam {len(state['missing_chunks'])} de {meta['total_chunks']} partes.", 409
+            )
+
+        data_path = os.path.join(session_dir, "data.part")
+        digest = hashlib.sha256()
+        with open(data_path, "rb") as f:
+            for block in iter(lambda: f.read(self.read_block_size), b""):
+                digest.update(block)
+        content_hash = digest.hexdigest()
+        if meta["sha256"] and meta["sha256"] != content_hash:
+            raise UploadSessionError("O SHA-256 do arquivo montado não confere com o informado no início.", 409)
+        return data_path, content_hash, meta
+
+    def delete(self, upload_id):
+        """
+        Remove a sessão (e o arquivo, se ainda não tiver sido movido).
+        """
+        shutil.rmtree(self._session_dir(upload_id), ignore_errors=True)
+
+    def cleanup_expired(self):
+        """
+        Remove sessões sem atividade há mais de ttl_seconds.
+
+        Returns:
+            int: Quantidade de sessões removidas
+        """
+        if self.ttl_seconds <= 0:
+            return 0
+        deadline = time.time() - self.ttl_seconds
+        removed = 0
+        try:
+            with os.scandir(self.root_dir) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir() and entry.stat().st_mtime < deadline:
+                            shutil.rmtree(entry.path, ignore_errors=True)
+                            removed += 1
+                    except OSError as e:
+                        logger.warning(f"Erro ao verificar a sessão de upload {entry.path}: {e}")
+        except FileNotFoundError:
+            return 0
+        if removed:
+            logger.info(f"{removed} upload(s) em partes expirado(s) removido(s).")
+        return removed
+
+    def get_stats(self):
+        sessions = 0
+        try:
+            with os.scandir(self.root_dir) as it:
+                sessions = sum(1 for entry in it if entry.is_dir())
+        except FileNotFoundError:
+            pass
+        return {
+            "active_sessions": sessions,
+            "chunk_size": self.chunk_size,
+            "ttl_seconds": self.ttl_seconds
+        }
+
+
+upload_sessions = UploadSessionStore(
+    os.path.join(UPLOAD_FOLDER, SESSIONS_DIR_NAME),
+    UPLOAD_SESSION_CHUNK_MB * 1024 * 1024,
+    MAX_FILE_SIZE,
+    UPLOAD_SESSION_TTL_MINUTES * 60,
+    UPLOAD_CHUNK_SIZE_KB * 1024
+)
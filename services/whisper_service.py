@@ -1,25 +1,314 @@
 # Serviço para interagir com o modelo Whisper para transcrição de áudio
-import whisper
+import os
+import gc
+import time
 import logging
-from config import WHISPER_MODEL_NAME
-from .diarization_service import perform_diarization, get_speakers_summary, format_diarization_for_display
+import threading
+import multiprocessing
+import numpy as np
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from config import (
+    WHISPER_MODEL_NAME, LONG_AUDIO_MODE, LONG_AUDIO_MIN_SECONDS, LONG_AUDIO_CHUNK_SECONDS,
+    LONG_AUDIO_CHUNK_OVERLAP_SECONDS, TRANSCRIPTION_PROCESSES, DIARIZATION_EXECUTION_MODE,
+    PROGRESS_UPDATE_SECONDS, VAD_ENABLED, VAD_MAX_SPEECH_RATIO, VAD_BATCH_SECONDS, VAD_GAP_SECONDS,
+    WHISPER_BATCH_ENABLED, WHISPER_BATCH_SIZE, WHISPER_BATCH_WAIT_MS, TRANSCRIPTION_BACKEND,
+    WHISPER_ALLOWED_MODELS, WHISPER_MODELS_RAM_MB, TRANSCRIPTION_WORKERS
+)
+from .audio_service import (
+    SAMPLE_RATE, load_audio_cached, get_duration, split_on_silence, get_cache_path,
+    detect_voiced_regions, group_regions, concatenate_regions, map_to_original_times
+)
+from .diarization_service import (
+    perform_diarization, submit_diarization, get_concurrent_thread_split,
+    get_speakers_summary, format_diarization_for_display
+)
+from .speaker_assignment import SpeakerTimeline, assign_speakers, build_speaker_turns
+from .transcription_batcher import TranscriptionBatcher
+from .transcription_backends import MEL_FRAMES_PER_SECOND, create_transcription_backend
 
 logger = logging.getLogger(__name__)
-loaded_model = None
 
-def load_whisper_model():
-    global loaded_model
-    if loaded_model is None:
+# Idioma forçado nas transcrições (melhor precisão para o português)
+TRANSCRIPTION_LANGUAGE = 'pt'
+
+# Pool de processos do modo de áudio longo (cada processo mantém seu próprio modelo)
+_chunk_pool = None
+_chunk_pool_lock = threading.Lock()
+_worker_model = None
+_worker_model_key = None
+
+# Diarizações concorrentes em andamento e o número de threads do torch anterior a elas
+# (torch.set_num_threads vale para o processo todo: restaurado quando a última termina)
+_concurrent_diarizations = 0
+_threads_before_diarization = None
+_concurrent_threads_lock = threading.Lock()
+
+# Janela do encoder do Whisper: áudios até esse tamanho são decodificados em um único passo
+WHISPER_WINDOW_SECONDS = 30
+
+# Limiares do whisper.transcribe: janelas do lote abaixo deles são refeitas com fallback de temperatura
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+# Resolução dos tokens de timestamp do Whisper (segundos)
+TIMESTAMP_PRECISION = 0.02
+
+# Pontuação agrupada às palavras vizinhas nos timestamps por palavra (padrões do whisper.transcribe)
+PREPEND_PUNCTUATIONS = "\"'“¿([{-"
+APPEND_PUNCTUATIONS = "\"'.。,，!！?？:：”)]}、"
+
+class ModelRegistry:
+    """
+    Modelos de transcrição carregados sob demanda, identificados por
+    (backend, modelo).
+
+    Cada transcrição segura uma referência ao modelo (acquire/release) e só
+    modelos sem referências podem ser descarregados. Quando a memória estimada
+    dos modelos passa de max_bytes, os usados há mais tempo saem primeiro; os
+    modelos em pinned (o modelo padrão) nunca são descarregados.
+    """
+
+    def __init__(self, max_bytes, pinned=()):
+        self.max_bytes = max_bytes
+        self.pinned = set(pinned)
+        self._condition = threading.Condition()
+        self._entries = OrderedDict()  # (backend, modelo) -> backend carregado; o fim é o uso mais recente
+        self._refcounts = {}
+        self._loading = set()
+        self._counters = {"loads": 0, "unloads": 0, "hits": 0}
+
+    def acquire(self, model_name, backend_name=TRANSCRIPTION_BACKEND):
+        """
+        Retorna o backend do modelo, carregando-o se necessário, e incrementa
+        sua contagem de referências. Todo acquire deve ter um release.
+
+        Raises:
+            Exception: O erro do carregamento do modelo
+        """
+        key = (backend_name, model_name)
+        with self._condition:
+            # Outro worker já está carregando o mesmo modelo: espera por ele
+            while key in self._loading:
+                self._condition.wait()
+            backend = self._entries.get(key)
+            if backend is not None:
+                self._entries.move_to_end(key)
+                self._refcounts[key] += 1
+                self._counters["hits"] += 1
+                return backend
+            self._loading.add(key)
+            backend = create_transcription_backend(backend_name, model_name)
+            # Abre espaço antes de carregar, para não somar o modelo novo aos que vão sair
+            evicted = self._evict_locked(extra_bytes=backend.memory_bytes())
+
+        self._unload(evicted)
         try:
-            loaded_model = whisper.load_model(WHISPER_MODEL_NAME)
-            logger.info(f"Modelo Whisper '{WHISPER_MODEL_NAME}' carregado com sucesso.")
-            return True, f"Modelo Whisper '{WHISPER_MODEL_NAME}' carregado e pronto."
-        except Exception as e:
-            logger.error(f"Erro ao carregar o modelo Whisper: {e}")
-            return False, f"Erro ao carregar o modelo Whisper: {e}"
-    return True, f"Modelo Whisper '{WHISPER_MODEL_NAME}' já carregado."
+            logger.info(f"Carregando modelo Whisper '{model_name}' (backend '{backend_name}')...")
+            backend.load()
+        except Exception:
+            with self._condition:
+                self._loading.discard(key)
+                self._condition.notify_all()
+            raise
+
+        with self._condition:
+            self._loading.discard(key)
+            self._entries[key] = backend
+            self._refcounts[key] = 1
+            self._counters["loads"] += 1
+            evicted = self._evict_locked()
+            self._condition.notify_all()
+        self._unload(evicted)
+        return backend
+
+    def release(self, model_name, backend_name=TRANSCRIPTION_BACKEND):
+        """
+        Devolve a referência obtida em acquire; sem referências, o modelo pode ser descarregado.
+        """
+        key = (backend_name, model_name)
+        with self._condition:
+            if self._refcounts.get(key, 0) > 0:
+                self._refcounts[key] -= 1
+            evicted = self._evict_locked()
+        self._unload(evicted)
+
+    @contextmanager
+    def use(self, model_name, backend_name=TRANSCRIPTION_BACKEND):
+        backend = self.acquire(model_name, backend_name)
+        try:
+            yield backend
+        finally:
+            self.release(model_name, backend_name)
+
+    def is_loaded(self, model_name, backend_name=TRANSCRIPTION_BACKEND):
+        with self._condition:
+            return (backend_name, model_name) in self._entries
+
+    def get_stats(self):
+        with self._condition:
+            loaded = [
+                {
+                    "backend": backend_name,
+                    "model": model_name,
+                    "references": self._refcounts.get((backend_name, model_name), 0),
+                    "memory_mb": round(backend.memory_bytes() / (1024 * 1024))
+                }
+                for (backend_name, model_name), backend in self._entries.items()
+            ]
+            stats = dict(self._counters)
+        stats.update({
+            "loaded": loaded,
+            "memory_mb": sum(entry["memory_mb"] for entry in loaded),
+            "max_memory_mb": round(self.max_bytes / (1024 * 1024)) if self.max_bytes else None
+        })
+        return stats
+
+    def _evict_locked(self, extra_bytes=0):
+        # Retorna os backends removidos; o descarregamento acontece fora do lock
+        if not self.max_bytes:
+            return []
+        total = extra_bytes + sum(backend.memory_bytes() for backend in self._entries.values())
+        evicted = []
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            if key in self.pinned or self._refcounts.get(key, 0) > 0:
+                continue
+            backend = self._entries.pop(key)
+            self._refcounts.pop(key, None)
+            total -= backend.memory_bytes()
+            evicted.append(backend)
+            self._counters["unloads"] += 1
+        if total > self.max_bytes:
+            logger.warning(f"Modelos carregados ({total // (1024 * 1024)} MB) acima do orçamento de "
+                           f"{self.max_bytes // (1024 * 1024)} MB: todos estão em uso.")
+        return evicted
+
+    @staticmethod
+    def _unload(backends):
+        for backend in backends:
+            logger.info(f"Descarregando modelo Whisper '{backend.model_name}' (backend '{backend.name}').")
+            backend.unload()
+        if backends:
+            gc.collect()
+
+# Registro global dos modelos; o modelo padrão fica sempre carregado
+model_registry = ModelRegistry(WHISPER_MODELS_RAM_MB * 1024 * 1024, pinned=[(TRANSCRIPTION_BACKEND, WHISPER_MODEL_NAME)])
+
+def get_allowed_models():
+    """
+    Modelos aceitos no campo "model" do upload (o modelo padrão sempre incluído).
+    """
+    models = list(WHISPER_ALLOWED_MODELS)
+    if WHISPER_MODEL_NAME not in models:
+        models.insert(0, WHISPER_MODEL_NAME)
+    return models
+
+# Aquecimento do modelo padrão em segundo plano: "idle", "loading", "ready" ou "error"
+_warmup = {"state": "idle", "message": None, "started_at": None, "finished_at": None}
+_warmup_lock = threading.Lock()
+
+def start_warmup():
+    """
+    Carrega o modelo padrão em uma thread em segundo plano, para que o
+    processo web comece a atender (status, arquivos estáticos) sem esperar
+    o torch e o modelo. Não faz nada se já estiver carregando ou pronto.
+
+    Returns:
+        bool: True se o aquecimento foi iniciado agora
+    """
+    with _warmup_lock:
+        if _warmup["state"] in ("loading", "ready"):
+            return False
+        _warmup.update(state="loading", message=f"Carregando modelo Whisper '{WHISPER_MODEL_NAME}'...",
+                       started_at=time.time(), finished_at=None)
+    threading.Thread(target=_warmup_worker, name="whisper-warmup", daemon=True).start()
+    return True
+
+def _warmup_worker():
+    success, message = load_whisper_model()
+    with _warmup_lock:
+        _warmup.update(state="ready" if success else "error", message=message, finished_at=time.time())
+
+def get_readiness():
+    """
+    Estado do aquecimento do modelo padrão.
+
+    Returns:
+        dict: 'ready', 'state', 'message' e 'load_seconds' (None enquanto carrega)
+    """
+    with _warmup_lock:
+        warmup = dict(_warmup)
+    # O modelo também pode ter sido carregado fora do aquecimento (ex.: por uma transcrição)
+    if warmup["state"] != "ready" and is_model_loaded():
+        warmup.update(state="ready", message=f"Modelo Whisper '{WHISPER_MODEL_NAME}' carregado e pronto.")
+    load_seconds = None
+    if warmup["started_at"] and warmup["finished_at"]:
+        load_seconds = round(warmup["finished_at"] - warmup["started_at"], 2)
+    return {
+        "ready": warmup["state"] == "ready",
+        "state": warmup["state"],
+        "message": warmup["message"],
+        "load_seconds": load_seconds
+    }
+
+def load_whisper_model():
+    """
+    Garante que o modelo padrão (WHISPER_MODEL_NAME) esteja carregado.
 
-def transcribe_audio(file_path, include_timestamps=True, include_diarization=False):
+    Returns:
+        tuple: (sucesso, mensagem)
+    """
+    if model_registry.is_loaded(WHISPER_MODEL_NAME):
+        return True, f"Modelo Whisper '{WHISPER_MODEL_NAME}' já carregado."
+    try:
+        with model_registry.use(WHISPER_MODEL_NAME) as backend:
+            logger.info(f"Modelo Whisper '{WHISPER_MODEL_NAME}' carregado com sucesso (backend '{backend.name}').")
+        return True, f"Modelo Whisper '{WHISPER_MODEL_NAME}' carregado e pronto."
+    except Exception as e:
+        logger.error(f"Erro ao carregar o modelo Whisper: {e}")
+        return False, f"Erro ao carregar o modelo Whisper: {e}"
+
+class TranscriptionProgress:
+    """
+    Converte o avanço da transcrição (segundos de áudio processados) em fração
+    concluída, fator de tempo real medido e ETA, repassando as métricas para
+    on_update no máximo a cada min_interval segundos.
+    """
+
+    def __init__(self, on_update, min_interval=PROGRESS_UPDATE_SECONDS):
+        self.on_update = on_update
+        self.min_interval = min_interval
+        self._started_at = None
+        self._last_update = None
+
+    def __call__(self, processed_seconds, total_seconds):
+        now = time.monotonic()
+        if self._started_at is None:
+            self._started_at = now
+        finished = processed_seconds >= total_seconds
+        if not finished and self._last_update is not None and now - self._last_update < self.min_interval:
+            return
+        self._last_update = now
+
+        elapsed = now - self._started_at
+        realtime_factor = elapsed / processed_seconds if processed_seconds > 0 else None
+        eta_seconds = None
+        if realtime_factor is not None:
+            eta_seconds = round(max(0.0, total_seconds - processed_seconds) * realtime_factor, 1)
+        self.on_update({
+            "progress_fraction": round(min(1.0, processed_seconds / total_seconds), 4) if total_seconds > 0 else 0.0,
+            "audio_seconds_processed": round(processed_seconds, 1),
+            "audio_duration_seconds": round(total_seconds, 1),
+            "realtime_factor": round(realtime_factor, 3) if realtime_factor is not None else None,
+            "eta_seconds": eta_seconds
+        })
+
+def transcribe_audio(file_path, include_timestamps=True, include_diarization=False, progress_callback=None,
+                     model_name=None):
     """
     Transcreve áudio com opções para timestamps e diarização de locutores.
 
@@ -27,16 +316,26 @@ def transcribe_audio(file_path, include_timestamps=True, include_diarization=Fal
         file_path (str): Caminho para o arquivo de áudio
         include_timestamps (bool): Se deve incluir informações de tempo
         include_diarization (bool): Se deve incluir identificação de locutores
+        progress_callback (callable, optional): Chamado com (segundos_processados, duração_total)
+            durante a transcrição; veja TranscriptionProgress
+        model_name (str, optional): Modelo Whisper (padrão WHISPER_MODEL_NAME), carregado sob demanda
 
     Returns:
         tuple: (transcription_result, error_message)
     """
-    global loaded_model
-    if loaded_model is None:
-        return None, "Modelo Whisper não carregado."
+    if not os.path.exists(file_path):
+        return None, f"Arquivo de áudio não encontrado: {file_path}"
+
+    model_name = model_name or WHISPER_MODEL_NAME
+    try:
+        backend = model_registry.acquire(model_name)
+    except Exception as e:
+        logger.error(f"Erro ao carregar o modelo Whisper '{model_name}': {e}")
+        return None, f"Erro ao carregar o modelo Whisper '{model_name}': {e}"
 
     try:
         logger.info(f"Iniciando transcrição de: {file_path}")
+        timings = {}
 
         # Detectar se é arquivo kwf e tratá-lo especialmente
         is_kwf = file_path.lower().endswith('.kwf')
@@ -45,7 +344,7 @@ def transcribe_audio(file_path, include_timestamps=True, include_diarization=Fal
         transcribe_params = {
             'fp16': False,
             'word_timestamps': include_timestamps,
-            'language': 'pt'  # Forçar português para melhor precisão
+            'language': TRANSCRIPTION_LANGUAGE  # Forçar português para melhor precisão
         }
 
         # Para arquivos kwf, usar parâmetros mais conservadores
@@ -54,24 +353,91 @@ def transcribe_audio(file_path, include_timestamps=True, include_diarization=Fal
             transcribe_params['beam_size'] = 1  # Reduzir complexidade
             transcribe_params['best_of'] = 1
 
-        # Transcrição com tratamento de erro específico
-        try:
-            result = loaded_model.transcribe(file_path, **transcribe_params)
-        except Exception as whisper_error:
-            # Se o erro for relacionado ao 'src', tentar abordagem alternativa
-            if "'src'" in str(whisper_error) or "Cannot set attribute" in str(whisper_error):
-                logger.warning(f"Erro específico detectado, tentando abordagem alternativa: {whisper_error}")
-                # Remover timestamps para resolver problema de compatibilidade
-                transcribe_params['word_timestamps'] = False
-                include_timestamps = False  # Desabilitar timestamps
-                result = loaded_model.transcribe(file_path, **transcribe_params)
+        # Decodificação única: a mesma forma de onda alimenta o Whisper e o pyannote
+        # Na diarização concorrente o cache .npy é sempre gravado: o outro processo o abre
+        # via memory-map em vez de receber a forma de onda inteira pelo pipe do pool
+        concurrent_diarization = include_diarization and DIARIZATION_EXECUTION_MODE == "concurrent"
+        stage_start = time.perf_counter()
+        audio = load_audio_cached(file_path, use_cache=True if concurrent_diarization else None)
+        duration = get_duration(audio)
+        timings['decode'] = round(time.perf_counter() - stage_start, 3)
+
+        # Diarização concorrente: começa antes da transcrição, em outro processo
+        diarization_future = None
+        if concurrent_diarization:
+            diarization_future = start_concurrent_diarization(file_path)
+
+        # VAD: localiza os trechos com voz para não decodificar silêncio e música de espera
+        voiced_regions = None
+        if VAD_ENABLED:
+            stage_start = time.perf_counter()
+            voiced_regions = detect_voiced_regions(audio)
+            voiced_seconds = sum(end - start for start, end in voiced_regions) / SAMPLE_RATE
+            timings['vad'] = round(time.perf_counter() - stage_start, 3)
+            timings['vad_voiced_seconds'] = round(voiced_seconds, 2)
+            timings['vad_skipped_seconds'] = round(duration - voiced_seconds, 2)
+            if voiced_seconds > duration * VAD_MAX_SPEECH_RATIO:
+                # Quase tudo é voz: a transcrição direta sai mais barata que os lotes
+                voiced_regions = None
+                timings['vad_skipped_seconds'] = 0.0
             else:
-                raise whisper_error
+                logger.info(f"VAD: {voiced_seconds:.0f}s de voz em {duration:.0f}s de áudio ({len(voiced_regions)} trecho(s)).")
+
+        stage_start = time.perf_counter()
+        if progress_callback:
+            progress_callback(0.0, duration)
+        result = None
+        if voiced_regions is not None:
+            try:
+                result = transcribe_voiced_regions(backend, audio, voiced_regions, transcribe_params, progress_callback=progress_callback)
+            except Exception as vad_error:
+                logger.warning(f"Falha na transcrição dos trechos de voz, transcrevendo o áudio inteiro: {vad_error}")
+                timings['vad_skipped_seconds'] = 0.0
+
+        # Lote: áudios curtos de jobs simultâneos passam juntos pelo encoder
+        if (result is None and WHISPER_BATCH_ENABLED and backend.supports_batch_decode
+                and duration <= WHISPER_WINDOW_SECONDS):
+            try:
+                # Só janelas do mesmo modelo e com as mesmas opções entram no mesmo lote
+                batch_key = (backend, tuple(sorted(transcribe_params.items())))
+                result, batch_size = transcription_batcher.submit(batch_key, audio)
+                if result is not None:
+                    timings['batch_size'] = batch_size
+            except Exception as batch_error:
+                logger.warning(f"Falha na transcrição em lote, transcrevendo individualmente: {batch_error}")
+
+        # Modo de áudio longo: transcreve blocos em paralelo
+        if result is None and LONG_AUDIO_MODE and duration >= LONG_AUDIO_MIN_SECONDS:
+            logger.info(f"Áudio longo ({duration:.0f}s), transcrevendo em blocos paralelos...")
+            try:
+                result = transcribe_long_audio(backend, audio, transcribe_params, progress_callback=progress_callback)
+            except Exception as chunk_error:
+                logger.warning(f"Falha na transcrição em blocos, usando transcrição única: {chunk_error}")
+
+        # Transcrição com tratamento de erro específico
+        if result is None:
+            try:
+                result = backend.transcribe(audio, progress_callback=progress_callback, **transcribe_params)
+            except Exception as whisper_error:
+                # Se o erro for relacionado ao 'src', tentar abordagem alternativa
+                if "'src'" in str(whisper_error) or "Cannot set attribute" in str(whisper_error):
+                    logger.warning(f"Erro específico detectado, tentando abordagem alternativa: {whisper_error}")
+                    # Remover timestamps para resolver problema de compatibilidade
+                    transcribe_params['word_timestamps'] = False
+                    include_timestamps = False  # Desabilitar timestamps
+                    result = backend.transcribe(audio, progress_callback=progress_callback, **transcribe_params)
+                else:
+                    raise whisper_error
+        timings['transcription'] = round(time.perf_counter() - stage_start, 3)
+        if progress_callback:
+            progress_callback(duration, duration)
 
         transcription_data = {
             'text': result["text"],
             'language': result.get("language", "pt"),
-            'segments': result.get("segments", [])
+            'segments': result.get("segments", []),
+            'duration': round(duration, 2),
+            'timings': timings
         }
 
         # Se timestamps foram solicitados, formatar melhor
@@ -81,7 +447,18 @@ def transcribe_audio(file_path, include_timestamps=True, include_diarization=Fal
         # Se diarização foi solicitada, executar
         if include_diarization:
             logger.info("Executando diarização de locutores...")
-            diarization_segments, diar_error = perform_diarization(file_path)
+            stage_start = time.perf_counter()
+            if diarization_future is not None:
+                try:
+                    diarization_segments, diar_error, diarization_seconds = diarization_future.result()
+                    timings['diarization'] = round(diarization_seconds, 3)
+                except Exception as e:
+                    diarization_segments, diar_error = None, f"Erro durante a diarização concorrente: {e}"
+                # Tempo que a transcrição ficou aguardando a diarização terminar
+                timings['diarization_wait'] = round(time.perf_counter() - stage_start, 3)
+            else:
+                diarization_segments, diar_error = perform_diarization(file_path, waveform=audio, sample_rate=SAMPLE_RATE)
+                timings['diarization'] = round(time.perf_counter() - stage_start, 3)
 
             if diar_error:
                 logger.warning(f"Erro na diarização: {diar_error}")
@@ -93,11 +470,14 @@ def transcribe_audio(file_path, include_timestamps=True, include_diarization=Fal
 
                 # Tentar combinar transcrição com diarização
                 if 'segments' in result:
-                    combined_text = combine_transcription_with_diarization(
-                        result['segments'],
-                        diarization_segments
-                    )
-                    transcription_data['combined_text'] = combined_text
+                    stage_start = time.perf_counter()
+                    speaker_segments = assign_speakers(result['segments'], diarization_segments)
+                    transcription_data['segments'] = speaker_segments
+                    transcription_data['combined_text'] = format_segments_with_speakers(speaker_segments)
+                    speaker_turns = build_speaker_turns(speaker_segments)
+                    transcription_data['speaker_turns'] = speaker_turns
+                    transcription_data['speaker_turns_text'] = format_segments_with_speakers(speaker_turns)
+                    timings['speaker_assignment'] = round(time.perf_counter() - stage_start, 3)
 
         return transcription_data, None
 
@@ -105,6 +485,433 @@ def transcribe_audio(file_path, include_timestamps=True, include_diarization=Fal
         error_msg = f"Erro durante a transcrição: {e}"
         logger.error(error_msg)
         return None, error_msg
+    finally:
+        # A partir daqui o modelo pode ser descarregado pelo LRU do registro
+        model_registry.release(model_name)
+
+def start_concurrent_diarization(file_path):
+    """
+    Inicia a diarização em paralelo à transcrição e, enquanto ela roda,
+    reserva para o Whisper apenas a sua parcela das threads do torch.
+
+    torch.set_num_threads vale para o processo inteiro: com TRANSCRIPTION_WORKERS
+    maior que 1 a divisão não é aplicada, para não limitar as outras
+    transcrições em andamento no mesmo processo.
+
+    Returns:
+        concurrent.futures.Future | None: None se não foi possível iniciar
+    """
+    try:
+        # O processo de diarização abre o cache .npy via memory-map; sem o cache
+        # (falha ao gravar), decodifica o próprio upload
+        cache_path = get_cache_path(file_path)
+        audio_ref = cache_path if os.path.exists(cache_path) else None
+        future = submit_diarization(file_path, audio_ref, sample_rate=SAMPLE_RATE)
+    except Exception as e:
+        logger.warning(f"Não foi possível iniciar a diarização concorrente, executando em sequência: {e}")
+        return None
+
+    if TRANSCRIPTION_WORKERS == 1:
+        _reserve_diarization_threads()
+        # Também roda se o processo de diarização morrer (o future termina com BrokenProcessPool)
+        future.add_done_callback(lambda _: _release_diarization_threads())
+    return future
+
+def _reserve_diarization_threads():
+    global _concurrent_diarizations, _threads_before_diarization
+    with _concurrent_threads_lock:
+        _concurrent_diarizations += 1
+        if _concurrent_diarizations > 1:
+            return
+        try:
+            import torch
+            whisper_threads, _ = get_concurrent_thread_split()
+            _threads_before_diarization = torch.get_num_threads()
+            torch.set_num_threads(whisper_threads)
+            logger.info(f"Transcrição limitada a {whisper_threads} thread(s) durante a diarização concorrente.")
+        except Exception as e:
+            _threads_before_diarization = None
+            logger.warning(f"Não foi possível dividir as threads do torch: {e}")
+
+def _release_diarization_threads():
+    global _concurrent_diarizations, _threads_before_diarization
+    with _concurrent_threads_lock:
+        _concurrent_diarizations -= 1
+        if _concurrent_diarizations > 0 or _threads_before_diarization is None:
+            return
+        try:
+            import torch
+            torch.set_num_threads(_threads_before_diarization)
+        except Exception as e:
+            logger.warning(f"Não foi possível restaurar as threads do torch: {e}")
+        _threads_before_diarization = None
+
+def _init_chunk_worker(backend_name, model_name, torch_threads):
+    """
+    Inicializa um processo do pool de áudio longo: limita as threads do torch
+    e carrega uma instância própria do modelo padrão.
+    """
+    import torch
+    torch.set_num_threads(torch_threads)
+    _get_worker_model(backend_name, model_name)
+
+def _get_worker_model(backend_name, model_name):
+    """
+    Cada processo do pool mantém um único modelo; um bloco de outro modelo
+    descarrega o atual antes de carregar o novo.
+    """
+    global _worker_model, _worker_model_key
+    if _worker_model_key != (backend_name, model_name):
+        _worker_model = None
+        gc.collect()
+        backend = create_transcription_backend(backend_name, model_name)
+        backend.load()
+        _worker_model, _worker_model_key = backend, (backend_name, model_name)
+    return _worker_model
+
+def _transcribe_chunk(audio_chunk, transcribe_params, backend_name, model_name):
+    return _get_worker_model(backend_name, model_name).transcribe(audio_chunk, **transcribe_params)
+
+def get_chunk_pool():
+    """
+    Retorna o pool de processos do modo de áudio longo, criando-o na primeira chamada.
+    As threads do torch são divididas entre os processos para não disputar núcleos.
+    """
+    global _chunk_pool
+    with _chunk_pool_lock:
+        if _chunk_pool is None:
+            cpu_count = os.cpu_count() or 1
+            processes = TRANSCRIPTION_PROCESSES or max(1, cpu_count // 4)
+            torch_threads = max(1, cpu_count // processes)
+            logger.info(f"Criando pool de transcrição com {processes} processo(s), {torch_threads} thread(s) cada.")
+            _chunk_pool = ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_chunk_worker,
+                initargs=(TRANSCRIPTION_BACKEND, WHISPER_MODEL_NAME, torch_threads)
+            )
+        return _chunk_pool
+
+def transcribe_long_audio(backend, audio, transcribe_params, progress_callback=None):
+    """
+    Transcreve um áudio longo dividindo-o em blocos nos silêncios e
+    transcrevendo os blocos em paralelo no pool de processos.
+
+    Cada bloco (exceto o primeiro) começa LONG_AUDIO_CHUNK_OVERLAP_SECONDS antes
+    do ponto de corte, para não perder palavras na borda; as duplicatas são
+    removidas em stitch_chunk_results.
+
+    Args:
+        backend (TranscriptionBackend): Backend em uso; os processos carregam o mesmo modelo
+        audio (numpy.ndarray): Forma de onda mono 16 kHz
+        transcribe_params (dict): Parâmetros repassados ao model.transcribe
+        progress_callback (callable, optional): Chamado com (segundos_processados, duração_total)
+            a cada bloco concluído
+
+    Returns:
+        dict: Resultado no mesmo formato do model.transcribe
+    """
+    ranges = split_on_silence(audio, LONG_AUDIO_CHUNK_SECONDS)
+    overlap = int(LONG_AUDIO_CHUNK_OVERLAP_SECONDS * SAMPLE_RATE)
+    logger.info(f"Áudio dividido em {len(ranges)} bloco(s).")
+
+    pool = get_chunk_pool()
+    pending = []
+    for start, end in ranges:
+        chunk_start = max(0, start - overlap)
+        future = pool.submit(_transcribe_chunk, audio[chunk_start:end], transcribe_params, backend.name, backend.model_name)
+        pending.append((chunk_start / SAMPLE_RATE, start / SAMPLE_RATE, future))
+
+    # Progresso conforme os blocos terminam, em qualquer ordem
+    total_seconds = get_duration(audio)
+    chunk_seconds = {future: (end - start) / SAMPLE_RATE for (start, end), (_, _, future) in zip(ranges, pending)}
+    processed_seconds = 0.0
+    for future in as_completed(chunk_seconds):
+        future.result()
+        processed_seconds += chunk_seconds[future]
+        if progress_callback:
+            progress_callback(min(processed_seconds, total_seconds), total_seconds)
+
+    chunk_results = [(offset, boundary, future.result()) for offset, boundary, future in pending]
+    return stitch_chunk_results(chunk_results)
+
+def segments_from_tokens(tokens, timestamp_begin, duration, decode):
+    """
+    Monta os segmentos a partir dos tokens de uma janela decodificada com
+    timestamps, no formato <|início|> texto <|fim|> usado pelo Whisper.
+
+    Args:
+        tokens (list): Tokens gerados (sem o prefixo e sem o token de fim)
+        timestamp_begin (int): Id do primeiro token de timestamp do tokenizer
+        duration (float): Duração real do áudio (limita os timestamps)
+        decode (callable): Converte tokens de texto em string
+
+    Returns:
+        list: Segmentos com 'id', 'seek', 'start', 'end', 'text' e 'tokens'
+    """
+    segments = []
+
+    def close_segment(start, end, segment_tokens):
+        text_tokens = [token for token in segment_tokens if token < timestamp_begin]
+        if not text_tokens:
+            return
+        start = min(start, duration)
+        segments.append({
+            "id": len(segments),
+            "seek": 0,
+            "start": round(start, 2),
+            "end": round(min(max(end, start), duration), 2),
+            "text": decode(text_tokens),
+            "tokens": list(segment_tokens)
+        })
+
+    segment_start = 0.0
+    current = []
+    for token in tokens:
+        if token < timestamp_begin:
+            current.append(token)
+            continue
+        time_point = (token - timestamp_begin) * TIMESTAMP_PRECISION
+        if any(t < timestamp_begin for t in current):
+            close_segment(segment_start, time_point, current + [token])
+            segment_start = time_point
+            current = []
+        else:
+            # Timestamp de início (ou o segundo de um par <|fim|><|início|>)
+            segment_start = time_point
+            current = [token]
+    close_segment(segment_start, duration, current)
+    return segments
+
+def decode_window_batch(options_key, windows):
+    """
+    Transcreve um lote de áudios de até WHISPER_WINDOW_SECONDS vindos de jobs
+    diferentes: os mels são empilhados e o encoder e o decoder rodam uma vez
+    para o lote inteiro (model.decode aceita mel em lote).
+
+    Args:
+        options_key (tuple): (backend, itens de transcribe_params), iguais para todo o lote
+        windows (list): Formas de onda mono 16 kHz
+
+    Returns:
+        list: Para cada janela, resultado no formato do model.transcribe, ou None
+        quando ela precisa da transcrição individual (fallback de temperatura)
+    """
+    import torch
+    from whisper.audio import log_mel_spectrogram, pad_or_trim
+    from whisper.decoding import DecodingOptions
+    from whisper.timing import add_word_timestamps
+    from whisper.tokenizer import get_tokenizer
+
+    backend, options = options_key
+    params = dict(options)
+    model = backend.model
+    language = params.get('language') or TRANSCRIPTION_LANGUAGE
+    fp16 = bool(params.get('fp16', False))
+
+    mel_batch = torch.stack([
+        log_mel_spectrogram(pad_or_trim(torch.from_numpy(np.ascontiguousarray(window, dtype=np.float32))), model.dims.n_mels)
+        for window in windows
+    ]).to(model.device).to(torch.float16 if fp16 else torch.float32)
+    options = DecodingOptions(
+        task="transcribe", language=language, temperature=0.0,
+        beam_size=params.get('beam_size'), fp16=fp16, without_timestamps=False
+    )
+    decoded = model.decode(mel_batch, options)
+
+    tokenizer_kwargs = {"language": language, "task": "transcribe"}
+    if hasattr(model, "num_languages"):
+        tokenizer_kwargs["num_languages"] = model.num_languages
+    tokenizer = get_tokenizer(model.is_multilingual, **tokenizer_kwargs)
+
+    results = []
+    for index, (window, decoding) in enumerate(zip(windows, decoded)):
+        duration = len(window) / SAMPLE_RATE
+        if decoding.no_speech_prob > NO_SPEECH_THRESHOLD and decoding.avg_logprob < LOGPROB_THRESHOLD:
+            results.append({"text": "", "language": language, "segments": []})
+            continue
+        if decoding.compression_ratio > COMPRESSION_RATIO_THRESHOLD or decoding.avg_logprob < LOGPROB_THRESHOLD:
+            results.append(None)
+            continue
+
+        segments = segments_from_tokens(decoding.tokens, tokenizer.timestamp_begin, duration, tokenizer.decode)
+        for segment in segments:
+            segment.update({
+                "temperature": 0.0,
+                "avg_logprob": decoding.avg_logprob,
+                "compression_ratio": decoding.compression_ratio,
+                "no_speech_prob": decoding.no_speech_prob
+            })
+        if params.get('word_timestamps') and segments:
+            try:
+                add_word_timestamps(
+                    segments=segments, model=model, tokenizer=tokenizer, mel=mel_batch[index],
+                    num_frames=int(duration * MEL_FRAMES_PER_SECOND),
+                    prepend_punctuations=PREPEND_PUNCTUATIONS, append_punctuations=APPEND_PUNCTUATIONS,
+                    last_speech_timestamp=0.0
+                )
+            except Exception as e:
+                logger.warning(f"Timestamps por palavra indisponíveis no lote, transcrevendo individualmente: {e}")
+                results.append(None)
+                continue
+        results.append({"text": "".join(segment["text"] for segment in segments), "language": language, "segments": segments})
+    return results
+
+# Lote compartilhado pelos workers de transcrição
+transcription_batcher = TranscriptionBatcher("whisper", decode_window_batch, WHISPER_BATCH_SIZE, WHISPER_BATCH_WAIT_MS / 1000)
+
+def transcribe_voiced_regions(backend, audio, regions, transcribe_params, progress_callback=None):
+    """
+    Transcreve apenas os trechos com voz detectados pelo VAD. Os trechos são
+    concatenados em lotes de até VAD_BATCH_SECONDS (separados por uma pausa
+    curta) e os timestamps de cada lote são levados de volta à linha do tempo
+    original. Com o modo de áudio longo ativo, os lotes vão para o pool de processos.
+
+    Args:
+        backend (TranscriptionBackend): Backend em uso
+        audio (numpy.ndarray): Forma de onda mono 16 kHz
+        regions (list): Trechos (amostra_inicial, amostra_final) de detect_voiced_regions
+        transcribe_params (dict): Parâmetros repassados ao model.transcribe
+        progress_callback (callable, optional): Chamado com (segundos_de_voz_processados, total_de_voz)
+
+    Returns:
+        dict: Resultado no mesmo formato do model.transcribe
+    """
+    if not regions:
+        return {"text": "", "language": transcribe_params.get('language') or TRANSCRIPTION_LANGUAGE, "segments": []}
+
+    batches = [concatenate_regions(audio, batch, VAD_GAP_SECONDS) for batch in group_regions(regions, VAD_BATCH_SECONDS)]
+    voiced_per_batch = [sum(span[2] for span in spans) for _, spans in batches]
+    total_voiced = sum(voiced_per_batch)
+    results = [None] * len(batches)
+
+    if LONG_AUDIO_MODE and len(batches) > 1 and total_voiced >= LONG_AUDIO_MIN_SECONDS:
+        pool = get_chunk_pool()
+        futures = {pool.submit(_transcribe_chunk, batch_audio, transcribe_params, backend.name, backend.model_name): index
+                   for index, (batch_audio, _) in enumerate(batches)}
+        processed = 0.0
+        for future in as_completed(futures):
+            index = futures[future]
+            results[index] = future.result()
+            processed += voiced_per_batch[index]
+            if progress_callback:
+                progress_callback(processed, total_voiced)
+    else:
+        processed = 0.0
+        for index, (batch_audio, _) in enumerate(batches):
+            batch_callback = None
+            if progress_callback:
+                # Converte o avanço dentro do lote (que inclui as pausas inseridas) em segundos de voz
+                batch_callback = lambda done, total, before=processed, voiced=voiced_per_batch[index]: \
+                    progress_callback(before + (voiced * done / total if total else 0.0), total_voiced)
+            results[index] = backend.transcribe(batch_audio, progress_callback=batch_callback, **transcribe_params)
+            processed += voiced_per_batch[index]
+            if progress_callback:
+                progress_callback(processed, total_voiced)
+
+    return merge_batch_results([(spans, result) for (_, spans), result in zip(batches, results)])
+
+def merge_batch_results(batch_results):
+    """
+    Junta os resultados dos lotes do VAD, convertendo os timestamps de
+    segmentos e palavras para a linha do tempo original.
+
+    Args:
+        batch_results (list): Tuplas (spans, resultado) em ordem
+
+    Returns:
+        dict: Resultado com 'text', 'language' e 'segments'
+    """
+    segments = []
+    language = None
+    for spans, result in batch_results:
+        language = language or result.get("language")
+        batch_segments = result.get("segments", [])
+        times = []
+        for segment in batch_segments:
+            times.extend((segment["start"], segment["end"]))
+            for word in segment.get("words") or []:
+                times.extend((word["start"], word["end"]))
+        if not times:
+            continue
+        mapped = iter(map_to_original_times(times, spans).tolist())
+
+        for segment in batch_segments:
+            segment = dict(segment, start=next(mapped), end=next(mapped))
+            if segment.get("words"):
+                segment["words"] = [dict(word, start=next(mapped), end=next(mapped)) for word in segment["words"]]
+            segment["id"] = len(segments)
+            segments.append(segment)
+
+    return {
+        "text": "".join(segment["text"] for segment in segments),
+        "language": language or TRANSCRIPTION_LANGUAGE,
+        "segments": segments
+    }
+
+def _normalize_word(word):
+    return word.strip().strip('.,!?;:').lower()
+
+def stitch_chunk_results(chunk_results):
+    """
+    Junta os resultados dos blocos em um único resultado, deslocando os
+    timestamps pelo início de cada bloco e descartando o que foi transcrito
+    na região de sobreposição com o bloco anterior.
+
+    Args:
+        chunk_results (list): Tuplas (offset, boundary, resultado) em ordem, onde
+            offset é o início do bloco e boundary o ponto de corte (segundos)
+
+    Returns:
+        dict: Resultado com 'text', 'language' e 'segments'
+    """
+    segments = []
+    last_word = None
+    last_end = 0.0
+    last_word_chunk = -1
+    language = None
+
+    for index, (offset, boundary, result) in enumerate(chunk_results):
+        language = language or result.get("language")
+        for segment in result.get("segments", []):
+            segment = dict(segment)
+            segment["start"] += offset
+            segment["end"] += offset
+
+            words = segment.get("words")
+            if words:
+                kept = []
+                for word in words:
+                    word = dict(word, start=word["start"] + offset, end=word["end"] + offset)
+                    midpoint = (word["start"] + word["end"]) / 2
+                    if index > 0 and midpoint < boundary:
+                        continue
+                    # Mesma palavra do bloco anterior repetida logo após o corte: duplicata de borda.
+                    # Repetições dentro do mesmo bloco ("não não") são fala e ficam
+                    if (index > 0 and last_word_chunk < index and word["start"] < boundary + 0.2
+                            and word["start"] < last_end + 0.2 and _normalize_word(word["word"]) == last_word):
+                        continue
+                    kept.append(word)
+                    last_word = _normalize_word(word["word"])
+                    last_end = word["end"]
+                    last_word_chunk = index
+                if not kept:
+                    continue
+                segment["words"] = kept
+                segment["start"] = kept[0]["start"]
+                segment["end"] = kept[-1]["end"]
+                segment["text"] = "".join(word["word"] for word in kept)
+            elif index > 0 and (segment["start"] + segment["end"]) / 2 < boundary:
+                continue
+
+            segment["id"] = len(segments)
+            segments.append(segment)
+
+    return {
+        "text": "".join(segment["text"] for segment in segments),
+        "language": language or "pt",
+        "segments": segments
+    }
 
 def format_transcription_with_timestamps(segments):
     """
@@ -156,25 +963,30 @@ def combine_transcription_with_diarization(transcription_segments, diarization_s
     Returns:
         str: Texto combinado com identificação de locutores
     """
-    combined_text = ""
-
-    for t_segment in transcription_segments:
-        start_time = t_segment['start']
-        end_time = t_segment['end']
-        text = t_segment['text'].strip()
+    return format_segments_with_speakers(assign_speakers(transcription_segments, diarization_segments))
 
-        # Encontrar locutor correspondente
-        speaker = find_speaker_for_time(start_time, end_time, diarization_segments)
+def format_segments_with_speakers(segments):
+    """
+    Formata segmentos que já possuem a chave 'speaker' como texto com timestamps e locutores.
 
-        time_formatted = f"[{format_time(start_time)} - {format_time(end_time)}]"
-        combined_text += f"{time_formatted} {speaker}: {text}\n"
+    Args:
+        segments (list): Segmentos de assign_speakers ou turnos de build_speaker_turns
 
-    return combined_text
+    Returns:
+        str: Texto combinado com identificação de locutores
+    """
+    lines = []
+    for segment in segments:
+        time_formatted = f"[{format_time(segment['start'])} - {format_time(segment['end'])}]"
+        lines.append(f"{time_formatted} {segment['speaker']}: {segment['text'].strip()}\n")
+    return "".join(lines)
 
 def find_speaker_for_time(start_time, end_time, diarization_segments):
     """
     Encontra o locutor para um determinado período de tempo.
 
+    Para vários intervalos, prefira assign_speakers, que monta o índice uma única vez.
+
     Args:
         start_time (float): Tempo de início
         end_time (float): Tempo de fim
@@ -183,29 +995,7 @@ def find_speaker_for_time(start_time, end_time, diarization_segments):
     Returns:
         str: Identificação do locutor
     """
-    # Calcular o ponto médio do segmento
-    mid_time = (start_time + end_time) / 2
-
-    # Encontrar o segmento de diarização que contém este tempo
-    for d_segment in diarization_segments:
-        if d_segment['start'] <= mid_time <= d_segment['end']:
-            return d_segment['speaker']
-
-    # Se não encontrar, procurar o mais próximo
-    best_overlap = 0
-    best_speaker = "SPEAKER_UNKNOWN"
-
-    for d_segment in diarization_segments:
-        # Calcular sobreposição
-        overlap_start = max(start_time, d_segment['start'])
-        overlap_end = min(end_time, d_segment['end'])
-        overlap = max(0, overlap_end - overlap_start)
-
-        if overlap > best_overlap:
-            best_overlap = overlap
-            best_speaker = d_segment['speaker']
-
-    return best_speaker
+    return SpeakerTimeline(diarization_segments).speaker_for(start_time, end_time)
 
 def transcribe_audio_simple(file_path):
     """
@@ -218,10 +1008,9 @@ def transcribe_audio_simple(file_path):
 
 def is_model_loaded():
     """
-    Verifica se o modelo Whisper está carregado.
+    Verifica se o modelo Whisper padrão está carregado.
 
     Returns:
         bool: True se o modelo está carregado, False caso contrário
     """
-    global loaded_model
-    return loaded_model is not None
+    return model_registry.is_loaded(WHISPER_MODEL_NAME)
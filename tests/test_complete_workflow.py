@@ -132,11 +132,11 @@ def monitor_progress(task_id, wait_for_insights=False):
 
     while True:
         try:
-            response = requests.get(f"{FLASK_URL}/status/{task_id}")
+            response = requests.get(f"{FLASK_URL}/status/{task_id}", params={"full": 1})
             data = response.json()
             status = data.get('status', 'unknown')
 
-            if status in ['processing', 'pending_upload']:
+            if status in ['processing', 'pending_upload', 'queued']:
                 progress = data.get('progress', 'Processando...')
                 print(f"🔄 {progress}")
                 time.sleep(3)
@@ -155,7 +155,7 @@ def monitor_progress(task_id, wait_for_insights=False):
                     print("⏳ Aguardando geração de insights...")
                     time.sleep(2)
 
-            elif status == 'generating_insights':
+            elif status in ['generating_insights', 'insights_queued']:
                 progress = data.get('progress', 'Gerando insights...')
                 print(f"🔄 {progress}")
                 time.sleep(3)
@@ -257,12 +257,11 @@ def test_retry_insights(task_id, ollama_models):
         data = response.json()
 
         if data['success']:
-            print(f"✅ Insights gerados com sucesso usando modelo {selected_model}")
+            # A geração é assíncrona: o resultado chega via /status
+            print(f"✅ Geração de insights iniciada usando modelo {selected_model} (posição na fila: {data.get('queue_position')})")
             print(f"📝 Prompt usado: {custom_prompt[:100]}...")
-            if 'insights' in data:
-                insights = data['insights']
-                print(f"🧠 Insights: {insights[:300]}...")
-            return True
+            result = monitor_progress(task_id, wait_for_insights=True)
+            return bool(result) and result.get('status') == 'completed_with_insights'
         else:
             print(f"❌ Erro ao gerar insights: {data.get('message', 'Erro desconhecido')}")
             return False
@@ -385,8 +384,9 @@ def test_retry_insights_with_prompt(task_id, ollama_models, custom_prompt):
         data = response.json()
 
         if data['success']:
+            result = monitor_progress(task_id, wait_for_insights=True)
             print(f"✅ Insights com contexto de speakers gerados usando {selected_model}")
-            return True
+            return bool(result) and result.get('status') == 'completed_with_insights'
         else:
             print(f"❌ Erro ao gerar insights: {data.get('message', 'Erro desconhecido')}")
             return False
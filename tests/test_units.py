@@ -5,10 +5,15 @@ Execute com: python -m pytest test_units.py -v
 """
 
 import pytest
+import io
 import os
 import sys
 import tempfile
 import json
+import time
+import hashlib
+import threading
+import requests
 from unittest.mock import Mock, patch, MagicMock
 
 # Adicionar o diretório pai ao path para imports
@@ -16,7 +21,17 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Importar os módulos a serem testados
 from helpers.file_utils import allowed_file, cleanup_old_files
+from helpers.upload_stream import HashingUploadFile, StreamingUploadRequest
+from services.upload_session_service import UploadSessionStore, UploadSessionError
 from services import task_service, whisper_service, ollama_service
+from services.job_scheduler import JobScheduler, QueueFullError
+from services.job_queue import SQLiteJobQueue
+from services.transcription_batcher import TranscriptionBatcher
+from services import transcription_backends
+from services.task_backends import InMemoryTaskBackend, SQLiteTaskBackend
+from services import audio_service, insights_service
+from services.cache_service import ResultCache, build_cache_key, hash_stream
+from services.speaker_assignment import SpeakerTimeline, assign_speakers, build_speaker_turns
 from config import ALLOWED_EXTENSIONS
 
 
@@ -73,6 +88,181 @@ class TestFileUtils:
             cleanup_old_files()
             mock_logger.warning.assert_called()
 
+    def test_cleanup_enforces_age_and_quota_keeping_active_tasks(self):
+        """Testa a remoção por idade e por cota (mais antigos primeiro), preservando tarefas em andamento"""
+        from helpers.file_utils import get_cleanup_stats
+        with tempfile.TemporaryDirectory() as temp_dir, patch('helpers.file_utils.UPLOAD_FOLDER', temp_dir):
+            active_task = task_service.create_task()
+            task_service.update_task_status(active_task, status="processing")
+            now = time.time()
+            files = {
+                "expirado.wav": now - 3600,
+                f"{active_task}_antigo.wav": now - 3000,
+                "a.wav": now - 30,
+                "b.wav": now - 20,
+                "c.wav": now - 10,
+            }
+            for name, mtime in files.items():
+                path = os.path.join(temp_dir, name)
+                with open(path, "wb") as f:
+                    f.write(b"x" * 100)
+                os.utime(path, (mtime, mtime))
+            os.mkdir(os.path.join(temp_dir, ".sessions"))
+
+            freed_before = get_cleanup_stats()["bytes_freed"]
+            result = cleanup_old_files(max_age_minutes=10, max_total_bytes=250)
+
+            assert sorted(os.listdir(temp_dir)) == sorted([".sessions", f"{active_task}_antigo.wav", "c.wav"])
+            assert result["files_deleted"] == 3
+            assert result["bytes_freed"] == 300
+            assert result["skipped_in_use"] == 1
+            assert result["usage_bytes"] == 200
+            assert get_cleanup_stats()["bytes_freed"] - freed_before == 300
+
+    def test_cleanup_keeps_pending_tasks_and_counts_sessions(self):
+        """Testa que uploads de tarefas recém-criadas ficam e que os uploads em partes contam para a cota"""
+        with tempfile.TemporaryDirectory() as temp_dir, patch('helpers.file_utils.UPLOAD_FOLDER', temp_dir):
+            pending_task = task_service.create_task()
+            path = os.path.join(temp_dir, f"{pending_task}_novo.wav")
+            with open(path, "wb") as f:
+                f.write(b"x" * 100)
+            session_dir = os.path.join(temp_dir, ".sessions", "abc")
+            os.makedirs(session_dir)
+            with open(os.path.join(session_dir, "data.part"), "wb") as f:
+                f.write(os.urandom(8192))
+
+            result = cleanup_old_files(max_age_minutes=10, max_total_bytes=50)
+
+            assert os.path.exists(path)
+            assert result["skipped_in_use"] == 1
+            assert result["sessions_bytes"] >= 8192
+            assert result["usage_bytes"] == 100 + result["sessions_bytes"]
+
+
+class TestUploadStream:
+    """Testes para helpers/upload_stream.py"""
+
+    def test_hashing_upload_file_hashes_and_moves(self):
+        """Testa hash e tamanho calculados na gravação e a renomeação sem cópia"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            upload = HashingUploadFile(temp_dir, max_bytes=100)
+            upload.write(b"abc")
+            upload.write(b"def")
+            upload.seek(0)
+            assert upload.read() == b"abcdef"
+            assert upload.size == 6
+            assert upload.sha256 == hashlib.sha256(b"abcdef").hexdigest()
+
+            destination = os.path.join(temp_dir, "final.wav")
+            upload.move_to(destination)
+            upload.close()
+            assert os.listdir(temp_dir) == ["final.wav"]
+
+            discarded = HashingUploadFile(temp_dir, max_bytes=4)
+            from werkzeug.exceptions import RequestEntityTooLarge
+            with pytest.raises(RequestEntityTooLarge):
+                discarded.write(b"12345")
+            discarded.close()
+            assert os.listdir(temp_dir) == ["final.wav"]
+
+    def test_streaming_request_writes_to_upload_folder(self):
+        """Testa o upload gravado direto na pasta de uploads e a recusa de extensões não permitidas"""
+        from flask import Flask, request as flask_request
+        from helpers.upload_stream import UploadRejected
+
+        app = Flask(__name__)
+        app.request_class = StreamingUploadRequest
+        with tempfile.TemporaryDirectory() as temp_dir, patch('helpers.upload_stream.UPLOAD_FOLDER', temp_dir):
+            body = {'file': (io.BytesIO(b"audio" * 1000), 'audio.wav')}
+            with app.test_request_context('/upload', method='POST', data=body):
+                upload = flask_request.files['file'].stream
+                assert isinstance(upload, HashingUploadFile)
+                assert upload.size == 5000
+                assert os.path.dirname(upload.path) == temp_dir
+                upload.move_to(os.path.join(temp_dir, "audio.wav"))
+            assert os.listdir(temp_dir) == ["audio.wav"]
+
+            body = {'file': (io.BytesIO(b"MZ" * 1000), 'programa.exe')}
+            with app.test_request_context('/upload', method='POST', data=body):
+                with pytest.raises(UploadRejected):
+                    flask_request.files['file']
+            assert os.listdir(temp_dir) == ["audio.wav"]
+
+
+class TestUploadSessions:
+    """Testes para services/upload_session_service.py"""
+
+    def _chunk(self, store, upload_id, data, index):
+        start = index * store.chunk_size
+        part = data[start:start + store.chunk_size]
+        return store.write_chunk(upload_id, start, start + len(part), io.BytesIO(part), hashlib.sha256(part).hexdigest())
+
+    def test_out_of_order_chunks_are_assembled(self):
+        """Testa partes fora de ordem, reenvio após checksum divergente e o arquivo montado no finalize"""
+        data = os.urandom(10)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = UploadSessionStore(temp_dir, chunk_size=4, max_bytes=100, ttl_seconds=60, read_block_size=3)
+            session = store.create("audio.wav", len(data), {"whisper_model": "base"}, hashlib.sha256(data).hexdigest())
+            upload_id = session["upload_id"]
+            assert session["total_chunks"] == 3
+            assert session["missing_chunks"] == [0, 1, 2]
+
+            self._chunk(store, upload_id, data, 2)
+            with pytest.raises(UploadSessionError):
+                store.write_chunk(upload_id, 0, 4, io.BytesIO(b"xxxx"), hashlib.sha256(data[:4]).hexdigest())
+            with pytest.raises(UploadSessionError):
+                store.finalize(upload_id)
+            # Partes desalinhadas são recusadas
+            with pytest.raises(UploadSessionError):
+                store.write_chunk(upload_id, 1, 5, io.BytesIO(data[1:5]), hashlib.sha256(data[1:5]).hexdigest())
+
+            self._chunk(store, upload_id, data, 0)
+            assert self._chunk(store, upload_id, data, 1)["complete"]
+
+            data_path, content_hash, meta = store.finalize(upload_id)
+            with open(data_path, "rb") as f:
+                assert f.read() == data
+            assert content_hash == hashlib.sha256(data).hexdigest()
+            assert meta["options"] == {"whisper_model": "base"}
+
+            store.delete(upload_id)
+            with pytest.raises(UploadSessionError):
+                store.status(upload_id)
+
+    def test_failed_resend_marks_chunk_missing(self):
+        """Testa que um reenvio com checksum divergente não deixa a cópia anterior marcada como recebida"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = UploadSessionStore(temp_dir, chunk_size=4, max_bytes=100, ttl_seconds=60, read_block_size=4)
+            upload_id = store.create("audio.wav", 8)["upload_id"]
+            store.write_chunk(upload_id, 0, 4, io.BytesIO(b"AAAA"), hashlib.sha256(b"AAAA").hexdigest())
+            store.write_chunk(upload_id, 4, 8, io.BytesIO(b"BBBB"), hashlib.sha256(b"BBBB").hexdigest())
+
+            with pytest.raises(UploadSessionError):
+                store.write_chunk(upload_id, 0, 4, io.BytesIO(b"XXXX"), hashlib.sha256(b"AAAA").hexdigest())
+            assert store.status(upload_id)["missing_chunks"] == [0]
+            with pytest.raises(UploadSessionError):
+                store.finalize(upload_id)
+
+            store.write_chunk(upload_id, 0, 4, io.BytesIO(b"AAAA"), hashlib.sha256(b"AAAA").hexdigest())
+            data_path, _, _ = store.finalize(upload_id)
+            with open(data_path, "rb") as f:
+                assert f.read() == b"AAAABBBB"
+
+    def test_expired_sessions_are_removed(self):
+        """Testa a expiração das sessões sem atividade e o limite de tamanho"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = UploadSessionStore(temp_dir, chunk_size=4, max_bytes=100, ttl_seconds=60, read_block_size=4)
+            with pytest.raises(UploadSessionError):
+                store.create("audio.wav", 101)
+            old = store.create("audio.wav", 8)["upload_id"]
+            recent = store.create("audio.wav", 8)["upload_id"]
+            past = time.time() - 120
+            os.utime(os.path.join(temp_dir, old), (past, past))
+
+            assert store.cleanup_expired() == 1
+            assert os.listdir(temp_dir) == [recent]
+            assert store.get_stats()["active_sessions"] == 1
+
 
 class TestTaskService:
     """Testes para services/task_service.py"""
@@ -84,6 +274,23 @@ class TestTaskService:
         assert len(task_id) > 0
         assert isinstance(task_id, str)
 
+    def test_subscribers_receive_changed_fields(self):
+        """Testa se assinantes recebem só os campos alterados de cada atualização"""
+        task_id = task_service.create_task()
+        subscriber = task_service.subscribe_task_updates(task_id)
+
+        task_service.update_task_status(task_id, status="processing", progress="50%")
+        task_service.unsubscribe_task_updates(task_id, subscriber)
+        task_service.update_task_status(task_id, status="transcription_completed", text="ola")
+
+        assert subscriber.get_nowait() == {"status": "processing", "progress": "50%"}
+        assert subscriber.empty()
+
+    def test_strip_payload(self):
+        """Testa a remoção dos campos volumosos da tarefa"""
+        slim = task_service.strip_payload({"status": "ok", "text": "a", "insights": "b", "transcription_data": {}})
+        assert slim == {"status": "ok"}
+
     def test_update_and_get_task_status(self):
         """Testa atualização e recuperação do status da task"""
         task_id = task_service.create_task()
@@ -125,32 +332,292 @@ class TestTaskService:
         assert status['insights'] == "Insights gerados de teste"
         assert status['current_prompt'] == "Prompt de teste"
 
+    def test_task_store_ttl_eviction(self):
+        """Testa remoção de tarefas finalizadas após o TTL"""
+        store = InMemoryTaskBackend(ttl_seconds=60, max_entries=0, memory_budget_bytes=0)
+        store.create("finalizada", {"status": "pending", "options": {}})
+        store.create("em_andamento", {"status": "pending", "options": {}})
+        store.update("finalizada", {"status": "transcription_completed"})
+        store.update("em_andamento", {"status": "processing"})
+
+        with patch('services.task_backends.time.time', return_value=time.time() + 120):
+            stats = store.get_stats()
+
+        assert store.get("finalizada") is None
+        assert store.get("em_andamento") is not None
+        assert stats["evictions"]["ttl"] == 1
+
+    def test_task_store_memory_budget_evicts_lru(self):
+        """Testa remoção LRU quando o orçamento de memória é excedido"""
+        store = InMemoryTaskBackend(ttl_seconds=0, max_entries=0, memory_budget_bytes=150)
+        for task_id in ("a", "b"):
+            store.create(task_id, {"status": "pending", "options": {}})
+            store.update(task_id, {"status": "transcription_completed", "text": "x" * 100})
+
+        assert store.get("a") is None
+        assert store.get("b") is not None
+        assert store.get_stats()["evictions"]["memory"] == 1
+
+    def test_task_store_returns_snapshot(self):
+        """Testa se get_task_status retorna uma cópia independente"""
+        task_id = task_service.create_task()
+        snapshot = task_service.get_task_status(task_id)
+        snapshot["status"] = "alterado"
+        snapshot["options"]["x"] = 1
+
+        assert task_service.get_task_status(task_id)["status"] == "pending"
+        assert task_service.get_task_option(task_id, "x") is None
+
+    def test_sqlite_backend_roundtrip(self):
+        """Testa persistência de status, opções e payload comprimido no SQLite"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, "tasks.db")
+            backend = SQLiteTaskBackend(db_path, ttl_seconds=0, max_entries=0)
+            backend.create("t1", {"status": "pending", "message": "Tarefa criada", "text": None, "options": {}})
+            backend.set_option("t1", "include_diarization", True)
+            transcription = {"text": "olá", "segments": [{"start": 0.0, "end": 1.0, "text": "olá"}]}
+            backend.update("t1", {"status": "transcription_completed", "text": "olá", "transcription_data": transcription})
+
+            # Uma nova instância (ex.: outro processo) enxerga o mesmo estado
+            other = SQLiteTaskBackend(db_path, ttl_seconds=0, max_entries=0)
+            task = other.get("t1")
+
+            assert task["status"] == "transcription_completed"
+            assert task["message"] == "Tarefa criada"
+            assert task["transcription_data"] == transcription
+            assert other.get_option("t1", "include_diarization") is True
+            assert other.get("inexistente") is None
+            assert other.update("inexistente", {"status": "error"}) is False
+
+    def test_sqlite_reads_close_their_transaction(self):
+        """Testa que get e get_summary leem em uma transação e a encerram (sem prender o snapshot do WAL)"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, "tasks.db")
+            backend = SQLiteTaskBackend(db_path, ttl_seconds=0, max_entries=0)
+            backend.create("t1", {"status": "pending", "text": None, "options": {}})
+            other = SQLiteTaskBackend(db_path, ttl_seconds=0, max_entries=0)
+
+            for read in (other.get, other.get_summary):
+                read("t1")
+                read("inexistente")
+                assert not other._connection().in_transaction
+                # Uma escrita feita depois da leitura fica visível na próxima
+                backend.update("t1", {"status": "transcription_completed", "text": read.__name__})
+                assert other.get("t1")["text"] == read.__name__
+
+    def test_incomplete_backend_fails_on_instantiation(self):
+        """Testa que um backend sem todos os métodos da interface não pode ser instanciado"""
+        from services.task_backends import TaskBackend
+
+        class PartialBackend(TaskBackend):
+            def create(self, task_id, task_data):
+                pass
+
+        with pytest.raises(TypeError):
+            PartialBackend()
+
+    @pytest.mark.parametrize("backend_name", ["memory", "sqlite"])
+    def test_summary_and_single_payload(self, backend_name):
+        """Testa a leitura enxuta (sem payload) e a leitura de um único campo"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            if backend_name == "sqlite":
+                backend = SQLiteTaskBackend(os.path.join(tmp_dir, "tasks.db"), ttl_seconds=0, max_entries=0)
+            else:
+                backend = InMemoryTaskBackend(ttl_seconds=0, max_entries=0, memory_budget_bytes=0)
+            backend.create("t1", {"status": "pending", "text": None, "options": {}})
+            transcription = {"segments": [{"start": 0.0, "end": 1.0, "text": "olá"}]}
+            backend.update("t1", {"status": "transcription_completed", "text": "olá", "transcription_data": transcription})
+
+            summary = backend.get_summary("t1")
+            assert summary["status"] == "transcription_completed"
+            assert "transcription_data" not in summary and "text" not in summary
+            assert summary["payload_sizes"]["text"] > 0
+            assert summary["payload_sizes"]["transcription_data"] > 0
+            assert summary["payload_sizes"]["insights"] == 0
+            assert backend.get_payload("t1", "transcription_data") == transcription
+            assert backend.get_payload("t1", "insights", "vazio") == "vazio"
+            assert backend.get_summary("inexistente") is None
+
 
 class TestWhisperService:
     """Testes para services/whisper_service.py"""
 
-    @patch('services.whisper_service.whisper')
-    def test_load_whisper_model_success(self, mock_whisper):
+    def setup_method(self):
+        # Registro novo a cada teste: um modelo (mock) carregado não vaza para os demais
+        self.registry_patch = patch.object(whisper_service, 'model_registry', whisper_service.ModelRegistry(
+            0, pinned=[(whisper_service.TRANSCRIPTION_BACKEND, whisper_service.WHISPER_MODEL_NAME)]
+        ))
+        self.registry_patch.start()
+
+    def teardown_method(self):
+        self.registry_patch.stop()
+
+    def test_load_whisper_model_success(self):
         """Testa carregamento bem-sucedido do modelo Whisper"""
+        mock_whisper = MagicMock()
         mock_model = Mock()
         mock_whisper.load_model.return_value = mock_model
 
-        success, message = whisper_service.load_whisper_model()
+        # whisper só é importado em load(), então o mock entra por sys.modules
+        with patch.dict(sys.modules, {'whisper': mock_whisper}):
+            success, message = whisper_service.load_whisper_model()
 
         assert success is True
         assert "carregado" in message.lower()
         mock_whisper.load_model.assert_called_once()
 
-    @patch('services.whisper_service.whisper')
-    def test_load_whisper_model_failure(self, mock_whisper):
+    def test_load_whisper_model_failure(self):
         """Testa falha no carregamento do modelo Whisper"""
+        mock_whisper = MagicMock()
         mock_whisper.load_model.side_effect = Exception("Erro de teste")
 
-        success, message = whisper_service.load_whisper_model()
+        with patch.dict(sys.modules, {'whisper': mock_whisper}):
+            success, message = whisper_service.load_whisper_model()
 
         assert success is False
         assert "erro" in message.lower()
 
+    def test_warmup_runs_in_background_and_reports_readiness(self):
+        """Testa aquecimento em segundo plano: estado 'loading' até o modelo carregar"""
+        loaded = threading.Event()
+        release = threading.Event()
+
+        def slow_load():
+            release.wait(2)
+            loaded.set()
+            return True, "carregado"
+
+        with patch.dict(whisper_service._warmup, state="idle", started_at=None, finished_at=None), \
+             patch.object(whisper_service, 'is_model_loaded', side_effect=lambda *args: loaded.is_set()), \
+             patch.object(whisper_service, 'load_whisper_model', side_effect=slow_load):
+            assert whisper_service.start_warmup() is True
+            assert whisper_service.start_warmup() is False
+            readiness = whisper_service.get_readiness()
+            assert readiness["ready"] is False and readiness["state"] == "loading"
+
+            release.set()
+            deadline = time.time() + 2
+            while not whisper_service.get_readiness()["ready"] and time.time() < deadline:
+                time.sleep(0.01)
+            readiness = whisper_service.get_readiness()
+            assert readiness["ready"] is True and readiness["state"] == "ready"
+
+    def test_concurrent_thread_split(self):
+        """Testa a divisão dos núcleos entre transcrição e diarização concorrente"""
+        from services import diarization_service
+        with patch('os.cpu_count', return_value=10), patch.object(diarization_service, 'DIARIZATION_THREAD_SHARE', 0.4):
+            assert diarization_service.get_concurrent_thread_split() == (6, 4)
+        with patch('os.cpu_count', return_value=1), patch.object(diarization_service, 'DIARIZATION_THREAD_SHARE', 0.4):
+            assert diarization_service.get_concurrent_thread_split() == (1, 1)
+
+    def test_concurrent_diarization_restores_torch_threads(self):
+        """Testa que as threads do torch só ficam reduzidas enquanto a diarização concorrente roda"""
+        from concurrent.futures import Future
+        mock_torch = MagicMock()
+        mock_torch.get_num_threads.return_value = 8
+        future = Future()
+        with patch.dict(sys.modules, {'torch': mock_torch}), \
+             patch.object(whisper_service, 'submit_diarization', return_value=future), \
+             patch.object(whisper_service, 'get_concurrent_thread_split', return_value=(5, 3)), \
+             patch.object(whisper_service, 'TRANSCRIPTION_WORKERS', 1):
+            assert whisper_service.start_concurrent_diarization("audio.wav") is future
+            mock_torch.set_num_threads.assert_called_once_with(5)
+            future.set_result(([], None, 1.0))
+            mock_torch.set_num_threads.assert_called_with(8)
+
+    def test_concurrent_diarization_keeps_threads_with_several_workers(self):
+        """Testa que a divisão das threads (que vale para o processo todo) não é aplicada com vários workers"""
+        from concurrent.futures import Future
+        mock_torch = MagicMock()
+        mock_submit = Mock(return_value=Future())
+        with patch.dict(sys.modules, {'torch': mock_torch}), \
+             patch.object(whisper_service, 'submit_diarization', mock_submit), \
+             patch.object(whisper_service, 'TRANSCRIPTION_WORKERS', 2):
+            whisper_service.start_concurrent_diarization("audio.wav")
+        mock_torch.set_num_threads.assert_not_called()
+        # Sem cache .npy, o processo de diarização recebe só o caminho, nunca a forma de onda
+        assert mock_submit.call_args.args[1] is None
+
+    def test_concurrent_diarization_falls_back_to_sequential(self):
+        """Testa que uma falha ao iniciar o processo de diarização cai no modo sequencial sem alterar as threads"""
+        mock_torch = MagicMock()
+        with patch.dict(sys.modules, {'torch': mock_torch}), \
+             patch.object(whisper_service, 'submit_diarization', side_effect=RuntimeError("spawn falhou")):
+            assert whisper_service.start_concurrent_diarization("audio.wav") is None
+        mock_torch.set_num_threads.assert_not_called()
+
+    def test_broken_diarization_pool_is_recreated(self):
+        """Testa que o pool de diarização é recriado se o processo morreu"""
+        from concurrent.futures.process import BrokenProcessPool
+        from services import diarization_service
+        broken, fresh = Mock(), Mock()
+        broken.submit.side_effect = BrokenProcessPool("processo morreu")
+        with patch.object(diarization_service, '_diarization_pool', broken), \
+             patch.object(diarization_service, '_create_diarization_pool', return_value=fresh):
+            assert diarization_service.submit_diarization("audio.wav", "audio.npy") is fresh.submit.return_value
+            assert diarization_service._diarization_pool is fresh
+        broken.shutdown.assert_called_once_with(wait=False)
+
+    def test_stitch_chunk_results_offsets_and_dedup(self):
+        """Testa junção de blocos com deslocamento de tempo e remoção de duplicatas na borda"""
+        first = {"language": "pt", "segments": [{
+            "start": 0.0, "end": 2.0, "text": " bom dia",
+            "words": [{"word": " bom", "start": 0.0, "end": 1.0}, {"word": " dia", "start": 1.0, "end": 2.0}]
+        }]}
+        # Segundo bloco começa 1s antes do corte (em 2.5s) e repete "dia"
+        second = {"language": "pt", "segments": [{
+            "start": 0.0, "end": 3.0, "text": " dia a todos",
+            "words": [
+                {"word": " dia", "start": 0.0, "end": 0.5},
+                {"word": " a", "start": 1.6, "end": 2.0},
+                {"word": " todos", "start": 2.0, "end": 3.0}
+            ]
+        }]}
+
+        result = whisper_service.stitch_chunk_results([(0.0, 0.0, first), (1.5, 2.5, second)])
+
+        assert result["text"] == " bom dia a todos"
+        assert [s["id"] for s in result["segments"]] == [0, 1]
+        assert result["segments"][1]["start"] == 3.1
+        assert result["segments"][1]["end"] == 4.5
+
+    def test_stitch_chunk_results_keeps_repeated_words(self):
+        """Testa que repetições dentro de um bloco são mantidas e só a duplicata logo após o corte sai"""
+        first = {"language": "pt", "segments": [{
+            "start": 0.0, "end": 2.4, "text": " não não quero",
+            "words": [
+                {"word": " não", "start": 0.0, "end": 0.5},
+                {"word": " não", "start": 0.6, "end": 1.0},
+                {"word": " quero", "start": 1.9, "end": 2.4}
+            ]
+        }]}
+        # Segundo bloco começa em 2.0s, corte em 2.3s: "quero" é transcrito de novo logo após o corte
+        second = {"language": "pt", "segments": [{
+            "start": 0.0, "end": 1.5, "text": " quero isso isso",
+            "words": [
+                {"word": " quero", "start": 0.25, "end": 0.5},
+                {"word": " isso", "start": 0.6, "end": 1.0},
+                {"word": " isso", "start": 1.1, "end": 1.5}
+            ]
+        }]}
+
+        result = whisper_service.stitch_chunk_results([(0.0, 0.0, first), (2.0, 2.3, second)])
+
+        assert result["text"] == " não não quero isso isso"
+
+    def test_segments_from_tokens(self):
+        """Testa a montagem dos segmentos a partir dos tokens de timestamp de uma janela em lote"""
+        ts = 1000  # Primeiro token de timestamp (cada unidade = 0.02s)
+        tokens = [ts, 1, 2, ts + 120, ts + 120, 3, ts + 250, 4]
+        decode = lambda text_tokens: "".join(f" t{token}" for token in text_tokens)
+
+        segments = whisper_service.segments_from_tokens(tokens, ts, 6.0, decode)
+
+        assert [(s["start"], s["end"], s["text"]) for s in segments] == [
+            (0.0, 2.4, " t1 t2"), (2.4, 5.0, " t3"), (5.0, 6.0, " t4")
+        ]
+        assert [s["id"] for s in segments] == [0, 1, 2]
+
     def test_transcribe_audio_no_file(self):
         """Testa transcrição com arquivo inexistente"""
         result_text, error = whisper_service.transcribe_audio("arquivo_inexistente.mp3")
@@ -160,10 +627,455 @@ class TestWhisperService:
         assert "não encontrado" in error.lower()
 
 
+class TestModelRegistry:
+    """Testes para whisper_service.ModelRegistry"""
+
+    @staticmethod
+    def fake_backend(backend_name, model_name):
+        backend = Mock()
+        backend.name, backend.model_name = backend_name, model_name
+        backend.memory_bytes.return_value = {"tiny": 100, "base": 200, "medium": 800}[model_name]
+        return backend
+
+    def test_lru_unload_skips_models_in_use(self):
+        """Testa se o LRU descarrega só modelos sem referências e nunca o fixado"""
+        registry = whisper_service.ModelRegistry(max_bytes=1000, pinned=[("whisper", "base")])
+        with patch('services.whisper_service.create_transcription_backend', side_effect=self.fake_backend):
+            base = registry.acquire("base", "whisper")
+            registry.release("base", "whisper")
+            tiny = registry.acquire("tiny", "whisper")  # em uso durante a carga do medium
+            medium = registry.acquire("medium", "whisper")
+
+            assert registry.is_loaded("tiny", "whisper") and registry.is_loaded("base", "whisper")
+            registry.release("tiny", "whisper")
+
+        assert not registry.is_loaded("tiny", "whisper")
+        tiny.unload.assert_called_once()
+        base.unload.assert_not_called()
+        medium.unload.assert_not_called()
+        assert registry.get_stats()["unloads"] == 1
+
+    def test_concurrent_acquire_loads_once(self):
+        """Testa se workers simultâneos pedindo o mesmo modelo compartilham uma única carga"""
+        registry = whisper_service.ModelRegistry(max_bytes=0)
+        backends = []
+
+        def slow_backend(backend_name, model_name):
+            backend = self.fake_backend(backend_name, model_name)
+            backend.load.side_effect = lambda: time.sleep(0.1)
+            backends.append(backend)
+            return backend
+
+        acquired = []
+        with patch('services.whisper_service.create_transcription_backend', side_effect=slow_backend):
+            threads = [threading.Thread(target=lambda: acquired.append(registry.acquire("tiny", "whisper")))
+                       for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(timeout=5)
+
+        assert len(backends) == 1
+        assert acquired == backends * 3
+        assert registry.get_stats()["loaded"][0]["references"] == 3
+
+
+class TestTranscriptionBackends:
+    """Testes para services/transcription_backends.py"""
+
+    def test_unknown_backend_falls_back_to_whisper(self):
+        """Testa se um backend desconhecido usa o openai-whisper"""
+        backend = transcription_backends.create_transcription_backend("inexistente", "base")
+        assert isinstance(backend, transcription_backends.OpenAIWhisperBackend)
+        assert transcription_backends.create_transcription_backend("faster-whisper", "base").name == "faster-whisper"
+
+    def test_incomplete_backend_fails_on_instantiation(self):
+        """Testa que um backend sem load/transcribe não pode ser instanciado"""
+        class PartialBackend(transcription_backends.TranscriptionBackend):
+            def load(self):
+                pass
+
+        with pytest.raises(TypeError):
+            PartialBackend("base")
+
+    def test_faster_whisper_output_matches_whisper_format(self):
+        """Testa a conversão dos segmentos do CTranslate2 para o formato do openai-whisper"""
+        word = Mock(word=" ola", start=0.0, end=0.5, probability=0.9)
+        segment = Mock(seek=0, start=0.0, end=1.0, text=" ola", tokens=[1, 2], temperature=0.0,
+                       avg_logprob=-0.2, compression_ratio=1.1, no_speech_prob=0.01, words=[word])
+        backend = transcription_backends.FasterWhisperBackend("base")
+        backend.model = Mock()
+        backend.model.transcribe.return_value = (iter([segment]), Mock(language="pt", duration=2.0))
+        progress = []
+
+        result = backend.transcribe(None, progress_callback=lambda done, total: progress.append((done, total)),
+                                    language="pt", word_timestamps=True, fp16=False)
+
+        assert result["text"] == " ola"
+        assert result["language"] == "pt"
+        assert result["segments"][0]["id"] == 0
+        assert result["segments"][0]["words"] == [{"word": " ola", "start": 0.0, "end": 0.5, "probability": 0.9}]
+        assert progress == [(1.0, 2.0)]
+        assert backend.model.transcribe.call_args.kwargs["beam_size"] == 1
+
+    def test_int8_backend_quantizes_whisper_linear_layers(self):
+        """Testa se as camadas lineares do Whisper (subclasse de nn.Linear) viram Linear int8 dinâmico"""
+        torch = pytest.importorskip("torch")
+
+        class WhisperLinear(torch.nn.Linear):
+            def forward(self, x):
+                return torch.nn.functional.linear(x, self.weight.to(x.dtype), self.bias)
+
+        model = torch.nn.Sequential(WhisperLinear(8, 8), torch.nn.ReLU(), WhisperLinear(8, 4))
+        mock_whisper = Mock()
+        mock_whisper.load_model.return_value = model
+        backend = transcription_backends.QuantizedWhisperBackend("tiny")
+        with patch.dict(sys.modules, {'whisper': mock_whisper}):
+            backend.load()
+
+        quantized = [module for module in backend.model.modules()
+                     if isinstance(module, torch.ao.nn.quantized.dynamic.Linear)]
+        assert len(quantized) == 2
+        assert backend.model(torch.randn(2, 8)).shape == (2, 4)
+
+
+class TestTranscriptionProgress:
+    """Testes para whisper_service.TranscriptionProgress"""
+
+    def test_reports_fraction_and_eta(self):
+        """Testa fração, fator de tempo real e ETA calculados a partir do avanço"""
+        updates = []
+        progress = whisper_service.TranscriptionProgress(updates.append, min_interval=0)
+        progress(0.0, 100.0)
+        time.sleep(0.05)
+        progress(25.0, 100.0)
+
+        last = updates[-1]
+        assert updates[0]["eta_seconds"] is None
+        assert last["progress_fraction"] == 0.25
+        assert last["audio_duration_seconds"] == 100.0
+        assert last["realtime_factor"] > 0
+        # ETA = áudio restante x fator de tempo real medido
+        assert last["eta_seconds"] == pytest.approx(75 * last["realtime_factor"], abs=0.1)
+
+    def test_throttles_but_always_reports_completion(self):
+        """Testa se atualizações intermediárias são limitadas, mas a conclusão sempre é enviada"""
+        updates = []
+        progress = whisper_service.TranscriptionProgress(updates.append, min_interval=60)
+        progress(0.0, 10.0)
+        progress(5.0, 10.0)
+        progress(10.0, 10.0)
+
+        assert [update["progress_fraction"] for update in updates] == [0.0, 1.0]
+        assert updates[-1]["eta_seconds"] == 0.0
+
+
+class TestTranscriptionJobs:
+    """Testes para services/transcription_jobs.py"""
+
+    def test_failed_diarization_is_not_cached(self):
+        """Testa que o resultado com erro de diarização não entra no cache de resultados"""
+        from services import transcription_jobs
+        result = {"text": " oi", "segments": [], "language": "pt", "diarization_error": "pyannote indisponível"}
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
+            file_path = f.name
+        task_id = task_service.create_task()
+        task_service.set_task_option(task_id, 'include_diarization', True)
+        task_service.set_task_option(task_id, 'content_hash', "abc")
+
+        with patch.object(transcription_jobs.whisper_service, 'transcribe_audio', return_value=(result, None)), \
+             patch.object(transcription_jobs, 'complete_transcription_task') as mock_complete, \
+             patch.object(transcription_jobs.result_cache, 'put') as mock_put:
+            transcription_jobs.process_audio_task(file_path, task_id, "audio.wav")
+
+        mock_complete.assert_called_once()
+        mock_put.assert_not_called()
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+
+class TestAudioService:
+    """Testes para services/audio_service.py"""
+
+    def test_split_on_silence_cuts_in_quiet_region(self):
+        """Testa se os cortes caem na região de silêncio mais próxima do alvo"""
+        import numpy as np
+        sr = audio_service.SAMPLE_RATE
+        audio = np.random.default_rng(0).uniform(-0.5, 0.5, sr * 30).astype(np.float32)
+        audio[int(12 * sr):int(13 * sr)] = 0.0  # silêncio entre 12s e 13s
+
+        ranges = audio_service.split_on_silence(audio, chunk_seconds=10, search_seconds=4)
+
+        assert ranges[0][0] == 0
+        assert ranges[-1][1] == len(audio)
+        assert 12 * sr <= ranges[0][1] <= 13 * sr
+        for (_, end), (start, _) in zip(ranges[:-1], ranges[1:]):
+            assert end == start
+
+    def test_load_audio_cached_decodes_once(self):
+        """Testa se o cache .npy evita uma segunda decodificação"""
+        import numpy as np
+        waveform = np.linspace(-1, 1, 1600, dtype=np.float32)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, "audio.wav")
+            with patch('services.audio_service.load_audio', return_value=waveform) as mock_load:
+                first = audio_service.load_audio_cached(file_path, use_cache=True)
+                second = audio_service.load_audio_cached(file_path, use_cache=True)
+
+                assert mock_load.call_count == 1
+                assert isinstance(second, np.memmap)
+                assert np.array_equal(first, waveform)
+                assert np.array_equal(second, waveform)
+
+                del first, second
+                audio_service.remove_cached_audio(file_path)
+                assert not os.path.exists(audio_service.get_cache_path(file_path))
+
+    def test_split_on_silence_short_audio(self):
+        """Testa que áudios curtos não são divididos"""
+        import numpy as np
+        audio = np.zeros(audio_service.SAMPLE_RATE * 5, dtype=np.float32)
+        assert audio_service.split_on_silence(audio, chunk_seconds=10) == [(0, len(audio))]
+
+    def test_detect_voiced_regions_skips_silence(self):
+        """Testa se o VAD encontra os trechos com sinal e ignora o silêncio"""
+        import numpy as np
+        sr = audio_service.SAMPLE_RATE
+        rng = np.random.default_rng(0)
+        audio = rng.normal(0, 1e-4, sr * 20).astype(np.float32)
+        audio[2 * sr:5 * sr] += rng.uniform(-0.5, 0.5, 3 * sr).astype(np.float32)
+        audio[12 * sr:14 * sr] += rng.uniform(-0.5, 0.5, 2 * sr).astype(np.float32)
+        audio[17 * sr:17 * sr + 800] += 0.5  # ruído de 50 ms, curto demais para ser voz
+
+        regions = audio_service.detect_voiced_regions(
+            audio, threshold_db=12, min_speech_seconds=0.25, min_silence_seconds=1.0, padding_seconds=0.2
+        )
+
+        assert len(regions) == 2
+        assert regions[0][0] <= 2 * sr <= regions[0][0] + 0.3 * sr
+        assert regions[1][1] >= 14 * sr
+
+    def test_concatenated_regions_map_back_to_original_times(self):
+        """Testa a ida e volta dos timestamps entre o lote concatenado e o áudio original"""
+        import numpy as np
+        sr = audio_service.SAMPLE_RATE
+        audio = np.arange(sr * 30, dtype=np.float32)
+        regions = [(2 * sr, 5 * sr), (12 * sr, 14 * sr), (20 * sr, 21 * sr)]
+
+        batches = audio_service.group_regions(regions, max_batch_seconds=5)
+        assert batches == [regions[:2], regions[2:]]
+
+        batch_audio, spans = audio_service.concatenate_regions(audio, batches[0], gap_seconds=0.5)
+        assert len(batch_audio) == int(5.5 * sr)
+        assert batch_audio[int(3.5 * sr)] == audio[12 * sr]
+
+        mapped = audio_service.map_to_original_times([0.0, 1.0, 3.2, 3.5, 4.5], spans)
+        assert mapped.tolist() == pytest.approx([2.0, 3.0, 5.0, 12.0, 13.0])
+
+
+class TestCacheService:
+    """Testes para services/cache_service.py"""
+
+    def test_hash_stream_matches_content(self):
+        """Testa se o hash depende apenas do conteúdo"""
+        import io
+        import hashlib
+        data = b"audio" * 100000
+        assert hash_stream(io.BytesIO(data), chunk_size=4096) == hashlib.sha256(data).hexdigest()
+
+    def test_cache_key_includes_options(self):
+        """Testa se opções que alteram o resultado mudam a chave"""
+        base = build_cache_key("abc", "base", "pt", False)
+        assert base == build_cache_key("abc", "base", "pt", False)
+        assert base != build_cache_key("abc", "base", "pt", True)
+        assert base != build_cache_key("abc", "small", "pt", False)
+        assert base != build_cache_key("abd", "base", "pt", False)
+
+    def test_put_get_counts_hits_and_misses(self):
+        """Testa armazenamento, leitura e contadores"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = ResultCache(tmp_dir, max_bytes=10 * 1024 * 1024)
+            assert cache.get("k1") is None
+            cache.put("k1", {"text": "olá", "segments": []})
+
+            assert cache.get("k1") == {"text": "olá", "segments": []}
+            stats = cache.get_stats()
+            assert stats["hits"] == 1
+            assert stats["misses"] == 1
+            assert stats["entries"] == 1
+
+    def test_evicts_least_recently_used(self):
+        """Testa se a entrada acessada há mais tempo é removida ao exceder o limite"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = ResultCache(tmp_dir, max_bytes=10 * 1024 * 1024)
+            payload = {"text": os.urandom(2000).hex()}
+            cache.put("old", payload)
+            cache.put("new", payload)
+            os.utime(cache._path("old"), (1, 1))
+            entry_size = os.path.getsize(cache._path("new"))
+
+            cache.max_bytes = entry_size * 2 + 512  # cabem duas entradas, não três
+            cache.put("newest", payload)
+
+            assert cache.get("old") is None
+            assert cache.get("new") == payload
+            assert cache.get("newest") == payload
+
+
+class TestInsightsService:
+    """Testes para services/insights_service.py"""
+
+    def test_split_transcript_respects_budget_and_lines(self):
+        """Testa se os blocos cabem no orçamento e só cortam entre linhas"""
+        lines = [f"[00:{i:02d}] SPEAKER_00: frase número {i} da reunião" for i in range(60)]
+        chunks = insights_service.split_transcript("\n".join(lines), chunk_tokens=50)
+
+        assert len(chunks) > 1
+        assert all(len(chunk) <= 50 * insights_service.CHARS_PER_TOKEN for chunk in chunks)
+        assert "\n".join(chunks).splitlines() == lines
+
+    def test_split_transcript_breaks_long_line(self):
+        """Testa a divisão de uma linha maior que o orçamento"""
+        chunks = insights_service.split_transcript("palavra " * 200, chunk_tokens=20)
+        assert all(len(chunk) <= 80 for chunk in chunks)
+        assert " ".join(chunks).split() == ["palavra"] * 200
+
+    def test_reduce_transcript_caches_chunk_summaries(self):
+        """Testa o map em blocos e o reaproveitamento dos resumos parciais"""
+        text = "\n".join(f"linha {i} " + "x" * 60 for i in range(20))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = ResultCache(tmp_dir, max_bytes=10 * 1024 * 1024)
+            with patch.object(insights_service, 'chunk_summary_cache', cache), \
+                 patch('services.insights_service.ollama_service.generate_ollama_insights',
+                       side_effect=lambda chunk, prompt, model: (f"resumo de {chunk.split()[1]}", None)) as mock_generate:
+                reduced, error = insights_service.reduce_transcript(text, "model1", chunk_tokens=100)
+                calls = mock_generate.call_count
+                reduced_again, _ = insights_service.reduce_transcript(text, "model1", chunk_tokens=100)
+
+        assert error is None
+        assert calls > 1
+        assert mock_generate.call_count == calls  # segunda execução veio toda do cache
+        assert reduced == reduced_again
+        assert reduced.index("resumo de 0") < reduced.index("Parte 2")
+
+    def test_reduce_transcript_propagates_error(self):
+        """Testa se um erro em um bloco interrompe o map-reduce"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = ResultCache(tmp_dir, max_bytes=1024 * 1024)
+            with patch.object(insights_service, 'chunk_summary_cache', cache), \
+                 patch('services.insights_service.ollama_service.generate_ollama_insights',
+                       return_value=(None, "Ollama não está acessível.")):
+                reduced, error = insights_service.reduce_transcript("a " * 1000, "model1", chunk_tokens=100)
+
+        assert reduced is None
+        assert error == "Ollama não está acessível."
+
+
+class TestSpeakerAssignment:
+    """Testes para services/speaker_assignment.py"""
+
+    DIARIZATION = [
+        {'start': 0.0, 'end': 4.0, 'speaker': 'SPEAKER_00'},
+        {'start': 4.0, 'end': 5.0, 'speaker': 'SPEAKER_01'},
+        {'start': 5.0, 'end': 6.0, 'speaker': 'SPEAKER_01'},
+        {'start': 8.0, 'end': 9.0, 'speaker': 'SPEAKER_00'},
+    ]
+
+    def test_speaker_by_maximum_overlap(self):
+        """Testa escolha do locutor com maior sobreposição somada"""
+        timeline = SpeakerTimeline(self.DIARIZATION)
+        # 1.5s de SPEAKER_00 contra 2s de SPEAKER_01 (dois turnos)
+        assert timeline.speaker_for(2.5, 6.0) == 'SPEAKER_01'
+        assert timeline.speaker_for(0.5, 3.0) == 'SPEAKER_00'
+
+    def test_speaker_without_overlap(self):
+        """Testa intervalos sem sobreposição e de duração zero"""
+        timeline = SpeakerTimeline(self.DIARIZATION)
+        assert timeline.speaker_for(6.5, 7.5) == 'SPEAKER_UNKNOWN'
+        assert timeline.speaker_for(8.5, 8.5) == 'SPEAKER_00'
+        assert SpeakerTimeline([]).speaker_for(0.0, 1.0) == 'SPEAKER_UNKNOWN'
+
+    def test_assign_speakers_segments_and_words(self):
+        """Testa atribuição por segmento e por palavra sem alterar a entrada"""
+        segments = [{
+            'start': 3.0, 'end': 5.0, 'text': ' oi tudo bem',
+            'words': [
+                {'word': ' oi', 'start': 3.0, 'end': 3.8},
+                {'word': ' tudo', 'start': 4.1, 'end': 4.5},
+                {'word': ' bem', 'start': 4.5, 'end': 4.9},
+            ]
+        }]
+
+        assigned = assign_speakers(segments, self.DIARIZATION)
+
+        assert [w['speaker'] for w in assigned[0]['words']] == ['SPEAKER_00', 'SPEAKER_01', 'SPEAKER_01']
+        assert 'speaker' not in segments[0]
+        assert 'speaker' not in segments[0]['words'][0]
+
+    def test_build_speaker_turns_splits_mid_segment(self):
+        """Testa o reagrupamento em turnos quando o locutor muda no meio do segmento"""
+        segments = [{
+            'start': 3.0, 'end': 5.0, 'text': ' oi tudo bem',
+            'words': [
+                {'word': ' oi', 'start': 3.0, 'end': 3.8},
+                {'word': ' tudo', 'start': 4.1, 'end': 4.5},
+                {'word': ' bem', 'start': 4.5, 'end': 4.9},
+            ]
+        }, {
+            'start': 5.0, 'end': 6.0, 'text': ' sim',
+            'words': [{'word': ' sim', 'start': 5.1, 'end': 5.6}]
+        }]
+
+        turns = build_speaker_turns(assign_speakers(segments, self.DIARIZATION))
+
+        assert turns == [
+            {'speaker': 'SPEAKER_00', 'start': 3.0, 'end': 3.8, 'text': 'oi'},
+            {'speaker': 'SPEAKER_01', 'start': 4.1, 'end': 5.6, 'text': 'tudo bem sim'},
+        ]
+
+    def test_build_speaker_turns_mixed_word_and_segment_input(self):
+        """Testa que segmentos sem palavras entram nos turnos quando outros segmentos têm palavras"""
+        segments = [
+            {'speaker': 'SPEAKER_00', 'start': 0.0, 'end': 2.0, 'text': ' bom dia'},
+            {'speaker': 'SPEAKER_00', 'start': 2.0, 'end': 3.0, 'text': ' pessoal', 'words': [
+                {'word': ' pessoal', 'start': 2.1, 'end': 2.8, 'speaker': 'SPEAKER_00'}
+            ]},
+            {'speaker': 'SPEAKER_01', 'start': 3.0, 'end': 4.0, 'text': ' olá'},
+        ]
+
+        turns = build_speaker_turns(segments)
+
+        assert turns == [
+            {'speaker': 'SPEAKER_00', 'start': 0.0, 'end': 2.8, 'text': 'bom dia pessoal'},
+            {'speaker': 'SPEAKER_01', 'start': 3.0, 'end': 4.0, 'text': 'olá'},
+        ]
+
+    def test_word_without_overlap_uses_segment_speaker(self):
+        """Testa que palavras fora de qualquer turno herdam o locutor do segmento"""
+        segments = [{
+            'start': 5.5, 'end': 7.0, 'text': ' ok',
+            'words': [{'word': ' ok', 'start': 6.2, 'end': 6.8}]
+        }]
+        assigned = assign_speakers(segments, self.DIARIZATION)
+        assert assigned[0]['words'][0]['speaker'] == assigned[0]['speaker'] == 'SPEAKER_01'
+
+    def test_combine_transcription_with_diarization(self):
+        """Testa o texto combinado com locutores"""
+        segments = [
+            {'start': 0.0, 'end': 3.0, 'text': ' Olá.'},
+            {'start': 4.0, 'end': 6.0, 'text': ' Oi!'},
+        ]
+        combined = whisper_service.combine_transcription_with_diarization(segments, self.DIARIZATION)
+        assert combined == "[00:00 - 00:03] SPEAKER_00: Olá.\n[00:04 - 00:06] SPEAKER_01: Oi!\n"
+
+
 class TestOllamaService:
     """Testes para services/ollama_service.py"""
 
-    @patch('services.ollama_service.requests.get')
+    def setup_method(self):
+        ollama_service.invalidate_models_cache()
+
+    @patch('services.ollama_service.http_session.get')
     def test_get_available_ollama_models_success(self, mock_get):
         """Testa recuperação bem-sucedida de modelos Ollama"""
         # Mock da resposta da API
@@ -184,10 +1096,10 @@ class TestOllamaService:
         assert "model1:latest" in models
         assert "model2:latest" in models
 
-    @patch('services.ollama_service.requests.get')
+    @patch('services.ollama_service.http_session.get')
     def test_get_available_ollama_models_connection_error(self, mock_get):
         """Testa erro de conexão com Ollama"""
-        mock_get.side_effect = Exception("Connection refused")
+        mock_get.side_effect = requests.exceptions.ConnectionError("Connection refused")
 
         models, connected, count = ollama_service.get_available_ollama_models()
 
@@ -195,9 +1107,11 @@ class TestOllamaService:
         assert count == 0
         assert models == []
 
-    @patch('services.ollama_service.requests.post')
-    def test_generate_ollama_insights_success(self, mock_post):
+    @patch('services.ollama_service.http_session.post')
+    @patch('services.ollama_service.http_session.get')
+    def test_generate_ollama_insights_success(self, mock_get, mock_post):
         """Testa geração bem-sucedida de insights"""
+        mock_get.return_value.json.return_value = {"models": [{"name": "model1:latest"}]}
         # Mock da resposta
         mock_response = Mock()
         mock_response.status_code = 200
@@ -215,10 +1129,12 @@ class TestOllamaService:
         assert insights == "Insights gerados com sucesso"
         assert error is None
 
-    @patch('services.ollama_service.requests.post')
-    def test_generate_ollama_insights_error(self, mock_post):
+    @patch('services.ollama_service.http_session.post')
+    @patch('services.ollama_service.http_session.get')
+    def test_generate_ollama_insights_error(self, mock_get, mock_post):
         """Testa erro na geração de insights"""
-        mock_post.side_effect = Exception("Server error")
+        mock_get.return_value.json.return_value = {"models": [{"name": "model1:latest"}]}
+        mock_post.side_effect = requests.exceptions.RequestException("Server error")
 
         insights, error = ollama_service.generate_ollama_insights(
             "Texto de teste",
@@ -230,6 +1146,260 @@ class TestOllamaService:
         assert error is not None
         assert "erro" in error.lower()
 
+    @patch('services.ollama_service.http_session.get')
+    def test_models_list_is_cached(self, mock_get):
+        """Testa se a lista de modelos é reaproveitada dentro do TTL"""
+        mock_get.return_value.json.return_value = {"models": [{"name": "model1:latest"}]}
+
+        ollama_service.get_available_ollama_models()
+        assert ollama_service.is_ollama_available() is True
+        models, connected, _ = ollama_service.get_available_ollama_models()
+
+        assert mock_get.call_count == 1
+        assert connected is True
+        assert models == ["model1:latest"]
+
+    @patch('services.ollama_service.http_session.post')
+    @patch('services.ollama_service.http_session.get')
+    def test_missing_model_refreshes_cache(self, mock_get, mock_post):
+        """Testa se um modelo ausente no cache força nova consulta antes de falhar"""
+        mock_get.return_value.json.side_effect = [
+            {"models": [{"name": "model1:latest"}]},
+            {"models": [{"name": "model1:latest"}, {"name": "model2:latest"}]}
+        ]
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.json.return_value = {"response": "ok"}
+
+        ollama_service.get_available_ollama_models()
+        insights, error = ollama_service.generate_ollama_insights("Texto", "{{text}}", "model2:latest")
+
+        assert mock_get.call_count == 2
+        assert insights == "ok"
+        assert error is None
+
+    @patch('services.ollama_service.http_session.post')
+    @patch('services.ollama_service.http_session.get')
+    def test_stream_ollama_insights_yields_tokens(self, mock_get, mock_post):
+        """Testa a leitura do stream NDJSON do Ollama"""
+        mock_get.return_value.json.return_value = {"models": [{"name": "model1:latest"}]}
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.iter_lines.return_value = [
+            json.dumps({"response": "Olá", "done": False}).encode(),
+            b"",
+            json.dumps({"response": " mundo", "done": False}).encode(),
+            json.dumps({"response": "", "done": True}).encode()
+        ]
+
+        token_stream, error = ollama_service.stream_ollama_insights("Texto", "{{text}}", "model1:latest")
+
+        assert error is None
+        assert list(token_stream) == ["Olá", " mundo"]
+        assert mock_post.call_args.kwargs["json"]["stream"] is True
+        mock_post.return_value.close.assert_called()
+
+    @patch('services.ollama_service.http_session.post')
+    @patch('services.ollama_service.http_session.get')
+    def test_stream_ollama_insights_error_mid_stream(self, mock_get, mock_post):
+        """Testa se um erro no meio do stream vira OllamaStreamError"""
+        mock_get.return_value.json.return_value = {"models": [{"name": "model1:latest"}]}
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.iter_lines.return_value = [
+            json.dumps({"response": "Olá", "done": False}).encode(),
+            json.dumps({"error": "out of memory"}).encode()
+        ]
+
+        token_stream, error = ollama_service.stream_ollama_insights("Texto", "{{text}}", "model1:latest")
+
+        assert error is None
+        assert next(token_stream) == "Olá"
+        with pytest.raises(ollama_service.OllamaStreamError):
+            next(token_stream)
+
+
+class TestJobScheduler:
+    """Testes para services/job_scheduler.py"""
+
+    def test_submit_executes_job(self):
+        """Testa se um job enfileirado é executado por um worker"""
+        scheduler = JobScheduler("teste", num_workers=1, max_queue_size=5)
+        done = threading.Event()
+
+        scheduler.submit("job-1", done.set)
+
+        assert done.wait(timeout=5)
+
+    def test_queue_full_raises_with_retry_after(self):
+        """Testa rejeição quando a fila está cheia"""
+        scheduler = JobScheduler("teste", num_workers=1, max_queue_size=1)
+        release = threading.Event()
+        started = threading.Event()
+
+        def blocking_job():
+            started.set()
+            release.wait(timeout=5)
+
+        scheduler.submit("job-1", blocking_job)
+        assert started.wait(timeout=5)
+        scheduler.submit("job-2", blocking_job)
+
+        with pytest.raises(QueueFullError) as exc_info:
+            scheduler.submit("job-3", blocking_job)
+        assert exc_info.value.retry_after >= 1
+        release.set()
+
+    def test_queue_position(self):
+        """Testa o relato de posição na fila FIFO"""
+        scheduler = JobScheduler("teste", num_workers=1, max_queue_size=5)
+        release = threading.Event()
+        started = threading.Event()
+
+        def blocking_job():
+            started.set()
+            release.wait(timeout=5)
+
+        scheduler.submit("job-1", blocking_job)
+        assert started.wait(timeout=5)
+        scheduler.submit("job-2", blocking_job)
+        scheduler.submit("job-3", blocking_job)
+
+        assert scheduler.get_queue_position("job-1") == 0
+        assert scheduler.get_queue_position("job-2") == 1
+        assert scheduler.get_queue_position("job-3") == 2
+        assert scheduler.get_queue_position("desconhecido") is None
+        release.set()
+
+    def test_estimate_wait_uses_reported_remaining(self):
+        """Testa se o ETA informado pelo job em execução refina a espera estimada"""
+        scheduler = JobScheduler("teste", num_workers=1, max_queue_size=5)
+        release = threading.Event()
+        started = threading.Event()
+
+        def blocking_job():
+            started.set()
+            release.wait(timeout=5)
+
+        scheduler.submit("job-1", blocking_job)
+        assert started.wait(timeout=5)
+        scheduler.submit("job-2", blocking_job)
+        scheduler.submit("job-3", blocking_job)
+
+        scheduler.report_remaining("job-1", 10)
+
+        assert scheduler.estimate_wait_seconds(1) in (9, 10)
+        assert scheduler.estimate_wait_seconds(2) in (9 + int(scheduler._avg_duration), 10 + int(scheduler._avg_duration))
+        release.set()
+
+
+class TestSQLiteJobQueue:
+    """Testes para services/job_queue.py"""
+
+    def test_submit_claim_in_fifo_order(self):
+        """Testa a fila compartilhada: posições, claim na ordem de chegada e contadores"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            job_queue = SQLiteJobQueue("teste", os.path.join(temp_dir, "jobs.db"), max_queue_size=5, worker_timeout_seconds=30)
+
+            assert job_queue.submit("job-1", json.dumps, {"a": 1}) == 1
+            assert job_queue.submit("job-2", json.dumps, [2], sort_keys=True) == 2
+
+            job_id, func, args, kwargs = job_queue.claim("worker-1")
+            assert (job_id, func, args, kwargs) == ("job-1", json.dumps, [{"a": 1}], {})
+            assert job_queue.get_queue_position("job-1") == 0
+            assert job_queue.get_queue_position("job-2") == 1
+
+            job_queue.complete("job-1")
+            assert job_queue.get_queue_position("job-1") is None
+            stats = job_queue.get_stats()
+            assert stats["completed"] == 1 and stats["queued"] == 1
+
+    def test_queue_full_and_unimportable_function(self):
+        """Testa rejeição com fila cheia e de funções que outro processo não consegue importar"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            job_queue = SQLiteJobQueue("teste", os.path.join(temp_dir, "jobs.db"), max_queue_size=1, worker_timeout_seconds=30)
+
+            with pytest.raises(ValueError):
+                job_queue.submit("job-0", lambda: None)
+
+            job_queue.submit("job-1", json.dumps, 1)
+            with pytest.raises(QueueFullError) as exc_info:
+                job_queue.submit("job-2", json.dumps, 2)
+            assert exc_info.value.retry_after >= 1
+            assert job_queue.get_stats()["rejected"] == 1
+
+    def test_stale_jobs_requeued_then_abandoned(self):
+        """Testa a volta à fila dos jobs de um worker sem sinal de vida, até o limite de tentativas"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            job_queue = SQLiteJobQueue("teste", os.path.join(temp_dir, "jobs.db"), max_queue_size=5,
+                                       worker_timeout_seconds=30, max_attempts=2)
+            job_queue.submit("job-1", json.dumps, 1)
+
+            job_queue.heartbeat("worker-vivo", "ready")
+            job_queue.claim("worker-vivo")
+            assert job_queue.recover_stale_jobs() == ([], [])
+
+            job_queue.remove_worker("worker-vivo")
+            assert job_queue.recover_stale_jobs() == (["job-1"], [])
+            assert job_queue.get_queue_position("job-1") == 1
+
+            job_queue.claim("worker-morto")
+            assert job_queue.recover_stale_jobs() == ([], ["job-1"])
+            assert job_queue.get_queue_position("job-1") is None
+            assert job_queue.get_stats()["failed"] == 1
+
+    def test_readiness_from_worker_heartbeats(self):
+        """Testa a prontidão do modo worker a partir dos estados informados pelos workers"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            job_queue = SQLiteJobQueue("teste", os.path.join(temp_dir, "jobs.db"), max_queue_size=5, worker_timeout_seconds=30)
+
+            assert job_queue.get_readiness()["state"] == "no_workers"
+            job_queue.heartbeat("worker-1", "loading")
+            assert job_queue.get_readiness()["state"] == "loading"
+            job_queue.heartbeat("worker-1", "ready")
+            readiness = job_queue.get_readiness()
+            assert readiness["ready"] is True
+            assert job_queue.get_stats()["workers"] == 1
+
+
+class TestTranscriptionBatcher:
+    """Testes para services/transcription_batcher.py"""
+
+    def test_concurrent_submits_share_a_batch(self):
+        """Testa se itens de workers simultâneos são executados em um único lote e cada um recebe o seu resultado"""
+        calls = []
+
+        def run_batch(key, payloads):
+            calls.append((key, list(payloads)))
+            return [payload * 10 for payload in payloads]
+
+        batcher = TranscriptionBatcher("teste", run_batch, max_batch_size=3, max_wait_seconds=5)
+        results = {}
+        threads = [
+            threading.Thread(target=lambda value=value: results.__setitem__(value, batcher.submit("pt", value)))
+            for value in (1, 2, 3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        assert len(calls) == 1
+        assert sorted(calls[0][1]) == [1, 2, 3]
+        assert results == {1: (10, 3), 2: (20, 3), 3: (30, 3)}
+        assert batcher.get_stats()["avg_batch_size"] == 3
+
+    def test_different_keys_and_errors(self):
+        """Testa que chaves diferentes não se misturam e que o erro do lote chega ao chamador"""
+        def run_batch(key, payloads):
+            if key == "falha":
+                raise RuntimeError("lote falhou")
+            return [key] * len(payloads)
+
+        batcher = TranscriptionBatcher("teste", run_batch, max_batch_size=4, max_wait_seconds=0)
+
+        assert batcher.submit("pt", 1) == ("pt", 1)
+        with pytest.raises(RuntimeError):
+            batcher.submit("falha", 2)
+        assert batcher.get_stats()["failed_batches"] == 1
+
 
 class TestConfigValidation:
     """Testes para validação de configurações"""
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Workers de inferência: executam as transcrições fora do processo web.
+
+Com TRANSCRIPTION_EXECUTION_MODE=worker (e TASK_BACKEND=sqlite), o app.py só
+grava os jobs numa fila SQLite e não carrega modelos. Cada processo iniciado
+aqui carrega o modelo Whisper, retira jobs da fila e executa
+process_audio_task em TRANSCRIPTION_WORKERS threads. Processos que terminam
+inesperadamente são reiniciados e os jobs interrompidos voltam à fila.
+
+Execute com: python worker.py
+             python worker.py --processes 2
+"""
+
+import sys
+import signal
+import logging
+import argparse
+import threading
+import multiprocessing
+
+from config import TRANSCRIPTION_WORKERS, WORKER_PROCESSES, WORKER_POLL_SECONDS, WORKER_HEARTBEAT_SECONDS
+
+logger = logging.getLogger("worker")
+
+# Espera entre tentativas de carregar o modelo após uma falha
+MODEL_RETRY_SECONDS = 30
+
+# Código de saída de erro de configuração: o supervisor não reinicia o processo
+EXIT_CONFIG_ERROR = 2
+
+
+def configure_logging():
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s',
+                        handlers=[
+                            logging.FileHandler("worker.log"),
+                            logging.StreamHandler()
+                        ])
+
+
+class InferenceWorker:
+    """
+    Um processo de inferência: mantém o sinal de vida na fila, carrega o
+    modelo padrão e executa jobs em num_threads threads até stop_event.
+    """
+
+    def __init__(self, job_queue, num_threads, poll_seconds, heartbeat_seconds):
+        from services.job_queue import default_worker_id
+        self.job_queue = job_queue
+        self.worker_id = default_worker_id()
+        self.num_threads = max(1, int(num_threads))
+        self.poll_seconds = poll_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.state = "loading"
+        self.message = "Carregando modelo Whisper..."
+        self.stop_event = threading.Event()
+
+    def run(self):
+        self._heartbeat()
+        threading.Thread(target=self._heartbeat_loop, name="heartbeat", daemon=True).start()
+
+        if self._load_model():
+            threads = [
+                threading.Thread(target=self._job_loop, name=f"job-{index + 1}")
+                for index in range(self.num_threads)
+            ]
+            for thread in threads:
+                thread.start()
+            logger.info(f"Worker {self.worker_id} pronto com {self.num_threads} thread(s).")
+            for thread in threads:
+                thread.join()
+
+        self.job_queue.remove_worker(self.worker_id)
+        logger.info(f"Worker {self.worker_id} encerrado.")
+
+    def _heartbeat(self):
+        self.job_queue.heartbeat(self.worker_id, self.state, self.message)
+
+    def _heartbeat_loop(self):
+        while not self.stop_event.wait(self.heartbeat_seconds):
+            try:
+                self._heartbeat()
+                self._recover_stale_jobs()
+            except Exception as e:
+                logger.warning(f"Falha ao registrar o sinal de vida do worker: {e}")
+
+    def _load_model(self):
+        from services import whisper_service
+        while not self.stop_event.is_set():
+            success, message = whisper_service.load_whisper_model()
+            self.state, self.message = ("ready" if success else "error"), message
+            self._heartbeat()
+            if success:
+                return True
+            logger.error(f"{message} Nova tentativa em {MODEL_RETRY_SECONDS}s.")
+            self.stop_event.wait(MODEL_RETRY_SECONDS)
+        return False
+
+    def _recover_stale_jobs(self):
+        from services import task_service
+        requeued, abandoned = self.job_queue.recover_stale_jobs()
+        # Na fila de transcrição o job_id é o task_id
+        for task_id in requeued:
+            task_service.update_task_status(
+                task_id, status="queued",
+                message="O worker que processava a tarefa parou de responder. Aguardando na fila novamente..."
+            )
+        for task_id in abandoned:
+            task_service.update_task_status(
+                task_id, status="error",
+                message="A transcrição foi interrompida repetidamente (worker parou de responder)."
+            )
+
+    def _job_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                job = self.job_queue.claim(self.worker_id)
+            except Exception as e:
+                logger.warning(f"Falha ao consultar a fila: {e}")
+                job = None
+            if job is None:
+                self.stop_event.wait(self.poll_seconds)
+                continue
+
+            job_id, func, args, kwargs = job
+            failed = False
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                failed = True
+                logger.exception(f"Job {job_id} falhou com erro não tratado.")
+            finally:
+                self.job_queue.complete(job_id, failed=failed)
+
+
+def run_worker_process():
+    """
+    Ponto de entrada de cada processo filho.
+    """
+    configure_logging()
+    from services.job_scheduler import JobScheduler, transcription_scheduler
+    if isinstance(transcription_scheduler, JobScheduler):
+        sys.exit(EXIT_CONFIG_ERROR)
+    worker = InferenceWorker(transcription_scheduler, TRANSCRIPTION_WORKERS, WORKER_POLL_SECONDS, WORKER_HEARTBEAT_SECONDS)
+
+    def stop(signum, frame):
+        logger.info("Encerrando após os jobs em andamento...")
+        worker.stop_event.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    worker.run()
+
+
+def supervise(num_processes):
+    """
+    Inicia num_processes workers e reinicia os que terminarem, até receber SIGTERM/SIGINT.
+    """
+    context = multiprocessing.get_context("spawn")
+    stopping = threading.Event()
+
+    def start(index):
+        process = context.Process(target=run_worker_process, name=f"inference-worker-{index + 1}")
+        process.start()
+        return process
+
+    def stop(signum, frame):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    processes = [start(index) for index in range(num_processes)]
+    logger.info(f"{num_processes} processo(s) de inferência iniciado(s).")
+    while not stopping.wait(1):
+        for index, process in enumerate(processes):
+            if process.is_alive():
+                continue
+            if process.exitcode == EXIT_CONFIG_ERROR:
+                logger.error(f"{process.name} terminou por erro de configuração; encerrando.")
+                stopping.set()
+                break
+            logger.warning(f"{process.name} terminou (código {process.exitcode}); reiniciando.")
+            processes[index] = start(index)
+
+    for process in processes:
+        if process.is_alive():
+            process.terminate()  # SIGTERM: cada worker termina os jobs em andamento
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=WORKER_PROCESSES, help="Processos de inferência")
+    args = parser.parse_args()
+
+    configure_logging()
+    from services.job_scheduler import JobScheduler, transcription_scheduler
+    if isinstance(transcription_scheduler, JobScheduler):
+        logger.error("worker.py requer TRANSCRIPTION_EXECUTION_MODE=worker e TASK_BACKEND=sqlite.")
+        sys.exit(EXIT_CONFIG_ERROR)
+    supervise(max(1, args.processes))